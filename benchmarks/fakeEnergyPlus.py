@@ -0,0 +1,220 @@
+"""
+A stand-in for the EnergyPlus executable, so that the benchmarks can be run without EnergyPlus installed.
+
+It accepts the same arguments as EnergyPlus is launched with by getEnergyPlusArgs (idf path, -w weather file, -d output directory, and --version),
+sleeps for FAKE_ENERGYPLUS_SLEEP seconds (0.05 by default) to stand in for the simulation, and then writes synthetic eplusout.csv, eplustbl.csv and eplusout.err files
+in the same format as the files processHourlyResults and processResilienceResults read. FAKE_ENERGYPLUS_TIMESTEPS sets the number of hourly timesteps (8760 by default).
+If the idf turns on Output:SQLite, the same results are also written to eplusout.sql, in the tables of the EnergyPlus SQLite output which processSQLiteResults reads.
+
+The results are realistic in shape (seasonal heating and cooling, daily lighting and equipment profiles) and are seeded from the idf, so the same idf always gives the same results.
+Use installFakeEnergyPlus to create a folder which can be passed as ep_dir to run_energyPlus, runBatch or iterBatch.
+"""
+
+import hashlib
+import io
+import os
+from pathlib import Path
+import sqlite3
+import stat
+import sys
+import time
+
+import numpy as np
+
+VERSION = "EnergyPlus, Version 25.1.0-fake"
+
+# The same headers as HOURLY_COLUMNS in src/processResults.py. They are repeated here so that the fake EnergyPlus does not import pandas, which would slow down every simulation.
+HEADERS = {
+    "outdoor": "Environment:Site Outdoor Air Drybulb Temperature [C](Hourly)",
+    "heating": "ZONE 1 IDEAL LOADS AIR SYSTEM:Zone Ideal Loads Supply Air Total Heating Energy [J](Hourly)",
+    "cooling": "ZONE 1 IDEAL LOADS AIR SYSTEM:Zone Ideal Loads Supply Air Total Cooling Energy [J](Hourly)",
+    "lighting": "LIGHTING_ZONE 1:Lights Electricity Energy [J](Hourly)",
+    "equipment": "ELECTRICEQUIPMENT_ZONE 1:Electric Equipment Electricity Energy [J](Hourly)",
+    "hotWater": "WATER HEATER:Water Heater Heating Energy [J](Hourly)",
+    "operativeTemperature": "ZONE 1:Zone Operative Temperature [C](Hourly)",
+}
+
+
+# The columns of the thermal resilience tables, as they are named in the EnergyPlus SQLite output
+RESILIENCE_COLUMNS = {
+    "Heat Index Hours": ["Safe (≤ 26.7°C) [hr]", "Caution (> 26.7°C, ≤ 32.2°C) [hr]", "Extreme Caution (> 32.2°C, ≤ 39.4°C) [hr]", "Danger (> 39.4°C, ≤ 51.7°C) [hr]", "Extreme Danger (> 51.7°C) [hr]"],
+    "Humidex Hours": ["Little to no Discomfort (≤ 29) [hr]", "Some Discomfort (> 29, ≤ 40) [hr]", "Great Discomfort; Avoid Exertion (> 40, ≤ 45) [hr]", "Dangerous (> 45, ≤ 50) [hr]", "Heat Stroke Quite Possible (> 50) [hr]"],
+    "Cooling SET Degree-Hours": ["SET > 30°C Degree-Hours [°C·hr]", "SET > 30°C Occupant-Weighted Degree-Hours [°C·hr]", "SET > 30°C Occupied Degree-Hours [°C·hr]",
+                                 "Longest SET > 30°C Duration for Occupied Period [hr]", "Start Time of the Longest SET > 30°C Duration for Occupied Period"],
+}
+
+
+def syntheticHourlyValues (n_timesteps = 8760, seed = None):
+    """
+    Returns a tuple of the end of each hour (as numpy datetimes) and an (n_timesteps, columns) array of synthetic values of the columns of HEADERS.
+    The values are rounded to the 4 decimal places they are written to eplusout.csv with, so every output file holds exactly the same values.
+    """
+
+    rng = np.random.default_rng(seed)
+    hours = np.arange(n_timesteps)
+    hourOfDay = hours % 24
+    season = np.cos(2 * np.pi * (hours / 8760 - 0.55))
+
+    outdoor = 11 + 8 * season + 4 * np.sin(2 * np.pi * (hourOfDay - 9) / 24) + rng.normal(0, 2, n_timesteps)
+    operative = np.maximum(18, 21 + 0.4 * (outdoor - 11) + rng.normal(0, 1, n_timesteps))
+    heating = np.maximum(0, 18 - outdoor) * 1.5e5 * rng.uniform(0.8, 1.2, n_timesteps)
+    cooling = np.maximum(0, operative - 26) * 2e5 * rng.uniform(0.8, 1.2, n_timesteps)
+    occupied = (hourOfDay < 8) | (hourOfDay >= 17)
+    lighting = np.where(occupied & ((hourOfDay < 7) | (hourOfDay >= 18)), 3.6e5, 0.0)
+    equipment = np.where(occupied, 7.2e5, 1.8e5)
+    hotWater = np.where(np.isin(hourOfDay, [7, 8, 19, 20]), 4e6, 2e5) * rng.uniform(0.9, 1.1, n_timesteps)
+
+    # EnergyPlus reports the end of each hour
+    dates = np.datetime64("2025-01-01T01:00:00") + hours.astype("timedelta64[h]")
+
+    return dates, np.round(np.column_stack([outdoor, heating, cooling, lighting, equipment, hotWater, operative]), 4)
+
+
+def syntheticHourlyResults (n_timesteps = 8760, seed = None):
+    """
+    Returns the text of a synthetic eplusout.csv file, with a Date/Time column and the columns of HEADERS.
+    """
+
+    dates, values = syntheticHourlyValues(n_timesteps, seed)
+    # The repo reads the ISO format of the timestamps
+    dates = np.datetime_as_string(dates, unit = "s")
+
+    text = io.StringIO()
+    np.savetxt(text, values, fmt = "%.4f", delimiter = ",")
+    rows = [f" {date},{row}" for date, row in zip(dates, text.getvalue().splitlines())]
+
+    return "\n".join([",".join(["Date/Time"] + list(HEADERS.values()))] + rows) + "\n"
+
+
+def syntheticResilienceValues (seed = None):
+    """
+    Returns a dictionary of the ZONE 1 row of each of the thermal resilience tables (see RESILIENCE_COLUMNS), as the strings EnergyPlus writes.
+    """
+
+    rng = np.random.default_rng(seed)
+    heatIndex = rng.multinomial(8760, [0.9, 0.07, 0.02, 0.008, 0.002])
+    humidex = rng.multinomial(8760, [0.88, 0.09, 0.02, 0.008, 0.002])
+
+    return {
+        "Heat Index Hours": [f"{float(h):.2f}" for h in heatIndex],
+        "Humidex Hours": [f"{float(h):.2f}" for h in humidex],
+        "Cooling SET Degree-Hours": [f"{rng.uniform(0, 500):.2f}", f"{rng.uniform(0, 200):.2f}", f"{rng.uniform(0, 300):.2f}", f"{float(rng.integers(0, 48)):.2f}", f"2025-07-{rng.integers(1, 31):02d} 14:00"],
+    }
+
+
+def syntheticResilienceTable (seed = None):
+    """
+    Returns the text of an eplustbl.csv file with the thermal resilience tables in the rows which processResilienceResults reads.
+    """
+
+    values = syntheticResilienceValues(seed)
+    lines = [f"Report:,Filler Report {k},For:,Entire Facility" for k in range(100)]
+
+    lines[12] = ",ZONE 1," + ",".join(values["Heat Index Hours"])
+    lines[42] = ",ZONE 1," + ",".join(values["Humidex Hours"])
+    lines[81] = ",ZONE 1," + ",".join(values["Cooling SET Degree-Hours"])
+
+    return "\n".join(lines) + "\n"
+
+
+def writeSyntheticSQLite (filePath, n_timesteps = 8760, seed = None):
+    """
+    Write a synthetic eplusout.sql with the hourly values and thermal resilience tables of the other synthetic outputs.
+    Only the tables and columns of the EnergyPlus SQLite output which the repo reads are created.
+    """
+
+    dates, values = syntheticHourlyValues(n_timesteps, seed)
+    # The last hour of each day is reported as hour 24 of that day, rather than hour 0 of the next
+    hoursOfDay = (dates - dates.astype("datetime64[D]")).astype("timedelta64[h]").astype(np.int64)
+    ends = hoursOfDay == 0
+    days = np.where(ends, (dates - np.timedelta64(1, "h")).astype("datetime64[D]"), dates.astype("datetime64[D]"))
+    dayOfMonth = (days - days.astype("datetime64[M]")).astype(np.int64) + 1
+    months = days.astype("datetime64[M]").astype(np.int64) % 12 + 1
+    hoursOfDay = np.where(ends, 24, hoursOfDay)
+
+    Path(filePath).unlink(missing_ok = True)
+    conn = sqlite3.connect(filePath)
+    conn.executescript(
+        """
+        CREATE TABLE Time (TimeIndex INTEGER PRIMARY KEY, Year INTEGER, Month INTEGER, Day INTEGER, Hour INTEGER, Minute INTEGER, Interval INTEGER, WarmupFlag INTEGER);
+        CREATE TABLE ReportDataDictionary (ReportDataDictionaryIndex INTEGER PRIMARY KEY, IsMeter INTEGER, Type TEXT, KeyValue TEXT, Name TEXT, ReportingFrequency TEXT, Units TEXT);
+        CREATE TABLE ReportData (ReportDataIndex INTEGER PRIMARY KEY, TimeIndex INTEGER, ReportDataDictionaryIndex INTEGER, Value REAL);
+        CREATE TABLE TabularDataWithStrings (TabularDataIndex INTEGER PRIMARY KEY, Value TEXT, ReportName TEXT, ReportForString TEXT, TableName TEXT, RowName TEXT, ColumnName TEXT, Units TEXT);
+        """
+    )
+
+    conn.executemany(
+        "INSERT INTO Time (TimeIndex, Year, Month, Day, Hour, Minute, Interval, WarmupFlag) VALUES (?, 2025, ?, ?, ?, 0, 60, 0)",
+        [(t + 1, int(m), int(d), int(h)) for t, (m, d, h) in enumerate(zip(months, dayOfMonth, hoursOfDay))],
+    )
+
+    for k, header in enumerate(HEADERS.values()):
+        key, variable = header.split(":", 1)
+        name = variable.split(" [")[0].strip()
+        units = variable.split("[", 1)[1].split("]")[0]
+        conn.execute("INSERT INTO ReportDataDictionary VALUES (?, 0, 'Avg', ?, ?, 'Hourly', ?)", (k + 1, key, name, units))
+        conn.executemany("INSERT INTO ReportData (TimeIndex, ReportDataDictionaryIndex, Value) VALUES (?, ?, ?)", [(t + 1, k + 1, float(v)) for t, v in enumerate(values[:, k])])
+
+    rows = []
+    for table, row in syntheticResilienceValues(seed).items():
+        for column, value in zip(RESILIENCE_COLUMNS[table], row):
+            rows.append((value, "AnnualThermalResilienceSummary", "Entire Facility", table, "ZONE 1", column, ""))
+    conn.executemany("INSERT INTO TabularDataWithStrings (Value, ReportName, ReportForString, TableName, RowName, ColumnName, Units) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    conn.commit()
+    conn.close()
+
+
+def writeSyntheticOutputs (output_path, n_timesteps = 8760, seed = None, sqlite = False):
+    """
+    Write a synthetic eplusout.csv, eplustbl.csv and eplusout.err to output_path, and eplusout.sql if sqlite is True.
+    """
+
+    Path.mkdir(Path(output_path), parents = True, exist_ok = True)
+    with open (Path(output_path, "eplusout.csv"), "w") as f:
+        f.write(syntheticHourlyResults(n_timesteps, seed))
+    with open (Path(output_path, "eplustbl.csv"), "w", encoding = "UTF-8") as f:
+        f.write(syntheticResilienceTable(seed))
+    with open (Path(output_path, "eplusout.err"), "w") as f:
+        f.write("   ************* EnergyPlus Completed Successfully-- 0 Warning; 0 Severe Errors.\n")
+    if sqlite:
+        writeSyntheticSQLite(Path(output_path, "eplusout.sql"), n_timesteps, seed)
+
+
+def installFakeEnergyPlus (ep_dir):
+    """
+    Create an executable called energyplus in ep_dir which runs this script with the current Python interpreter, and return ep_dir.
+    This uses a shell script, so it is only supported on Mac/Linux.
+    """
+
+    if os.name == "nt":
+        raise Exception ("The fake EnergyPlus executable is only supported on Mac/Linux.")
+
+    Path.mkdir(Path(ep_dir), parents = True, exist_ok = True)
+    executable = Path(ep_dir, "energyplus")
+    with open (executable, "w") as f:
+        f.write(f'#!/bin/sh\nexec "{sys.executable}" "{Path(__file__).resolve()}" "$@"\n')
+    executable.chmod(executable.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+    return ep_dir
+
+
+def main (args):
+    if args == ["--version"]:
+        print (VERSION)
+        return 0
+
+    idf_path = Path(args[0])
+    output_path = Path(args[args.index("-d") + 1]) if "-d" in args else Path(".")
+
+    time.sleep(float(os.environ.get("FAKE_ENERGYPLUS_SLEEP", 0.05)))
+
+    contents = idf_path.read_bytes()
+    seed = int.from_bytes(hashlib.sha256(contents).digest()[:8], "little")
+    writeSyntheticOutputs(output_path, int(os.environ.get("FAKE_ENERGYPLUS_TIMESTEPS", 8760)), seed, sqlite = b"Output:SQLite," in contents)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,368 @@
+"""
+Benchmarks of the Python parts of a study: rendering idfs, reading results, sampling, saving the NSGA-II history, and the overhead of dispatching simulations.
+None of them need EnergyPlus installed. The simulations are run with the fake EnergyPlus in benchmarks/fakeEnergyPlus.py.
+
+Run from the root of the repository:
+    python -m benchmarks.runBenchmarks --output outputs/benchmarks/latest.json
+    python -m benchmarks.runBenchmarks --baseline outputs/benchmarks/baseline.json
+
+The results are written as JSON with the median, minimum and mean time of each benchmark.
+If a baseline file from a previous run is given, each benchmark is compared against it, and the exit code is 1 if any benchmark is slower than the baseline by more than the tolerance.
+--size selects the data sizes (see SIZES), and --filter only runs the benchmarks whose names contain the given text.
+"""
+
+import argparse
+import contextlib
+import datetime
+import json
+from multiprocessing import Pool
+import os
+from pathlib import Path
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.fakeEnergyPlus import installFakeEnergyPlus, writeSyntheticOutputs
+from src.idf import modifyIDF, renderIDF
+from src.processResults import processHourlyResults, processResilienceResults
+from src.runEnergyPlus import getEnergyPlusArgs, run_energyPlus
+from src.sampling import fullFactorialSampling, latinHypercubeSampling, randomSampling, statisticalSampling
+from src.saveResults import saveNSGA2History
+from src.scheduler import iterBatch
+from src.square import slow_square, square
+
+ROOT = Path(__file__).resolve().parent.parent
+BASELINE_IDF = Path(ROOT, "idfs", "1-storey_baseline.idf")
+PARAMETERS = Path(ROOT, "simulationParameters", "Exercise 0.json")
+WEATHER_FILE = Path(ROOT, "weatherData", "GBR_ENG_London.Wea.Ctr-St.James.Park.037700_TMYx.2009-2023.epw")
+
+# The data sizes of each benchmark
+SIZES = {
+    "small": {
+        "repeats": 5,
+        "renders": 50,
+        "timesteps": [8760],
+        "samples": [100, 1000],
+        "generations": 20,
+        "population": 50,
+        "poolItems": 10000,
+        "simulations": 16,
+        "simulationTime": 0.05,
+    },
+    "large": {
+        "repeats": 7,
+        "renders": 500,
+        "timesteps": [8760, 4 * 8760],
+        "samples": [1000, 10000],
+        "generations": 100,
+        "population": 100,
+        "poolItems": 100000,
+        "simulations": 64,
+        "simulationTime": 0.05,
+    },
+}
+
+
+def measure (function, repeats, setup = None):
+    """
+    Time function repeats times (after one warm up call) and return a dictionary of the median, minimum and mean time [s].
+    setup is called before each call and is not timed.
+    """
+
+    times = []
+    for k in range(repeats + 1):
+        if setup is not None:
+            setup()
+        # Many of the functions print progress messages, which are not part of the benchmark output
+        with open (os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            t0 = time.perf_counter()
+            function()
+            t1 = time.perf_counter()
+        if k > 0:
+            times.append(t1 - t0)
+
+    return {"median": statistics.median(times), "min": min(times), "mean": statistics.mean(times), "repeats": repeats}
+
+
+def sampleInputs (n, seed = 0):
+    with open (PARAMETERS) as f:
+        parameters = json.load(f)
+    return randomSampling(parameters, n, seed = seed).to_dict("records")
+
+
+def benchmarkIDF (size, workDir):
+    inputs = sampleInputs(size["renders"])
+    results = {}
+
+    def render ():
+        for row in inputs:
+            renderIDF(BASELINE_IDF, row)
+
+    results["renderIDF"] = {**measure(render, size["repeats"]), "params": {"renders": len(inputs)}}
+
+    def modify ():
+        for k, row in enumerate(inputs):
+            modifyIDF(BASELINE_IDF, Path(workDir, f"benchmark_{k % 4}.idf"), row)
+
+    results["modifyIDF"] = {**measure(modify, size["repeats"]), "params": {"renders": len(inputs)}}
+
+    return results
+
+
+def benchmarkResults (size, workDir):
+    results = {}
+    for n_timesteps in size["timesteps"]:
+        output_path = Path(workDir, f"outputs_{n_timesteps}")
+        writeSyntheticOutputs(output_path, n_timesteps, seed = 0)
+
+        results[f"processHourlyResults[{n_timesteps}]"] = {
+            **measure(lambda: processHourlyResults(Path(output_path, "eplusout.csv")), size["repeats"]),
+            "params": {"timesteps": n_timesteps},
+        }
+        results[f"processHourlyResults[{n_timesteps},monthly]"] = {
+            **measure(lambda: processHourlyResults(Path(output_path, "eplusout.csv"), monthly = True), size["repeats"]),
+            "params": {"timesteps": n_timesteps},
+        }
+
+    output_path = Path(workDir, f"outputs_{size['timesteps'][0]}")
+    results["processResilienceResults"] = {**measure(lambda: processResilienceResults(Path(output_path, "eplustbl.csv")), size["repeats"]), "params": {}}
+
+    return results
+
+
+def benchmarkSampling (size, workDir):
+    with open (PARAMETERS) as f:
+        parameters = json.load(f)
+
+    variables = {
+        "a": {"method": "discrete", "values": [0.1, 0.2, 0.3]},
+        "b": {"method": "normal", "mu": 1, "sigma": 0.2},
+        "c": {"method": "skew", "skew": 4, "mu": 1, "sigma": 0.2},
+        "d": {"method": "uniform", "range": [0, 1]},
+        "e": {"method": "constant", "values": 1},
+    }
+    factorial = {
+        k: ({"type": "categorical", "values": list(np.linspace(*v["values"], 4))} if v["type"] in ["int", "float"] else v)
+        for k, v in parameters.items()
+    }
+    # Keep the full factorial design to a size which is quick to list
+    factorial = dict(list(factorial.items())[:8])
+
+    results = {}
+    for n in size["samples"]:
+        results[f"statisticalSampling[{n}]"] = {**measure(lambda: statisticalSampling(variables, n, seed = 0), size["repeats"]), "params": {"n": n}}
+        results[f"randomSampling[{n}]"] = {**measure(lambda: randomSampling(parameters, n, seed = 0), size["repeats"]), "params": {"n": n}}
+        results[f"latinHypercubeSampling[{n}]"] = {**measure(lambda: latinHypercubeSampling(parameters, n, seed = 0), size["repeats"]), "params": {"n": n}}
+
+    n_combinations = int(np.prod([len(v["values"]) for v in factorial.values()]))
+    results["fullFactorialSampling"] = {**measure(lambda: fullFactorialSampling(factorial), size["repeats"]), "params": {"combinations": n_combinations}}
+
+    return results
+
+
+class _Individual:
+    def __init__ (self, X, F):
+        self.X = X
+        self.F = F
+
+
+class _Generation:
+    def __init__ (self, pop):
+        self.pop = pop
+
+
+def benchmarkHistory (size, workDir):
+    # saveNSGA2History only uses the X and F of each individual of each generation, so a synthetic history stands in for res.history
+    with open (PARAMETERS) as f:
+        parameters = json.load(f)
+
+    rng = np.random.default_rng(0)
+    history = [
+        _Generation([_Individual(rng.random(len(parameters)), rng.random(2)) for _ in range(size["population"])])
+        for _ in range(size["generations"])
+    ]
+
+    cwd = os.getcwd()
+    Path.mkdir(Path(workDir, "outputs", "results"), parents = True, exist_ok = True)
+    os.chdir(workDir)
+    try:
+        result = measure(lambda: saveNSGA2History(history, parameters, "benchmark"), size["repeats"])
+    finally:
+        os.chdir(cwd)
+
+    return {"saveNSGA2History": {**result, "params": {"generations": size["generations"], "population": size["population"]}}}
+
+
+def benchmarkPool (size, workDir):
+    items = list(range(size["poolItems"]))
+    n_processors = os.cpu_count()
+    results = {}
+
+    results["serial[square]"] = {**measure(lambda: [square(x) for x in items], size["repeats"]), "params": {"items": len(items)}}
+    results["serial[slow_square]"] = {**measure(lambda: [slow_square(x) for x in items], size["repeats"]), "params": {"items": len(items)}}
+
+    # Starting the pool is part of the overhead which each study pays
+    def pooled (function):
+        with Pool(processes = n_processors) as pool:
+            pool.map(function, items)
+
+    results["pool[square]"] = {**measure(lambda: pooled(square), size["repeats"]), "params": {"items": len(items), "processes": n_processors}}
+    results["pool[slow_square]"] = {**measure(lambda: pooled(slow_square), size["repeats"]), "params": {"items": len(items), "processes": n_processors}}
+
+    return results
+
+
+def benchmarkDispatch (size, workDir):
+    """
+    Run the fake EnergyPlus through run_energyPlus with a Pool and through iterBatch, and report the overhead of each on top of the simulations themselves.
+    The time of one fake simulation is measured first, so the overhead does not include the start up time of the fake EnergyPlus.
+    """
+
+    if os.name == "nt":
+        print ("Skipping the dispatch benchmarks, as the fake EnergyPlus is only supported on Mac/Linux.", flush = True)
+        return {}
+
+    ep_dir = installFakeEnergyPlus(Path(workDir, "EnergyPlus"))
+    os.environ["FAKE_ENERGYPLUS_SLEEP"] = str(size["simulationTime"])
+
+    n = size["simulations"]
+    n_processors = os.cpu_count()
+    inputs = sampleInputs(n)
+
+    # Time a single fake simulation on its own
+    output_path = Path(workDir, "calibration")
+    Path.mkdir(output_path, exist_ok = True)
+    with open (Path(output_path, "calibration.idf"), "w") as f:
+        f.write(renderIDF(BASELINE_IDF, inputs[0]))
+    ep_args = getEnergyPlusArgs(ep_dir, Path(output_path, "calibration.idf"), WEATHER_FILE, output_path)
+    simulation = measure(lambda: subprocess.run(ep_args, check = True, capture_output = True), size["repeats"])["median"]
+
+    # The shortest possible time to run all of the simulations with n_processors at once
+    ideal = np.ceil(n / n_processors) * simulation
+
+    cwd = os.getcwd()
+    Path.mkdir(Path(workDir, "iterations"), exist_ok = True)
+    os.chdir(workDir)
+    results = {}
+    try:
+        def pooled ():
+            with Pool(processes = n_processors) as pool:
+                pool.starmap(run_energyPlus, [(ep_dir, BASELINE_IDF, WEATHER_FILE, row, i) for i, row in enumerate(inputs)])
+
+        def batched ():
+            for _ in iterBatch(ep_dir, BASELINE_IDF, WEATHER_FILE, inputs, n_processors):
+                pass
+
+        for name, function in [("dispatch[pool.starmap]", pooled), ("dispatch[iterBatch]", batched)]:
+            result = measure(function, max(1, size["repeats"] // 2))
+            result["overheadPerSimulation"] = max(0.0, result["median"] - ideal) * n_processors / n
+            result["params"] = {"simulations": n, "processes": n_processors, "simulationTime": simulation}
+            results[name] = result
+    finally:
+        os.chdir(cwd)
+
+    return results
+
+
+BENCHMARKS = {
+    "idf": benchmarkIDF,
+    "results": benchmarkResults,
+    "sampling": benchmarkSampling,
+    "history": benchmarkHistory,
+    "pool": benchmarkPool,
+    "dispatch": benchmarkDispatch,
+}
+
+
+def runBenchmarks (size = "small", only = None):
+    """
+    Run the benchmarks and return a dictionary of the metadata of the machine and the results of each benchmark.
+    """
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workDir:
+        for group, function in BENCHMARKS.items():
+            if only is not None and only not in group:
+                continue
+            print (f"Running the {group} benchmarks.", flush = True)
+            for name, result in function(SIZES[size], workDir).items():
+                results[f"{group}.{name}"] = result
+                print (f"    {name}: {result['median'] * 1000:.2f} ms", flush = True)
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd = ROOT, capture_output = True, text = True).stdout.strip()
+    except OSError:
+        commit = ""
+
+    metadata = {
+        "date": datetime.datetime.now().isoformat(timespec = "seconds"),
+        "commit": commit,
+        "size": size,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processors": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+    }
+
+    return {"metadata": metadata, "benchmarks": results}
+
+
+def compareBenchmarks (results, baseline, tolerance = 0.2):
+    """
+    Compare the median time of each benchmark with a baseline.
+    Returns a dataframe of the benchmarks in both with their times, ratio (current / baseline) and whether the ratio is more than 1 + tolerance.
+    """
+
+    rows = []
+    for name, result in results["benchmarks"].items():
+        if name not in baseline["benchmarks"]:
+            continue
+        reference = baseline["benchmarks"][name]["median"]
+        ratio = result["median"] / reference if reference > 0 else np.nan
+        rows.append({"benchmark": name, "baseline [ms]": reference * 1000, "current [ms]": result["median"] * 1000, "ratio": ratio, "regression": bool(ratio > 1 + tolerance)})
+
+    return pd.DataFrame(rows, columns = ["benchmark", "baseline [ms]", "current [ms]", "ratio", "regression"])
+
+
+def main (argv = None):
+    parser = argparse.ArgumentParser(description = "Run the benchmarks of the study tools without EnergyPlus.")
+    parser.add_argument("--size", choices = list(SIZES), default = "small")
+    parser.add_argument("--filter", default = None, help = "only run the benchmark groups whose names contain this text")
+    parser.add_argument("--output", default = None, help = "where to save the results as JSON")
+    parser.add_argument("--baseline", default = None, help = "a previous results file to compare against")
+    parser.add_argument("--tolerance", type = float, default = 0.2, help = "the allowed slow down relative to the baseline (0.2 is 20%%)")
+    args = parser.parse_args(argv)
+
+    results = runBenchmarks(args.size, args.filter)
+
+    if args.output is not None:
+        Path.mkdir(Path(args.output).parent, parents = True, exist_ok = True)
+        with open (args.output, "w") as f:
+            json.dump(results, f, indent = 4)
+        print (f"Benchmark results saved to {args.output}.")
+
+    if args.baseline is not None:
+        with open (args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["metadata"].get("size") != args.size:
+            print (f"Warning: the baseline was run with size {baseline['metadata'].get('size')}, not {args.size}.")
+
+        comparison = compareBenchmarks(results, baseline, args.tolerance)
+        print (comparison.to_string(index = False))
+
+        if comparison["regression"].any():
+            print (f"{comparison['regression'].sum()} benchmarks are more than {args.tolerance:.0%} slower than the baseline.")
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
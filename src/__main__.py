@@ -0,0 +1,222 @@
+"""
+Run a study from the command line, without a notebook, eg. from cron or a batch scheduler:
+
+    python -m src run "Exercise 6B.json" --method sobol -n 256 --idf 1-storey_baseline.idf --epw GBR_ENG_London.Wea.Ctr-St.James.Park.037700_TMYx.2009-2023.epw --ep-dir /usr/local/EnergyPlus-25-1-0
+
+The parameters file is read from simulationParameters/, the idf from idfs/ and the weather file from weatherData/ (full paths can also be given).
+The combinations are saved to outputs/combinations/combinations_{saveName}.csv and the results to outputs/results/results_{saveName}.csv.
+
+    run: sample the parameters and run the simulations on this machine with iterBatch. Each result is recorded in a results store as soon as it finishes,
+        so running the same command again after an interruption resumes the study (the saved combinations are reused).
+    study: sample the parameters into a study ledger in outputs/studies/{saveName} (see src/studyRunner.py) and run it with --concurrency worker processes.
+    worker: run the items of an existing study, eg. on other machines which share the project folder.
+
+Only the modules each command needs are imported, and only when it runs. The sampling libraries (scipy) are never imported by worker processes,
+which only load what is needed to run EnergyPlus and read its results.
+"""
+
+import argparse
+import os
+from pathlib import Path
+import sys
+
+SAMPLING_METHODS = ["random", "sobol", "halton", "lhs", "factorial", "statistical"]
+
+
+def findFile (name, folder):
+    """
+    Returns the path of a file given either as a path or as a name in folder, eg. findFile("1-storey_baseline.idf", "idfs").
+    """
+
+    path = Path(name)
+    if not path.exists():
+        path = Path(folder, name)
+    if not path.exists():
+        raise Exception (f"Could not find {name} in {folder}/.")
+    return path
+
+
+def sampleCombinations (parameters, method, n, seed = None):
+    """
+    Returns a combinations dataframe of n samples of the parameters with one of SAMPLING_METHODS.
+    """
+
+    # Imported here as the sampling libraries are slow to import and are not needed by the workers
+    import pandas as pd
+
+    from src import sampling
+
+    if method in ["random", "sobol", "halton"]:
+        return sampling.Sampler(parameters, seed = seed).sampleDataFrame(n, method = method)
+    if method == "lhs":
+        return sampling.latinHypercubeSampling(parameters, n, seed = seed)
+    if method == "factorial":
+        return sampling.fullFactorialSampling(parameters)
+    if method == "statistical":
+        # statisticalSampling returns a dictionary of arrays, which the rest of the command line uses as a dataframe
+        return pd.DataFrame(sampling.statisticalSampling(parameters, n, seed = seed))
+
+    raise Exception (f"Unsupported sampling method: {method}")
+
+
+def loadCombinations (args):
+    """
+    Returns the combinations of the study. They are sampled the first time, and read back from outputs/combinations/ when the study is run again (unless --resample is given).
+    """
+
+    import json
+    import pandas as pd
+
+    savePath = Path("outputs", "combinations", f"combinations_{args.save_name}.csv")
+    if savePath.exists() and not args.resample:
+        print (f"Using the saved combinations in {savePath}.", flush = True)
+        return pd.read_csv(savePath, index_col = 0)
+
+    if args.n is None and args.method != "factorial":
+        raise Exception (f"The number of samples (-n) is needed for the {args.method} method.")
+
+    with open (findFile(args.parameters, "simulationParameters")) as f:
+        parameters = json.load(f)
+
+    combinations = sampleCombinations(parameters, args.method, args.n, args.seed)
+
+    Path.mkdir(savePath.parent, parents = True, exist_ok = True)
+    combinations.to_csv(savePath)
+    print (f"Combinations dataframe saved to {savePath}.", flush = True)
+
+    return combinations
+
+
+def watchdogFromArgs (args):
+    from src.watchdog import Watchdog
+
+    return Watchdog(timeout = args.timeout, retries = args.retries)
+
+
+def saveResults (results, saveName):
+    savePath = Path("outputs", "results", f"results_{saveName}.csv")
+    Path.mkdir(savePath.parent, parents = True, exist_ok = True)
+    results.to_csv(savePath)
+    print (f"Results dataframe saved to {savePath}.", flush = True)
+
+
+def runCommand (args):
+    from src.instrumentation import Instrumentation, setVerbose
+    from src.resultsStore import ResultsStore
+    from src.scheduler import iterBatch
+    from src.workspace import Workspace
+
+    setVerbose(not args.quiet)
+    combinations = loadCombinations(args)
+
+    store = ResultsStore(Path("outputs", "results", f"store_{args.save_name}"))
+    instrumentation = Instrumentation(Path("outputs", "results", f"instrumentation_{args.save_name}.jsonl"))
+    workspace = Workspace(args.save_name)
+
+    print (f"Running {len(combinations)} simulations of {args.save_name} with up to {args.concurrency or os.cpu_count()} at once.", flush = True)
+    n = 0
+    for i, retcode, hourlyResults, resilienceResults in iterBatch(
+            Path(args.ep_dir), findFile(args.idf, "idfs"), findFile(args.epw, "weatherData"), combinations, args.concurrency,
+            backend = args.backend, metrics = args.metrics, workspace = workspace, watchdog = watchdogFromArgs(args), fidelity = args.fidelity,
+            store = store, instrumentation = instrumentation):
+        n += 1
+        if args.quiet and n % 100 == 0:
+            print (f"Completed {n} simulations.", flush = True)
+
+    results = store.read()
+    saveResults(results, args.save_name)
+    if n > 0:
+        instrumentation.printSummary()
+
+    failed = int((results["returncode"] != 0).sum()) if "returncode" in results.columns else 0
+    print (f"{len(results)} simulations recorded, {failed} failed.", flush = True)
+
+    return 1 if failed else 0
+
+
+def studyCommand (args):
+    from src.instrumentation import setVerbose
+    from src.studyRunner import StudyLedger, createStudy, runLocalWorkers
+
+    setVerbose(not args.quiet)
+    combinations = loadCombinations(args)
+
+    study_dir = Path("outputs", "studies", args.save_name)
+    createStudy(study_dir, combinations, findFile(args.idf, "idfs"), findFile(args.epw, "weatherData"), backend = args.backend, metrics = args.metrics, fidelity = args.fidelity)
+
+    results = runLocalWorkers(study_dir, Path(args.ep_dir), args.concurrency, watchdog = watchdogFromArgs(args))
+    saveResults(results, args.save_name)
+
+    progress = StudyLedger(study_dir).progress()
+    print (f"Study {args.save_name}: {progress}", flush = True)
+
+    return 1 if progress.get("failed", 0) else 0
+
+
+def workerCommand (args):
+    from src.instrumentation import setVerbose
+    from src.studyRunner import runWorker
+
+    setVerbose(not args.quiet)
+    runWorker(Path(args.study_dir), Path(args.ep_dir), max_items = args.max_items, lease = args.lease, watchdog = watchdogFromArgs(args))
+
+    return 0
+
+
+def addRunArguments (parser):
+    parser.add_argument("parameters", help = "the parameters json file, in simulationParameters/")
+    parser.add_argument("--method", choices = SAMPLING_METHODS, default = "random", help = "the sampling method (default: random)")
+    parser.add_argument("-n", type = int, default = None, help = "the number of samples (not needed for factorial)")
+    parser.add_argument("--seed", type = int, default = None, help = "the seed of the sampling, to generate the same combinations again")
+    parser.add_argument("--resample", action = "store_true", help = "sample new combinations even if they have already been saved for this save name")
+    parser.add_argument("--idf", required = True, help = "the baseline idf, in idfs/")
+    parser.add_argument("--epw", required = True, help = "the weather file, in weatherData/")
+    parser.add_argument("--save-name", default = None, help = "the name the combinations and results are saved under (default: the name of the parameters file)")
+    parser.add_argument("--concurrency", type = int, default = None, help = "the number of simulations run at once (default: the number of processors)")
+    parser.add_argument("--backend", choices = ["csv", "sqlite"], default = "csv")
+    parser.add_argument("--metrics", nargs = "+", default = None, help = "only calculate these metrics (see src/metrics.py)")
+    parser.add_argument("--fidelity", default = "full", help = "the fidelity level of the simulations (see src/idf.py)")
+
+
+def addCommonArguments (parser):
+    parser.add_argument("--ep-dir", default = os.environ.get("ENERGYPLUS_DIR"), help = "the EnergyPlus directory (default: the ENERGYPLUS_DIR environment variable)")
+    parser.add_argument("--timeout", type = float, default = None, help = "stop simulations which run for longer than this [s]")
+    parser.add_argument("--retries", type = int, default = 0, help = "the number of times to retry simulations which time out or crash")
+    parser.add_argument("--quiet", action = "store_true", help = "do not print a message for every simulation")
+
+
+def main (argv = None):
+    parser = argparse.ArgumentParser(prog = "python -m src", description = "Run EnergyPlus studies from the command line.")
+    subparsers = parser.add_subparsers(dest = "command", required = True)
+
+    run = subparsers.add_parser("run", help = "sample the parameters and run the simulations on this machine")
+    addRunArguments(run)
+    addCommonArguments(run)
+    run.set_defaults(function = runCommand)
+
+    study = subparsers.add_parser("study", help = "sample the parameters into a study ledger and run it with worker processes")
+    addRunArguments(study)
+    addCommonArguments(study)
+    study.set_defaults(function = studyCommand)
+
+    worker = subparsers.add_parser("worker", help = "run the items of an existing study")
+    worker.add_argument("study_dir", help = "the folder of the study, eg. outputs/studies/{saveName}")
+    worker.add_argument("--max-items", type = int, default = None, help = "stop after this many simulations")
+    worker.add_argument("--lease", type = float, default = 120, help = "the lease of a claimed item [s] (see src/studyRunner.py)")
+    addCommonArguments(worker)
+    worker.set_defaults(function = workerCommand)
+
+    args = parser.parse_args(argv)
+
+    if args.ep_dir is None:
+        parser.error("the EnergyPlus directory is needed: pass --ep-dir or set ENERGYPLUS_DIR")
+    if not Path(args.ep_dir).exists():
+        parser.error(f"could not find the EnergyPlus directory {args.ep_dir}")
+    if getattr(args, "save_name", "") is None:
+        args.save_name = Path(args.parameters).stem
+
+    return args.function(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,213 @@
+import math
+
+import numpy as np
+import pandas as pd
+from scipy.stats import norm, t
+
+from src.fidelity import runLevel
+from src.instrumentation import log
+from src.sampling import Sampler
+
+
+class StreamingStatistics:
+    """
+    Running estimates of the mean, variance and quantiles of several outputs, updated one batch of simulations at a time.
+
+    The mean and variance are combined batch by batch (Chan's parallel version of Welford's algorithm), so they never need to be recalculated from scratch.
+    Quantiles need the values themselves, which are kept (a Monte Carlo study is at most a few thousand simulations per output).
+    Missing values (eg. failed simulations) are ignored.
+    """
+
+    def __init__ (self, names):
+        self.names = list(names)
+        m = len(self.names)
+        self.count = np.zeros(m, dtype = np.int64)
+        self.mean = np.zeros(m)
+        self.m2 = np.zeros(m)
+        self.values = [[] for _ in range(m)]
+
+    def update (self, values):
+        """
+        Add a batch of results as an n x m array (one column per output).
+        """
+
+        values = np.atleast_2d(np.asarray(values, dtype = float))
+        valid = np.isfinite(values)
+
+        count = valid.sum(axis = 0)
+        total = np.where(valid, values, 0).sum(axis = 0)
+        mean = np.divide(total, count, out = np.zeros(len(count)), where = count > 0)
+        m2 = (np.where(valid, values - mean, 0) ** 2).sum(axis = 0)
+
+        combined = self.count + count
+        delta = mean - self.mean
+        with np.errstate(invalid = "ignore", divide = "ignore"):
+            self.mean = np.where(combined > 0, self.mean + delta * count / combined, 0)
+            self.m2 = np.where(combined > 0, self.m2 + m2 + delta ** 2 * self.count * count / combined, 0)
+        self.count = combined
+
+        for k in range(len(self.names)):
+            self.values[k].extend(values[valid[:, k], k])
+
+    @property
+    def variance (self):
+        return np.divide(self.m2, self.count - 1, out = np.full(len(self.count), np.nan), where = self.count > 1)
+
+    def meanInterval (self, confidence = 0.95):
+        """
+        Returns the half width of the confidence interval of the mean of each output, using the t-distribution.
+        """
+
+        halfWidth = np.full(len(self.names), np.inf)
+        enough = self.count > 1
+        halfWidth[enough] = t.ppf(0.5 + confidence / 2, self.count[enough] - 1) * np.sqrt(self.variance[enough] / self.count[enough])
+
+        return halfWidth
+
+    def quantile (self, k, q, confidence = 0.95):
+        """
+        Returns a tuple of the estimate of quantile q of output k, and the half width of its distribution-free confidence interval.
+        The interval is found from the order statistics which bound the quantile with the given confidence (the normal approximation to the binomial distribution).
+        """
+
+        values = np.sort(self.values[k])
+        n = len(values)
+        if n == 0:
+            return np.nan, np.inf
+
+        estimate = np.quantile(values, q)
+
+        z = norm.ppf(0.5 + confidence / 2)
+        spread = z * math.sqrt(n * q * (1 - q))
+        lower = math.floor(n * q - spread) - 1
+        upper = math.ceil(n * q + spread)
+        if lower < 0 or upper >= n:
+            # Not enough samples to bound the quantile yet
+            return estimate, np.inf
+
+        return estimate, (values[upper] - values[lower]) / 2
+
+
+class AdaptiveMonteCarlo:
+    """
+    A Monte Carlo uncertainty study which keeps running batches of simulations until the results are precise enough, rather than running a fixed number.
+
+    sample is a function which returns a dataframe of n new combinations, eg. Sampler(parameters, seed).sampleDataFrame.
+    simulate is a function which takes a dataframe of combinations and returns a dataframe of their results with the same index, eg. the one returned by energyPlusSimulator().
+
+    tolerances is a dictionary of the outputs to monitor and the largest acceptable half width of their confidence intervals, eg. {"heatingSum": 0.01, "temperature>28C": 0.05}.
+    The tolerances are fractions of the estimate if relative is True, otherwise they are in the units of each output.
+    The study stops once the confidence intervals of the mean and of each of the quantiles of every monitored output are within tolerance,
+    or when max_samples simulations have been run.
+
+    Random sampling should be used for the confidence intervals to be valid. Quasi-random sequences (eg. Sobol) converge faster, but the intervals are then conservative.
+    """
+
+    def __init__ (self, sample, simulate, tolerances, quantiles = (0.05, 0.5, 0.95), confidence = 0.95, relative = True, batch_size = 32, min_samples = 64, max_samples = 10000):
+        self.sample = sample
+        self.simulate = simulate
+        self.tolerances = dict(tolerances)
+        self.quantiles = list(quantiles)
+        self.confidence = confidence
+        self.relative = relative
+        self.batch_size = batch_size
+        self.min_samples = min_samples
+        self.max_samples = max_samples
+
+        self.statistics = StreamingStatistics(self.tolerances.keys())
+        self.trace = []
+        self.results = []
+        self.n = 0
+
+    def check (self):
+        """
+        Update the stopping trace with the current estimates, and return True if every monitored output is within tolerance.
+        """
+
+        meanHalfWidths = self.statistics.meanInterval(self.confidence)
+        converged = True
+
+        for k, name in enumerate(self.statistics.names):
+            tolerance = self.tolerances[name]
+            row = {"n": self.n, "output": name, "count": int(self.statistics.count[k]), "mean": self.statistics.mean[k], "meanHalfWidth": meanHalfWidths[k]}
+            estimates = [(self.statistics.mean[k], meanHalfWidths[k])]
+
+            for q in self.quantiles:
+                estimate, halfWidth = self.statistics.quantile(k, q, self.confidence)
+                row[f"q{q}"] = estimate
+                row[f"q{q}HalfWidth"] = halfWidth
+                estimates.append((estimate, halfWidth))
+
+            if self.relative:
+                row["converged"] = all(halfWidth <= tolerance * abs(estimate) for estimate, halfWidth in estimates)
+            else:
+                row["converged"] = all(halfWidth <= tolerance for _, halfWidth in estimates)
+
+            converged = converged and row["converged"]
+            self.trace.append(row)
+
+        return converged
+
+    def run (self):
+        """
+        Run batches of simulations until the results converge.
+
+        Returns a tuple of:
+            results: a dataframe of every combination and its results
+            trace: a dataframe of the estimates and confidence intervals of each output after each batch
+        """
+
+        while self.n < self.max_samples:
+            n = min(self.batch_size, self.max_samples - self.n)
+            combinations = self.sample(n)
+            combinations.index = np.arange(self.n, self.n + n)
+
+            results = self.simulate(combinations)
+            self.results.append(combinations.join(results))
+            self.statistics.update(results.reindex(columns = self.statistics.names).to_numpy(dtype = float))
+            self.n += n
+
+            converged = self.check()
+            log (f"{self.n} simulations: " + ", ".join(
+                f"{row['output']} = {row['mean']:.4g} ± {row['meanHalfWidth']:.2g}" for row in self.trace[-len(self.statistics.names):]
+            ))
+
+            if converged and self.n >= self.min_samples:
+                log (f"Converged after {self.n} simulations.")
+                break
+        else:
+            log (f"Stopped at the maximum of {self.max_samples} simulations before converging.")
+
+        return pd.concat(self.results), pd.DataFrame(self.trace)
+
+
+def energyPlusSimulator (ep_dir, baseline_idf_path, weather_file_path, **kwargs):
+    """
+    Returns a function which simulates a dataframe of combinations with EnergyPlus and returns a dataframe of their results.
+    Any other keyword arguments (eg. metrics, fidelity or max_concurrent) are passed to runLevel.
+    """
+
+    def simulate (combinations):
+        return runLevel(ep_dir, baseline_idf_path, weather_file_path, combinations, **kwargs)
+
+    return simulate
+
+
+def adaptiveMonteCarlo (ep_dir, baseline_idf_path, weather_file_path, parameters, tolerances, seed = None, method = "random", simulator_kwargs = None, **kwargs):
+    """
+    Run an AdaptiveMonteCarlo study of the parameters in a simulationParameters json file with EnergyPlus.
+    simulator_kwargs is a dictionary of the keyword arguments of the simulations (eg. {"metrics": [...], "fidelity": "coarse", "max_concurrent": 8}), which are passed to energyPlusSimulator.
+    Any other keyword arguments (eg. quantiles, batch_size or max_samples) are passed to AdaptiveMonteCarlo.
+
+    Returns a tuple of the results and the stopping trace (see AdaptiveMonteCarlo.run).
+    """
+
+    sampler = Sampler(parameters, seed = seed)
+    study = AdaptiveMonteCarlo(
+        lambda n: sampler.sampleDataFrame(n, method = method),
+        energyPlusSimulator(ep_dir, baseline_idf_path, weather_file_path, **(simulator_kwargs or {})),
+        tolerances,
+        **kwargs,
+    )
+
+    return study.run()
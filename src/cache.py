@@ -0,0 +1,191 @@
+import hashlib
+import os
+from pathlib import Path
+import pickle
+import uuid
+
+
+# The hash of each weather file is kept so that it is only read once per process.
+_weatherFileHashes = {}
+
+
+class ResultCache:
+    """
+    An on-disk cache of simulation results.
+
+    Each entry is keyed by a hash of the rendered idf, the contents of the weather file, the EnergyPlus version, and the metrics which were selected.
+    If any of these change, the key changes and the simulation will be run again.
+    The entries store the parsed dictionaries returned by processHourlyResults and processResilienceResults.
+    These only hold the selected metrics, and different selections can render the same idf (eg. ["heatingSum"] and ["heatingMax"] both need only the heating column),
+    which is why the metrics are part of the key.
+
+    Each entry is stored in its own file which is written to a temporary file first and then moved into place.
+    This means that many pool workers can safely read and write to the same cache directory at the same time.
+
+    Entries are evicted least recently used first once the cache exceeds max_bytes or max_entries.
+    Reading an entry updates its modification time, which is used to determine the least recently used entries.
+    """
+
+    def __init__ (self, cache_dir = Path("outputs", "cache"), max_bytes = None, max_entries = None, evict_every = 50):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.evict_every = evict_every
+
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+
+        Path.mkdir(self.cache_dir, parents = True, exist_ok = True)
+
+    def key (self, contents, weather_file_path, ep_version, metrics = None):
+        """
+        Returns the cache key for the contents of a rendered idf, the weather file, the EnergyPlus version, and the list of metrics (None for all of them).
+        """
+
+        h = hashlib.sha256()
+        h.update(contents.encode("UTF-8") if isinstance(contents, str) else contents)
+        h.update(b"\0")
+        h.update(hashWeatherFile(weather_file_path).encode("UTF-8"))
+        h.update(b"\0")
+        h.update(str(ep_version).encode("UTF-8"))
+        h.update(b"\0")
+        h.update(("\0".join(sorted(metrics)) if metrics is not None else "all metrics").encode("UTF-8"))
+
+        return h.hexdigest()
+
+    def path (self, key):
+        # Entries are split into sub folders to avoid a single directory with many thousands of files.
+        return Path(self.cache_dir, key[:2], f"{key}.pkl")
+
+    def get (self, key):
+        """
+        Returns a tuple of the hourly results and resilience results, or None if the key is not in the cache.
+        """
+
+        entry = self.load(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        hourlyResults, resilienceResults = entry[:2]
+
+        # Update the modification time to mark this entry as recently used.
+        try:
+            os.utime(self.path(key))
+        except FileNotFoundError:
+            pass
+
+        self.hits += 1
+        return hourlyResults, resilienceResults
+
+    def load (self, key):
+        # Returns the tuple stored in an entry, or None if there is no entry
+        try:
+            with open (self.path(key), "rb") as f:
+                return pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def getSeries (self, key):
+        """
+        Returns a tuple of the hourly values ({variable: array}) and the month of each timestep saved with an entry, or None if the entry has none.
+        These are only saved when the simulation was written to a TimeseriesCube, so that a cached run can still be written to a cube.
+        """
+
+        entry = self.load(key)
+        if entry is None or len(entry) < 3:
+            return None
+        return entry[2]
+
+    def put (self, key, hourlyResults, resilienceResults, series = None):
+        """
+        Save the results to the cache. series is an optional tuple of the hourly values and months of the simulation (see getSeries).
+        """
+
+        path = self.path(key)
+        Path.mkdir(path.parent, exist_ok = True)
+
+        # Write to a unique temporary file and then move it into place. os.replace is atomic, so a reader will never see a partial file.
+        tmp_path = path.with_suffix(f".{os.getpid()}.{uuid.uuid4().hex}.tmp")
+        with open (tmp_path, "wb") as f:
+            entry = (hourlyResults, resilienceResults) if series is None else (hourlyResults, resilienceResults, series)
+            pickle.dump(entry, f, protocol = pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+        self._puts += 1
+        if self._puts % self.evict_every == 0:
+            self.evict()
+
+    def entries (self):
+        """
+        Returns a list of (path, size, modification time) for each entry in the cache.
+        """
+
+        entries = []
+        for path in self.cache_dir.glob("*/*.pkl"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                # Another worker may have evicted the entry.
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+
+        return entries
+
+    def evict (self):
+        """
+        Delete the least recently used entries until the cache is within max_bytes and max_entries.
+        Returns the number of entries deleted.
+        """
+
+        if self.max_bytes is None and self.max_entries is None:
+            return 0
+
+        entries = sorted(self.entries(), key = lambda x: x[2])
+        total_bytes = sum(x[1] for x in entries)
+        n_entries = len(entries)
+
+        n_deleted = 0
+        for path, size, _ in entries:
+            over_bytes = self.max_bytes is not None and total_bytes > self.max_bytes
+            over_entries = self.max_entries is not None and n_entries > self.max_entries
+            if not (over_bytes or over_entries):
+                break
+
+            try:
+                path.unlink()
+                n_deleted += 1
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+            n_entries -= 1
+
+        return n_deleted
+
+    def clear (self):
+        """
+        Delete every entry in the cache.
+        """
+
+        for path, _, _ in self.entries():
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def hashWeatherFile (weather_file_path):
+    """
+    Returns a hash of the contents of the weather file.
+    The hash is stored per process and only recalculated if the file is modified.
+    """
+
+    path = Path(weather_file_path).resolve()
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+
+    if key not in _weatherFileHashes:
+        with open (path, "rb") as f:
+            _weatherFileHashes[key] = hashlib.sha256(f.read()).hexdigest()
+
+    return _weatherFileHashes[key]
@@ -0,0 +1,118 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from src.instrumentation import log
+from src.scheduler import iterBatch
+
+
+def runLevel (ep_dir, baseline_idf_path, weather_file_path, combinations, fidelity = "full", metrics = None, max_concurrent = None, watchdog = None):
+    """
+    Run every row of a combinations dataframe at the given fidelity level (see src.idf.FIDELITY_LEVELS).
+
+    Returns a dataframe with the same index as combinations and a column for each result metric, and a column of the simulation times [s].
+    Simulations which failed have NaN results.
+    """
+
+    rows = {}
+    times = {}
+    for i, retcode, hourlyResults, resilienceResults in iterBatch(ep_dir, baseline_idf_path, weather_file_path, combinations, max_concurrent, metrics = metrics, watchdog = watchdog, fidelity = fidelity):
+        if retcode.returncode == 0:
+            rows[i] = {**hourlyResults, **resilienceResults}
+        else:
+            rows[i] = {}
+        times[i] = getattr(retcode, "elapsed", None)
+
+    results = pd.DataFrame.from_dict(rows, orient = "index").reindex(combinations.index)
+    results["time [s]"] = pd.Series(times, dtype = float).reindex(combinations.index)
+
+    return results
+
+
+def compareFidelity (ep_dir, baseline_idf_path, weather_file_path, combinations, levels = ("coarse", "sampled", "peak"), metrics = None, max_concurrent = None, watchdog = None, full = None):
+    """
+    Run the same designs at full fidelity and at each of the given fidelity levels, and report how far the metrics of each level deviate from the full annual simulation.
+    If the full results have already been calculated (with runLevel), they can be passed as full to avoid running them again.
+
+    The report has a row for each level and metric with:
+        meanAbsoluteError: the mean absolute difference from the full simulation
+        meanRelativeError [%] and maxRelativeError [%]: the difference as a percentage of the full result (designs where the full result is 0 are ignored)
+        rankCorrelation: the Spearman rank correlation with the full results. When screening, this matters more than the error, as only the order of the designs is used.
+        speedUp: the mean time of a full simulation divided by the mean time at this level
+
+    Returns a tuple of the report dataframe and a dictionary of the results dataframe of each level (including "full").
+    """
+
+    if full is None:
+        full = runLevel(ep_dir, baseline_idf_path, weather_file_path, combinations, "full", metrics, max_concurrent, watchdog)
+
+    results = {"full": full}
+    rows = []
+    for level in levels:
+        results[level] = runLevel(ep_dir, baseline_idf_path, weather_file_path, combinations, level, metrics, max_concurrent, watchdog)
+
+        for metric in results[level].columns:
+            if metric == "time [s]" or metric not in full.columns:
+                continue
+
+            reference = pd.to_numeric(full[metric], errors = "coerce")
+            estimate = pd.to_numeric(results[level][metric], errors = "coerce")
+            error = (estimate - reference).abs()
+            relativeError = (error / reference.abs().replace(0, np.nan)) * 100
+
+            rows.append({
+                "level": level,
+                "metric": metric,
+                "meanAbsoluteError": error.mean(),
+                "meanRelativeError [%]": relativeError.mean(),
+                "maxRelativeError [%]": relativeError.max(),
+                "rankCorrelation": reference.corr(estimate, method = "spearman"),
+                "speedUp": full["time [s]"].mean() / results[level]["time [s]"].mean(),
+            })
+
+    report = pd.DataFrame(rows, columns = ["level", "metric", "meanAbsoluteError", "meanRelativeError [%]", "maxRelativeError [%]", "rankCorrelation", "speedUp"])
+
+    return report, results
+
+
+def screenAndPromote (ep_dir, baseline_idf_path, weather_file_path, combinations, objective, fidelity = "coarse", fraction = 0.2, metrics = None, max_concurrent = None, watchdog = None):
+    """
+    Screen a large set of designs at a cheap fidelity level and only run the best fraction of them as full annual simulations.
+
+    objective is the name of the metric to minimise (eg. "heatingSum"), or a list of metrics for multi-objective studies.
+    With several objectives the designs are ranked by their Pareto front (as in NSGA-II), so the promoted designs are the non-dominated ones first.
+    To maximise a metric, run the screening yourself with runLevel and negate it.
+
+    Returns a tuple of:
+        screening: the results of every design at the screening fidelity, with a "promoted" column
+        full: the full annual results of the promoted designs
+    """
+
+    objectives = [objective] if isinstance(objective, str) else list(objective)
+
+    screening = runLevel(ep_dir, baseline_idf_path, weather_file_path, combinations, fidelity, metrics, max_concurrent, watchdog)
+
+    missing = [o for o in objectives if o not in screening.columns]
+    if missing:
+        raise Exception (f"The objectives {missing} are not calculated at the {fidelity} fidelity level.")
+
+    valid = screening.dropna(subset = objectives)
+    n_promote = min(len(valid), math.ceil(fraction * len(combinations)))
+
+    if len(objectives) == 1:
+        ranking = valid[objectives[0]].sort_values().index
+    else:
+        # Imported here as pymoo is only needed for multi-objective screening
+        from pymoo.util.nds.non_dominated_sorting import NonDominatedSorting
+
+        fronts = NonDominatedSorting().do(valid[objectives].to_numpy(dtype = float))
+        ranking = valid.index[np.concatenate(fronts)]
+
+    promoted = ranking[:n_promote]
+    screening["promoted"] = screening.index.isin(promoted)
+
+    log (f"Promoting {len(promoted)} of {len(combinations)} designs from the {fidelity} screening to full simulations.")
+    full = runLevel(ep_dir, baseline_idf_path, weather_file_path, combinations.loc[promoted], "full", metrics, max_concurrent, watchdog)
+
+    return screening, full
@@ -1,53 +1,497 @@
+import datetime
+import os
 from pathlib import Path
+import re
+
+from src.instrumentation import log
 
 # Locate the path to the root directory
 current_dir = Path().absolute()
 root_dir = current_dir.parent
 
-
-def modifyIDF (baseline_idf_path, new_idf_path, inputs):
+# The variables to be replaced in the idf are denoted by @ signs either side of the variable name. eg '@u_windows@'
+PLACEHOLDER_PATTERN = re.compile(r"@([A-Za-z0-9_]+)@")
+
+# Inputs which are not injected directly into the idf but are used to derive the values of other placeholders.
+DERIVED_PLACEHOLDERS = {
+    "wwr": [
+        "windowNorth_x0", "windowNorth_x1", "windowNorth_z0", "windowNorth_z1", "windowOpeningArea_N",
+        "windowEast_y0", "windowEast_y1", "windowEast_z0", "windowEast_z1", "windowOpeningArea_E",
+        "windowSouth_x0", "windowSouth_x1", "windowSouth_z0", "windowSouth_z1", "windowOpeningArea_S",
+        "windowWest_y0", "windowWest_y1", "windowWest_z0", "windowWest_z1", "windowOpeningArea_W",
+        "internalMass",
+    ],
+    "ach_50": ["flowCoefficient"],
+}
+
+# Cheaper versions of the simulation which can be used to screen designs before running the full annual simulation (see applyFidelity).
+#   timestep: the number of timesteps per hour (the baseline idfs use 4)
+#   runPeriods: a list of (name, begin month, begin day, end month, end day) which replace the annual run period. Summed results are scaled up to a full year.
+#   sizingPeriods: only run the extreme weeks of the weather file (SizingPeriod:WeatherFileConditionType) instead of the run period
+#   metrics: the only metrics which are meaningful at this level. Other metrics are not calculated.
+FIDELITY_LEVELS = {
+    "full": {},
+    "coarse": {"timestep": 1},
+    "sampled": {
+        "timestep": 1,
+        "runPeriods": [
+            ("Winter Sample", 1, 1, 1, 14),
+            ("Spring Sample", 4, 1, 4, 14),
+            ("Summer Sample", 7, 1, 7, 14),
+            ("Autumn Sample", 10, 1, 10, 14),
+        ],
+    },
+    "peak": {
+        "timestep": 1,
+        "sizingPeriods": [("Winter Extreme", "WinterExtreme"), ("Summer Extreme", "SummerExtreme")],
+        "metrics": ["heatingMax", "coolingMax", "temperatureMax"],
+    },
+}
+
+# Compiled templates are kept for each baseline idf so that the file is only read and parsed once per process.
+_templateCache = {}
+
+
+def modifyIDF (baseline_idf_path, new_idf_path, inputs, strict = False, fidelity = "full"):
     """"
     This function modifies an idf template based on the given inputs.
-    The function uses a search and replace method to inject values in to the idf
     The variables to be replaced in the idf are denoted by @ signs either side of the variable name. eg '@u_windows@'
-    If variable does not exist, the replace function will return the existing contents.
+    The baseline idf is only read and parsed once per process (see loadTemplate) and each design is rendered in a single pass.
+    If a variable does not exist in the idf it is ignored, but a warning is logged (see src.instrumentation.log) so that misspelled keys are not silently lost.
+    Set strict = True to raise an error instead.
+    fidelity is one of the FIDELITY_LEVELS (see applyFidelity).
+    """
+
+    contents = renderIDF(baseline_idf_path, inputs, strict = strict, fidelity = fidelity)
+
+    # Write the updated idf file to the new_idf_path where it can then be run.
+    with open(new_idf_path, "w") as f:
+        f.write(contents)
+
+
+def renderIDF (baseline_idf_path, inputs, strict = False, sqlite = False, tables = True, metrics = None, fidelity = "full"):
+    """
+    Returns the contents of the baseline idf with the given inputs injected, without writing anything to disk.
+    The sqlite, tables, metrics and fidelity options are passed to loadTemplate.
+    """
+
+    template = loadTemplate(baseline_idf_path, sqlite = sqlite, tables = tables, metrics = metrics, fidelity = fidelity)
+
+    return template.render(inputs, strict = strict, warn = True)
+
+
+def loadTemplate (baseline_idf_path, sqlite = False, tables = True, metrics = None, fidelity = "full"):
+    """
+    Returns the compiled IDFTemplate for the given baseline idf.
+    Templates are cached per process and are re-read if the file is modified on disk.
+
+    The output options are applied to the baseline once, before it is compiled:
+        sqlite: if True, EnergyPlus will also write its results to eplusout.sql (see enableSQLite)
+        tables: if False, EnergyPlus will not write the eplusout.csv and eplustbl.* reports (only used with sqlite = True)
+        metrics: a list of the metrics in src.metrics.METRICS. If given, only the output variables and reports these metrics need are kept (see pruneOutputs)
+        fidelity: one of the FIDELITY_LEVELS. Levels which only support some metrics also prune the outputs of the others.
+    """
+
+    path = Path(baseline_idf_path).resolve()
+    stat = os.stat(path)
+    metrics = fidelityMetrics(fidelity, metrics)
+    metrics = tuple(metrics) if metrics is not None else None
+    key = (path, stat.st_mtime_ns, stat.st_size, sqlite, tables, metrics, fidelity)
+
+    template = _templateCache.get(key)
+    if template is None:
+        with open (path, "r") as f:
+            contents = f.read()
+
+        contents = applyFidelity(contents, fidelity)
+
+        if sqlite:
+            contents = enableSQLite(contents, tables = tables)
+
+        if metrics is not None:
+            # Imported here as src.metrics depends on the results processing modules
+            from src.metrics import requiredOutputs, requiredVariables
+            _, reports = requiredOutputs(metrics)
+            contents = pruneOutputs(contents, requiredVariables(metrics), reports)
+
+        template = IDFTemplate(contents, name = path.name)
+        _templateCache[key] = template
+
+    return template
+
+
+def applyFidelity (contents, fidelity):
+    """
+    Reduce the cost of the simulation according to one of the FIDELITY_LEVELS:
+        full: the annual simulation of the baseline idf, unchanged
+        coarse: the annual simulation with 1 timestep per hour
+        sampled: two weeks of each season with 1 timestep per hour. Summed results are scaled up to a full year (see fidelityScale)
+        peak: only the extreme summer and winter weeks of the weather file. Only the peak heating, cooling and temperature are calculated.
+
+    The weather files do not come with design days (.ddy), so the peak level uses the extreme weeks listed in the header of the epw instead.
+    """
+
+    if fidelity not in FIDELITY_LEVELS:
+        raise Exception (f"Unknown fidelity level: {fidelity}. The available levels are {list(FIDELITY_LEVELS)}")
+
+    level = FIDELITY_LEVELS[fidelity]
+
+    if "timestep" in level:
+        contents = setField(contents, "Number of Timesteps per Hour", str(level["timestep"]))
+
+    if "runPeriods" in level:
+        match = objectPattern("RunPeriod").search(contents)
+        if match is None:
+            raise Exception ("Could not find the RunPeriod object in the idf.")
+
+        runPeriods = []
+        for name, beginMonth, beginDay, endMonth, endDay in level["runPeriods"]:
+            text = setField(match.group(0), "Name", name)
+            text = setField(text, "Begin Month", str(beginMonth))
+            text = setField(text, "Begin Day of Month", str(beginDay))
+            text = setField(text, "End Month", str(endMonth))
+            text = setField(text, "End Day of Month", str(endDay))
+            runPeriods.append(text)
+
+        contents = contents[:match.start()] + "".join(runPeriods) + contents[match.end():]
+
+    if "sizingPeriods" in level:
+        contents = setField(contents, "Run Simulation for Sizing Periods", "Yes")
+        contents = setField(contents, "Run Simulation for Weather File Run Periods", "No")
+        for name, period in level["sizingPeriods"]:
+            contents += (
+                f"\n\nSizingPeriod:WeatherFileConditionType,\n"
+                f"    {name + ',':<25}!- Name\n"
+                f"    {period + ',':<25}!- Period Selection\n"
+                f"    {'Monday,':<25}!- Day of Week for Start Day\n"
+                f"    {'No,':<25}!- Use Weather File Daylight Saving Period\n"
+                f"    {'No;':<25}!- Use Weather File Rain and Snow Indicators\n"
+            )
+
+    return contents
+
+
+def fidelityMetrics (fidelity, metrics):
+    """
+    Returns the metrics which can be calculated at the given fidelity level.
+    If metrics is None, all metrics are used at levels which support them, otherwise only the metrics of the level.
+    """
+
+    supported = FIDELITY_LEVELS[fidelity].get("metrics")
+    if supported is None:
+        return metrics
+    if metrics is None:
+        return list(supported)
+
+    return [m for m in metrics if m in supported]
+
+
+def fidelityScale (fidelity, year = 2025):
+    """
+    Returns the factor which summed results (eg. heatingSum or hours above 28C) must be multiplied by to estimate the annual value at the given fidelity level.
+    """
+
+    level = FIDELITY_LEVELS[fidelity]
+    if "runPeriods" not in level:
+        return 1
+
+    days = sum(
+        (datetime.date(year, endMonth, endDay) - datetime.date(year, beginMonth, beginDay)).days + 1
+        for _, beginMonth, beginDay, endMonth, endDay in level["runPeriods"]
+    )
+    yearDays = (datetime.date(year, 12, 31) - datetime.date(year, 1, 1)).days + 1
+
+    return yearDays / days
+
+
+def setField (contents, field, value):
+    """
+    Set the value of the field with the given comment, eg. setField(contents, "Number of Timesteps per Hour", "1")
+    The field must only appear once in the contents, so to edit an object which appears several times, pass the text of that object alone.
+    """
+
+    pattern = re.compile(rf"^([ \t]*)([^,;!\n]*)([,;])([ \t]*)(!- {re.escape(field)}[ \t]*)$", re.MULTILINE)
+
+    def replace (match):
+        # Keep the comments aligned with the rest of the object
+        padding = " " * max(1, len(match.group(2)) + len(match.group(4)) - len(value))
+        return f"{match.group(1)}{value}{match.group(3)}{padding}{match.group(5)}"
+
+    contents, n = pattern.subn(replace, contents)
+    if n != 1:
+        raise Exception (f"Expected to find the '{field}' field once in the idf, but found it {n} times.")
+
+    return contents
+
+
+def objectPattern (objectClass):
+    """
+    Returns a regular expression which matches a whole idf object of the given class, up to the end of the line with its closing semicolon, along with the blank line which separates it from the next object.
+    """
+
+    return re.compile(rf"^[ \t]*{re.escape(objectClass)},[^;]*;[^\n]*\n?(?:[ \t]*\n)?", re.MULTILINE | re.IGNORECASE)
+
+
+def setOutputControlFile (contents, field, value):
+    """
+    Set one of the Yes/No fields of the OutputControl:Files object, eg. setOutputControlFile(contents, "Output SQLite", "Yes")
+    """
+
+    pattern = re.compile(rf"^(\s*)(Yes|No)([,;])(\s*)(!- {re.escape(field)}\s*)$", re.MULTILINE)
+
+    def replace (match):
+        # Keep the comments aligned with the rest of the object
+        padding = " " * max(1, len(match.group(2)) + len(match.group(4)) - len(value))
+        return f"{match.group(1)}{value}{match.group(3)}{padding}{match.group(5)}"
+
+    contents, n = pattern.subn(replace, contents)
+    if n == 0:
+        raise Exception (f"Could not find the '{field}' field of OutputControl:Files in the idf.")
+
+    return contents
+
+
+def removeObjects (contents, objectClass, condition = None):
+    """
+    Remove every object of the given class (eg. 'Output:Variable') from the contents of an idf.
+    If a condition is given, it is called with the list of field values of each object and the object is only removed if it returns True.
+    """
+
+    pattern = objectPattern(objectClass)
+
+    def replace (match):
+        if condition is None or condition(objectFields(match.group(0))):
+            return ""
+        return match.group(0)
+
+    return pattern.sub(replace, contents)
+
+
+def objectFields (text):
+    """
+    Returns the list of field values of a single idf object (excluding the class name), with the comments removed.
+    """
+
+    text = "\n".join(line.split("!")[0] for line in text.splitlines())
+    fields = [field.strip() for field in text.split(";")[0].split(",")]
+
+    return fields[1:]
+
+
+def pruneOutputs (contents, variables, reports, dictionary = False):
+    """
+    Remove the outputs which are not needed from the contents of an idf. This reduces the amount of data written to disk by each simulation.
+
+    variables: the names of the Output:Variable objects to keep, eg. ['Zone Operative Temperature']. All other Output:Variable objects are removed.
+    reports: the names of the summary reports to keep, eg. ['ThermalResilienceSummary']. If none are needed, the summary and reporting period tables are removed.
+    dictionary: if False, the Output:VariableDictionary (rdd and mdd) reports are removed.
     """
 
-    # Open the baseline idf as a text file.
-    with open (baseline_idf_path, "r") as f:
-        contents = f.read()
+    keep = {v.lower() for v in variables}
+    contents = removeObjects(contents, "Output:Variable", lambda fields: fields[1].lower() not in keep)
+
+    if not dictionary:
+        contents = removeObjects(contents, "Output:VariableDictionary")
+        contents = setOutputControlFile(contents, "Output RDD", "No")
+        contents = setOutputControlFile(contents, "Output MDD", "No")
+
+    if "ThermalResilienceSummary" not in reports:
+        contents = removeObjects(contents, "Output:Table:SummaryReports", lambda fields: "ThermalResilienceSummary" in fields)
+        contents = removeObjects(contents, "Output:Table:ReportPeriod")
+
+    return contents
+
+
+def enableSQLite (contents, tables = True):
+    """
+    Turn on the SQLite output so that the hourly results and the tabular reports are written to eplusout.sql.
+    If tables is False, the eplusout.csv and eplustbl.* files are no longer written, which saves the cost of generating the text reports.
+    """
 
-    # Loop through the variables in the inputs dictionary.
-    # Some variables, such as building geometry and air infiltration require pre-processing before being inserted into the idf
-    # Other variables can be done using a search and replace method which finds the key denoted with @ signs either side and injects the values into the idf.
-    for k, v in inputs.items():
-        if k == "wwr":
-            contents = windowGeometry (contents, inputs)
-            contents = internalMass(contents, inputs)
+    contents = setOutputControlFile(contents, "Output SQLite", "Yes")
 
-        elif k == "ach_50":
-            # Convert the ach_50 into a flow coefficient for use with the AIM-2/ZoneInfiltration:FlowCoefficient object
-            Volume = inputs["height"] * inputs["length"] * inputs["width"]
-            c_zone = ACH_to_flowCoefficient(v, Volume)
-            contents = contents.replace("@flowCoefficient@", str(c_zone))
+    if not tables:
+        contents = setOutputControlFile(contents, "Output CSV", "No")
+        contents = setOutputControlFile(contents, "Output Tabular", "No")
 
-            """
-            This code is for use with the airflow network. It is turned off for now.
+    if "Output:SQLite," not in contents:
+        contents += "\n\nOutput:SQLite,\n    SimpleAndTabular;        !- Option Type\n"
+
+    return contents
+
+
+class IDFTemplate:
+    """
+    A baseline idf which has been parsed once so that many designs can be rendered from it.
+
+    The idf is split into the literal text between placeholders and the names of the placeholders themselves.
+    Rendering a design then only requires joining the pieces together in a single pass rather than copying the whole file once for every key.
+
+    The template also reports placeholders which would be left unfilled and inputs which do not appear in the idf.
+    """
 
-            # Convert the ach_50 into an effective leakage area for use with the AirflowNetwork:Surface:EffectiveLeakageArea
-            contents = flowCoefficient_to_effectiveLeakageArea_10(contents, c_zone, inputs["height"], inputs["width"], inputs["height"])
-            """
+    def __init__ (self, contents, name = "idf"):
+        self.name = name
+        self.contents = contents
+
+        # re.split with a capture group returns the literal text at even positions and the placeholder names at odd positions.
+        self.pieces = PLACEHOLDER_PATTERN.split(contents)
+
+        # Record where each placeholder occurs so it can be filled in directly.
+        self.positions = {}
+        for position in range(1, len(self.pieces), 2):
+            placeholder = self.pieces[position]
+            self.positions.setdefault(placeholder, []).append(position)
+            # Unfilled placeholders are written back out with their @ signs in place.
+            self.pieces[position] = f"@{placeholder}@"
+
+        self.placeholders = set(self.positions)
+
+    @classmethod
+    def fromFile (cls, baseline_idf_path):
+        with open (baseline_idf_path, "r") as f:
+            contents = f.read()
+
+        return cls(contents, name = Path(baseline_idf_path).name)
+
+    def validate (self, inputs, values = None):
+        """
+        Compare the inputs against the placeholders in the template.
+        values are the placeholder values of the inputs from placeholderValues, if they have already been calculated.
+
+        Returns a dictionary containing:
+            unused: input keys which do not appear in the idf (directly or through a derived placeholder such as wwr -> window coordinates)
+            unfilled: placeholders in the idf which will not be given a value by these inputs
+        """
+
+        if values is None:
+            values = placeholderValues(inputs)
+
+        unused = [
+            k for k in inputs
+            if k not in self.placeholders
+            and not self.placeholders.intersection(DERIVED_PLACEHOLDERS.get(k, []))
+        ]
+        unfilled = sorted(self.placeholders.difference(values))
+
+        return {"unused": unused, "unfilled": unfilled}
+
+    def describe (self, report):
+        """
+        Returns a readable summary of the report returned by validate().
+        """
+
+        messages = []
+        if report["unused"]:
+            messages.append(f"inputs not used by {self.name}: {report['unused']}")
+        if report["unfilled"]:
+            messages.append(f"placeholders left unfilled in {self.name}: {report['unfilled']}")
+
+        return "; ".join(messages)
+
+    def render (self, inputs, strict = False, warn = False):
+        """
+        Returns the contents of the idf with the values for the given inputs injected.
+        If strict is True, an error is raised if any inputs are unused or any placeholders are left unfilled. Otherwise, if warn is True, a warning is logged instead.
+        The placeholder values are only calculated once, and are used for both the checks and the rendering.
+        """
+
+        values = placeholderValues(inputs)
+
+        if strict or warn:
+            self.check(inputs, values, strict)
+
+        return self.renderValues(values)
+
+    def check (self, inputs, values, strict):
+        """
+        Raise an error (if strict is True) or log a warning if any inputs are unused or any placeholders are left unfilled.
+        """
+
+        report = self.validate(inputs, values)
+        if report["unused"] or report["unfilled"]:
+            if strict:
+                raise Exception (f"Invalid inputs for the idf template. {self.describe(report)}")
+            log (f"Warning: {self.describe(report)}")
+
+    def renderValues (self, values):
+        """
+        Fill the template using a dictionary of placeholder values which have already been converted to strings.
+        """
+
+        pieces = self.pieces.copy()
+        for placeholder, positions in self.positions.items():
+            value = values.get(placeholder)
+            if value is None:
+                continue
+            for position in positions:
+                pieces[position] = value
+
+        return "".join(pieces)
+
+    def renderBatch (self, combinations, strict = True):
+        """
+        Render every row of a combinations dataframe (or any iterable of input dictionaries).
+        As every row shares the same keys, the inputs are only validated once, using the first row.
+
+        Yields a tuple of the row index and the rendered contents of the idf.
+        """
+
+        if hasattr(combinations, "to_dict"):
+            rows = zip(combinations.index, combinations.to_dict("records"))
         else:
-            key = f"@{k}@"
-            contents = contents.replace(key, str(v))
+            rows = enumerate(combinations)
+
+        for n, (i, inputs) in enumerate(rows):
+            values = placeholderValues(inputs)
+            if n == 0:
+                self.check(inputs, values, strict)
+
+            yield i, self.renderValues(values)
+
+
+def placeholderValues (inputs):
+    """
+    Convert a dictionary of inputs into the string values of every placeholder they provide.
+    Some variables, such as building geometry and air infiltration require pre-processing before being inserted into the idf.
+    This is equivalent to the search and replace steps of windowGeometry, internalMass, ACH_to_flowCoefficient and daylightingReferencePoint.
+    """
+
+    values = {k: str(v) for k, v in inputs.items()}
+
+    if "wwr" in inputs:
+        values.update(windowGeometryValues(inputs))
+        values.update(internalMassValues(inputs))
+
+    if "ach_50" in inputs:
+        # Convert the ach_50 into a flow coefficient for use with the AIM-2/ZoneInfiltration:FlowCoefficient object
+        Volume = inputs["height"] * inputs["length"] * inputs["width"]
+        c_zone = ACH_to_flowCoefficient(inputs["ach_50"], Volume)
+        values["flowCoefficient"] = str(c_zone)
+
+        """
+        This code is for use with the airflow network. It is turned off for now.
+
+        # Convert the ach_50 into an effective leakage area for use with the AirflowNetwork:Surface:EffectiveLeakageArea
+        contents = flowCoefficient_to_effectiveLeakageArea_10(contents, c_zone, inputs["height"], inputs["width"], inputs["height"])
+        """
 
     # Find the centre points of the plan geometry for the daylighting reference point
+    if "length" in inputs and "width" in inputs:
+        values.update(daylightingReferencePointValues(inputs["length"], inputs["width"]))
 
-    contents = daylightingReferencePoint (contents, inputs["length"], inputs["width"] )
+    return values
 
-    # Write the updated idf file to the new_idf_path where it can then be run.
-    with open(new_idf_path, "w") as f:
-        f.write(contents)
+
+def replacePlaceholders (contents, values):
+    """
+    Search and replace each of the given placeholder values in the contents of an idf.
+    """
+
+    for k, v in values.items():
+        contents = contents.replace(f"@{k}@", v)
+
+    return contents
 
 def windowGeometry(contents, inputs, openingWidth = 0.15):
     """
@@ -63,6 +507,15 @@ def windowGeometry(contents, inputs, openingWidth = 0.15):
     It assumed that they have a default openingWidth of 0.15m. Too big and we encounter the oscillation issue of simultaneous venting and heating which distorts results.
     """
 
+    return replacePlaceholders(contents, windowGeometryValues(inputs, openingWidth))
+
+def windowGeometryValues(inputs, openingWidth = 0.15):
+    """
+    Returns the values of the window geometry placeholders for windowGeometry as a dictionary of strings.
+    """
+
+    values = {}
+
     x_surface = inputs["width"]
     y_surface = inputs["length"]
     z_surface = inputs["height"]
@@ -70,86 +523,89 @@ def windowGeometry(contents, inputs, openingWidth = 0.15):
 
     # First do the North facing window by getting the window coordinates and then placing the coordinates into the idf file.
     x_0, x_1, z_0, z_1 = getWindowCoordinates (x_surface, z_surface, wwr)
-    key = "@windowNorth_x0@"
-    contents = contents.replace(key, str(x_0))
-    key = "@windowNorth_x1@"
-    contents = contents.replace(key, str(x_1))
-    key = "@windowNorth_z0@"
-    contents = contents.replace(key, str(z_0))
-    key = "@windowNorth_z1@"
-    contents = contents.replace(key, str(z_1))
+    key = "windowNorth_x0"
+    values[key] = str(x_0)
+    key = "windowNorth_x1"
+    values[key] = str(x_1)
+    key = "windowNorth_z0"
+    values[key] = str(z_0)
+    key = "windowNorth_z1"
+    values[key] = str(z_1)
 
     # Determine the opening area of the window to use in the Wind and Stack Open Area object
     A_opening = (z_1 - z_0) * openingWidth
 
-    key = "@windowOpeningArea_N@"
-    contents = contents.replace(key, str(A_opening))
+    key = "windowOpeningArea_N"
+    values[key] = str(A_opening)
 
 
     # Repeat for the East window
     y_0, y_1, z_0, z_1 = getWindowCoordinates (y_surface, z_surface, wwr)
-    key = "@windowEast_y0@"
-    contents = contents.replace(key, str(y_0))
-    key = "@windowEast_y1@"
-    contents = contents.replace(key, str(y_1))
-    key = "@windowEast_z0@"
-    contents = contents.replace(key, str(z_0))
-    key = "@windowEast_z1@"
-    contents = contents.replace(key, str(z_1))
+    key = "windowEast_y0"
+    values[key] = str(y_0)
+    key = "windowEast_y1"
+    values[key] = str(y_1)
+    key = "windowEast_z0"
+    values[key] = str(z_0)
+    key = "windowEast_z1"
+    values[key] = str(z_1)
 
     A_opening = (z_1 - z_0) * openingWidth
 
-    key = "@windowOpeningArea_E@"
-    contents = contents.replace(key, str(A_opening))
+    key = "windowOpeningArea_E"
+    values[key] = str(A_opening)
 
 
     #Repeat this for the South window
     x_0, x_1, z_0, z_1 = getWindowCoordinates (x_surface, z_surface, wwr)
-    key = "@windowSouth_x0@"
-    contents = contents.replace(key, str(x_0))
-    key = "@windowSouth_x1@"
-    contents = contents.replace(key, str(x_1))
-    key = "@windowSouth_z0@"
-    contents = contents.replace(key, str(z_0))
-    key = "@windowSouth_z1@"
-    contents = contents.replace(key, str(z_1))
+    key = "windowSouth_x0"
+    values[key] = str(x_0)
+    key = "windowSouth_x1"
+    values[key] = str(x_1)
+    key = "windowSouth_z0"
+    values[key] = str(z_0)
+    key = "windowSouth_z1"
+    values[key] = str(z_1)
 
     A_opening = (z_1 - z_0) * openingWidth
 
-    key = "@windowOpeningArea_S@"
-    contents = contents.replace(key, str(A_opening))
+    key = "windowOpeningArea_S"
+    values[key] = str(A_opening)
 
     # Repeat for the West window
     y_0, y_1, z_0, z_1 = getWindowCoordinates (y_surface, z_surface, wwr)
-    key = "@windowWest_y0@"
-    contents = contents.replace(key, str(y_0))
-    key = "@windowWest_y1@"
-    contents = contents.replace(key, str(y_1))
-    key = "@windowWest_z0@"
-    contents = contents.replace(key, str(z_0))
-    key = "@windowWest_z1@"
-    contents = contents.replace(key, str(z_1))
+    key = "windowWest_y0"
+    values[key] = str(y_0)
+    key = "windowWest_y1"
+    values[key] = str(y_1)
+    key = "windowWest_z0"
+    values[key] = str(z_0)
+    key = "windowWest_z1"
+    values[key] = str(z_1)
 
     A_opening = (z_1 - z_0) * openingWidth
 
-    key = "@windowOpeningArea_W@"
-    contents = contents.replace(key, str(A_opening))
+    key = "windowOpeningArea_W"
+    values[key] = str(A_opening)
 
 
-    return contents
+    return values
 
 def internalMass(contents, inputs):
     """
     This function calculates the amount internal Mass surface area [m^2] and injects that value into the idf file.
     Assumes that there is one internal wall running the length of the building and running the width of the building. Therefore the amount of thermal mass changes depending on the footprint of the building
     
+    """
+    return replacePlaceholders(contents, internalMassValues(inputs))
+
+def internalMassValues(inputs):
+    """
+    Returns the value of the internalMass placeholder as a dictionary of strings.
     """
     A_internalMass = (inputs["length"] + inputs["width"]) * inputs["height"]
 
-    key = "@internalMass@"
-    contents = contents.replace(key, str(A_internalMass))\
-    
-    return contents
+    return {"internalMass": str(A_internalMass)}
 
 
 def getWindowCoordinates (l_surface, z_surface, wwr):
@@ -228,13 +684,14 @@ def flowCoefficient_to_effectiveLeakageArea_10 (contents, c_r, height, width, le
 
 def daylightingReferencePoint (contents, length, width):
 
+    return replacePlaceholders(contents, daylightingReferencePointValues(length, width))
+
+def daylightingReferencePointValues (length, width):
+
     x_centre = width / 2
     y_centre = length / 2
 
-    key = "@daylightReference_x@"
-    contents = contents.replace(key, str(x_centre))
- 
-    key = "@daylightReference_y@"
-    contents = contents.replace(key, str(y_centre))
-
-    return contents
\ No newline at end of file
+    return {
+        "daylightReference_x": str(x_centre),
+        "daylightReference_y": str(y_centre),
+    }
@@ -0,0 +1,225 @@
+from contextlib import contextmanager
+import json
+import os
+from pathlib import Path
+import time
+
+import numpy as np
+import pandas as pd
+
+# The progress messages of the simulations (eg. "Beginning EnergyPlus simulation of iteration 3.") are printed while this is True. See setVerbose.
+_verbose = True
+
+# The phases of a simulation which are timed, in the order they happen
+PHASES = ["queueWait", "render", "write", "spawn", "simulation", "parse", "finalize"]
+
+
+def setVerbose (verbose):
+    """
+    Turn the progress messages of the simulations on or off, eg. setVerbose(False) for large studies where the Instrumentation records are used instead.
+    Pool workers which are forked copy the setting when the pool is created.
+    """
+
+    global _verbose
+    _verbose = verbose
+
+
+def log (message):
+    if _verbose:
+        print (message, flush = True)
+
+
+class Instrumentation:
+    """
+    Records how long each phase of every simulation of a batch takes, and the resources used by EnergyPlus.
+
+    The phases of a simulation are (all in seconds):
+        queueWait: from the start of the batch until the simulation began, which is the time it waited for a free worker
+        render: rendering the idf from the template
+        write: creating the simulation folder and writing the idf
+        spawn: starting the EnergyPlus process
+        simulation: running EnergyPlus (including any retries)
+        parse: reading the results
+        finalize: tidying up the simulation folder (see src/workspace.py)
+    Each record also has the return code, the number of attempts, the process id of the worker, the CPU time and peak memory of EnergyPlus (Mac/Linux only),
+    and the start and finish times of the simulation.
+
+    If a path is given, each record is appended to it as a line of JSON as soon as the simulation finishes, so the records of pool workers end up in the same file.
+    Otherwise the records are kept in memory, which only works when the simulations are run in this process (eg. with runBatch or iterBatch).
+    Pass the instrumentation to run_energyPlus, runBatch or iterBatch, then use summary() to see where the time went.
+    """
+
+    def __init__ (self, path = None):
+        self.path = Path(path) if path is not None else None
+        self.start = time.time()
+        self.memory = []
+
+        if self.path is not None:
+            Path.mkdir(self.path.parent, parents = True, exist_ok = True)
+
+    def restart (self):
+        """
+        Mark the start of a new batch, which the queue waits are measured from.
+        """
+
+        self.start = time.time()
+
+    def timer (self, i):
+        return RunTimer(i, self)
+
+    def write (self, record):
+        if self.path is None:
+            self.memory.append(record)
+            return
+
+        # Each record is written with a single call to an append-only file, so the lines of different workers are not mixed up
+        with open (self.path, "a", encoding = "UTF-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def records (self):
+        """
+        Returns a dataframe of every record, with a row for each simulation.
+        """
+
+        if self.path is None:
+            records = list(self.memory)
+        else:
+            try:
+                with open (self.path, encoding = "UTF-8") as f:
+                    records = [json.loads(line) for line in f if line.strip()]
+            except FileNotFoundError:
+                records = []
+
+        return pd.DataFrame(records)
+
+    def summary (self, n_slowest = 5, workers = None):
+        """
+        Summarise the records of a batch. Returns a tuple of:
+            summary: a dictionary of
+                runs and failed: the number of simulations and how many of them failed
+                wallTime [s]: from the start of the first simulation to the end of the last one
+                throughput [runs/h]: the number of simulations per hour
+                workers: the number of simulations which ran at the same time (the peak, unless workers is given)
+                utilisation: the share of the workers' time which was spent on simulations (1 means the workers were never idle)
+                speedUp: the total time of all the simulations divided by the wall time
+                serialFraction: the Karp-Flatt estimate of the serial fraction of the batch, from the speed up and the number of workers.
+                    By Amdahl's law (see src/images/Amdahls_Law.png) the speed up can never be more than 1 / serialFraction however many workers are used.
+                cpuShare: the CPU time of EnergyPlus as a share of its wall time. Close to 1 is CPU bound, much less than 1 means the simulations wait for the disk or memory.
+                mean {phase} [s] and share {phase}: the mean time of each phase, and its share of the time of a simulation
+            slowest: a dataframe of the n_slowest simulations
+        """
+
+        records = self.records()
+        if records.empty:
+            raise Exception ("There are no instrumentation records to summarise.")
+
+        phases = [p for p in PHASES if p in records.columns and p != "queueWait"]
+        busy = records[phases].fillna(0).sum(axis = 1)
+        wallTime = records["finish"].max() - records["begin"].min()
+
+        if workers is None:
+            workers = peakConcurrency(records["begin"].to_numpy(), records["finish"].to_numpy())
+
+        speedUp = busy.sum() / wallTime if wallTime > 0 else np.nan
+        serialFraction = (1 / speedUp - 1 / workers) / (1 - 1 / workers) if workers > 1 and speedUp > 0 else np.nan
+
+        summary = {
+            "runs": len(records),
+            "failed": int((records["returncode"] != 0).sum()),
+            "wallTime [s]": wallTime,
+            "throughput [runs/h]": len(records) / wallTime * 3600 if wallTime > 0 else np.nan,
+            "workers": workers,
+            "utilisation": busy.sum() / (wallTime * workers) if wallTime > 0 else np.nan,
+            "speedUp": speedUp,
+            "serialFraction": serialFraction,
+        }
+
+        if "userCPU [s]" in records.columns:
+            cpu = records["userCPU [s]"] + records["systemCPU [s]"]
+            summary["cpuShare"] = cpu.sum() / records["simulation"].sum() if records["simulation"].sum() > 0 else np.nan
+            summary["maxRSS [MB]"] = records["maxRSS [MB]"].max()
+
+        for phase in PHASES:
+            if phase in records.columns:
+                summary[f"mean {phase} [s]"] = records[phase].mean()
+                if phase != "queueWait":
+                    summary[f"share {phase}"] = records[phase].sum() / busy.sum() if busy.sum() > 0 else np.nan
+
+        slowest = records.assign(total = busy).sort_values("total", ascending = False).head(n_slowest)
+
+        return summary, slowest
+
+    def printSummary (self, n_slowest = 5, workers = None):
+        summary, slowest = self.summary(n_slowest, workers)
+
+        for k, v in summary.items():
+            print (f"{k}: {v:.4g}" if isinstance(v, float) else f"{k}: {v}")
+
+        columns = [c for c in ["i", "total", "render", "simulation", "parse", "returncode", "attempts"] if c in slowest.columns]
+        print (f"\nThe {len(slowest)} slowest simulations:")
+        print (slowest[columns].to_string(index = False))
+
+
+class RunTimer:
+    """
+    Times the phases of one simulation and writes its record to the Instrumentation when it finishes.
+    If instrumentation is None the phases are still timed, but nothing is recorded.
+    """
+
+    def __init__ (self, i, instrumentation = None):
+        self.instrumentation = instrumentation
+        self.begin = time.time()
+        self.record = {"i": i, "pid": os.getpid(), "begin": self.begin}
+        if instrumentation is not None:
+            self.record["queueWait"] = max(0.0, self.begin - instrumentation.start)
+
+    @contextmanager
+    def phase (self, name):
+        t0 = time.time()
+        try:
+            yield
+        finally:
+            self.record[name] = self.record.get(name, 0.0) + time.time() - t0
+
+    def add (self, **values):
+        self.record.update(values)
+
+    def finish (self, retcode = None, cached = False):
+        """
+        Complete the record with the return code and resource usage of the simulation, and write it.
+        """
+
+        self.record["finish"] = time.time()
+        self.record["cached"] = cached
+
+        if retcode is not None:
+            self.record["returncode"] = int(retcode.returncode)
+            self.record["attempts"] = getattr(retcode, "attempts", 1)
+            self.record["kind"] = getattr(retcode, "kind", None)
+
+            spawn = getattr(retcode, "spawn", None)
+            if spawn is not None and "simulation" in self.record:
+                # The simulation phase is timed around the whole watchdog run, so take the start up time of the process out of it
+                self.record["spawn"] = spawn
+                self.record["simulation"] = max(0.0, self.record["simulation"] - spawn)
+
+            rusage = getattr(retcode, "rusage", None)
+            if rusage is not None:
+                self.record.update(rusage)
+
+        if self.instrumentation is not None:
+            self.instrumentation.write(self.record)
+
+        return self.record
+
+
+def peakConcurrency (begin, finish):
+    """
+    Returns the largest number of the intervals [begin, finish) which overlap at any time.
+    """
+
+    events = np.concatenate([np.stack([begin, np.ones(len(begin))], axis = 1), np.stack([finish, -np.ones(len(finish))], axis = 1)])
+    # Ends are sorted before starts at the same time, so back to back simulations are not counted as overlapping
+    events = events[np.lexsort((events[:, 1], events[:, 0]))]
+
+    return int(np.cumsum(events[:, 1]).max())
@@ -0,0 +1,291 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from src.processResults import HOURLY_COLUMNS, RESILIENCE_TABLES, parseColumnHeader, readHourlyBatch
+
+# Declarative definitions of the metrics which are calculated from the hourly results, by processHourlyResults and processSQLiteResults for each run,
+# and by evaluateMetrics for many runs at once. Each metric is a reduction over the timesteps of one of the columns of HOURLY_COLUMNS:
+#   sum: the sum over the timesteps
+#   max: the largest value
+#   hoursAbove: the number of timesteps the value is above threshold
+#   monthlySum: the sum over the timesteps of each month (one result per month)
+# The optional keys are:
+#   scale: a factor the result is multiplied by (eg. 1 / 3600 to convert the peak hourly energy [J] into a demand [W])
+#   threshold: the threshold of a hoursAbove metric
+#   occupied: if True, only the occupied timesteps are included (see occupiedMask)
+#   default: if False, the metric is only calculated for a run when it is asked for by name (or, for monthly sums, with monthly = True)
+# New metrics can be added to this dictionary, or passed to evaluateMetrics in a dictionary of their own.
+HOURLY_METRIC_DEFINITIONS = {
+    "heatingSum": {"column": "heating", "reduction": "sum"},
+    "heatingMax": {"column": "heating", "reduction": "max", "scale": 1 / 3600},
+    "coolingSum": {"column": "cooling", "reduction": "sum"},
+    "coolingMax": {"column": "cooling", "reduction": "max", "scale": 1 / 3600},
+    "lightingSum": {"column": "lighting", "reduction": "sum"},
+    "equipmentSum": {"column": "equipment", "reduction": "sum"},
+    "hotWaterSum": {"column": "hotWater", "reduction": "sum"},
+    "temperature>25C": {"column": "operativeTemperature", "reduction": "hoursAbove", "threshold": 25},
+    "temperature>28C": {"column": "operativeTemperature", "reduction": "hoursAbove", "threshold": 28},
+    "temperature>30C": {"column": "operativeTemperature", "reduction": "hoursAbove", "threshold": 30},
+    "temperatureMax": {"column": "operativeTemperature", "reduction": "max"},
+    "monthlyHeatingSum": {"column": "heating", "reduction": "monthlySum", "default": False},
+    "monthlyCoolingSum": {"column": "cooling", "reduction": "monthlySum", "default": False},
+    "occupiedTemperature>26C": {"column": "operativeTemperature", "reduction": "hoursAbove", "threshold": 26, "occupied": True, "default": False},
+}
+
+# The thermal resilience metrics, which are read from the ThermalResilienceSummary report
+RESILIENCE_METRICS = [name for columns in RESILIENCE_TABLES.values() for _, name in columns]
+
+# The columns of HOURLY_COLUMNS (EnergyPlus output variables) and the tabular reports each result metric needs.
+# When a list of metrics is given to run_energyPlus, only these outputs are requested from EnergyPlus.
+METRICS = {name: {"columns": [d["column"]], "tables": []} for name, d in HOURLY_METRIC_DEFINITIONS.items()}
+METRICS.update({name: {"columns": [], "tables": ["ThermalResilienceSummary"]} for name in RESILIENCE_METRICS})
+
+# Metrics which are summed over the run period. When only part of the year is simulated (see src.idf.FIDELITY_LEVELS) these are scaled up to an annual estimate.
+ADDITIVE_METRICS = [name for name, d in HOURLY_METRIC_DEFINITIONS.items() if d["reduction"] in ["sum", "hoursAbove"]] + [
+    "HeatIndex:Safe [hr]", "HeatIndex:Caution [hr]", "HeatIndex:Extreme Caution [hr]", "HeatIndex:Danger [hr]", "HeatIndex:Extreme Danger [hr]",
+    "Humidex:Little to no Discomfort [hr]", "Humidex:Some Discomfort [hr]", "Humidex:Great Discomfort; Avoid Exertion [hr]", "Humidex:Dangerous [hr]", "Humidex:Heat Stroke Quite Possible [hr]",
+    "SET > 30°C Degree-Hours [°C·hr]",
+]
+
+
+def requiredOutputs (metrics):
+    """
+    Returns a tuple of the lists of columns (names in HOURLY_COLUMNS) and tabular reports needed to calculate the given metrics.
+    """
+
+    columns = []
+    tables = []
+    for metric in metrics:
+        if metric not in METRICS:
+            raise Exception (f"Unknown metric: {metric}. The available metrics are {list(METRICS)}")
+
+        for column in METRICS[metric]["columns"]:
+            if column not in columns:
+                columns.append(column)
+        for table in METRICS[metric]["tables"]:
+            if table not in tables:
+                tables.append(table)
+
+    return columns, tables
+
+
+def requiredVariables (metrics):
+    """
+    Returns the names of the EnergyPlus output variables needed to calculate the given metrics, eg. 'Zone Operative Temperature'
+    """
+
+    columns, _ = requiredOutputs(metrics)
+
+    return [parseColumnHeader(HOURLY_COLUMNS[c])[1] for c in columns]
+
+
+def selectResults (hourlyResults, resilienceResults, metrics):
+    """
+    Returns the hourly results and resilience results dictionaries with only the given metrics.
+    The results of each month of a monthly metric (eg. "monthlyHeatingSum[1]") are kept if the metric is given.
+    """
+
+    hourlyResults = {k: v for k, v in hourlyResults.items() if metricName(k) in metrics}
+    resilienceResults = {k: v for k, v in resilienceResults.items() if metricName(k) in metrics}
+
+    return hourlyResults, resilienceResults
+
+
+def metricName (result):
+    """
+    Returns the name of the metric of a result, which is the name of the result except for the results of each month of a monthly metric, eg. "monthlyHeatingSum[1]".
+    """
+
+    match = re.fullmatch(r"(.*)\[\d+\]", result)
+    return match.group(1) if match else result
+
+
+def scaleResults (hourlyResults, resilienceResults, scale):
+    """
+    Multiply the additive metrics of the hourly results and resilience results dictionaries by scale, eg. to estimate annual values from a sampled run period.
+    """
+
+    hourlyResults = {k: v * scale if k in ADDITIVE_METRICS else v for k, v in hourlyResults.items()}
+    resilienceResults = {k: v * scale if k in ADDITIVE_METRICS else v for k, v in resilienceResults.items()}
+
+    return hourlyResults, resilienceResults
+
+
+# The hours of the day (0 is 00:00-01:00) when the dwelling is occupied, used for the occupied metrics unless another mask is given
+OCCUPIED_HOURS = list(range(0, 9)) + list(range(17, 24))
+
+# The number of runs which are evaluated at a time by evaluateMetrics, to limit the memory used for large studies
+METRIC_CHUNK_RUNS = 512
+
+
+def occupiedMask (n_timesteps = 8760, hours = OCCUPIED_HOURS):
+    """
+    Returns a boolean array of the timesteps which are occupied, for hourly results starting at 00:00 on the 1st of January.
+    """
+
+    return np.isin(np.arange(n_timesteps) % 24, hours)
+
+
+def evaluateMetrics (values, columns, definitions = None, months = None, occupied = None):
+    """
+    Calculate metrics for many runs at once from their stacked hourly results.
+
+    values is a (runs, timesteps, columns) array, eg. the data of a TimeseriesCube or the array returned by readHourlyBatch.
+    columns is the list of the names in HOURLY_COLUMNS of the last axis of values.
+    definitions is a dictionary of metric definitions in the same format as HOURLY_METRIC_DEFINITIONS (which is used by default).
+    Only the metrics whose columns are in values are calculated.
+    months is the month of each timestep, which is needed for monthlySum metrics. occupied is a boolean mask of the occupied timesteps (occupiedMask() by default).
+
+    The metrics are grouped by column, so every sum, maximum and threshold count of a column is calculated in a single pass over its values,
+    however many metrics use it. The runs are evaluated in chunks to limit the memory used.
+
+    Returns a dataframe with a row for each run and a column for each metric. Monthly metrics have a column for each month, eg. "monthlyHeatingSum[1]".
+    """
+
+    if definitions is None:
+        definitions = HOURLY_METRIC_DEFINITIONS
+    definitions = {k: v for k, v in definitions.items() if v["column"] in columns}
+
+    n_runs, n_timesteps = values.shape[:2]
+    if any(d.get("occupied") for d in definitions.values()) and occupied is None:
+        occupied = occupiedMask(n_timesteps)
+
+    monthStarts = None
+    if any(d["reduction"] == "monthlySum" for d in definitions.values()):
+        if months is None:
+            raise Exception ("The months of the timesteps are needed to calculate monthly metrics.")
+        months = np.asarray(months)
+        monthStarts = np.flatnonzero(np.r_[True, months[1:] != months[:-1]])
+
+    # Group the metrics which are calculated from the same values
+    groups = {}
+    for name, d in definitions.items():
+        groups.setdefault((d["column"], bool(d.get("occupied"))), []).append(name)
+
+    results = {}
+    for start in range(0, n_runs, METRIC_CHUNK_RUNS):
+        chunk = values[start:start + METRIC_CHUNK_RUNS]
+
+        for (column, isOccupied), names in groups.items():
+            # Sum in float64, as float32 sums of a year of hourly values lose precision
+            x = np.asarray(chunk[:, :, columns.index(column)], dtype = np.float64)
+            if isOccupied:
+                x = np.where(occupied, x, np.nan)
+
+            reductions = {definitions[name]["reduction"] for name in names}
+            aggregates = {}
+            if "sum" in reductions:
+                aggregates["sum"] = np.nansum(x, axis = 1)
+            if "max" in reductions:
+                aggregates["max"] = np.nanmax(x, axis = 1)
+            if "monthlySum" in reductions:
+                aggregates["monthlySum"] = np.add.reduceat(np.nan_to_num(x), monthStarts, axis = 1)
+            if "hoursAbove" in reductions:
+                thresholds = sorted({definitions[name]["threshold"] for name in names if definitions[name]["reduction"] == "hoursAbove"})
+                counts = (x[:, :, None] > np.array(thresholds)).sum(axis = 1)
+                aggregates["hoursAbove"] = {t: counts[:, k] for k, t in enumerate(thresholds)}
+
+            for name in names:
+                d = definitions[name]
+                if d["reduction"] == "hoursAbove":
+                    result = aggregates["hoursAbove"][d["threshold"]]
+                elif d["reduction"] in aggregates:
+                    result = aggregates[d["reduction"]]
+                else:
+                    raise Exception (f"Unsupported reduction for the metric {name}: {d['reduction']}")
+
+                results.setdefault(name, []).append(result * d["scale"] if "scale" in d else result)
+
+    columnsOut = {}
+    for name, chunks in results.items():
+        result = np.concatenate(chunks)
+        if result.ndim == 2:
+            for k, month in enumerate(months[monthStarts]):
+                columnsOut[f"{name}[{month}]"] = result[:, k]
+        else:
+            columnsOut[name] = result
+
+    return pd.DataFrame(columnsOut, index = pd.RangeIndex(n_runs))
+
+
+def hourlyDefinitions (metrics = None, columns = None, monthly = False):
+    """
+    Returns the definitions (from HOURLY_METRIC_DEFINITIONS) of the hourly metrics to calculate for a run.
+
+    If a list of metrics is given, only those of the metrics which are calculated from the hourly results are included (the resilience metrics are ignored).
+    Otherwise every metric is included except those with "default": False, and monthly = True adds the monthly sums.
+    columns can be a list of the names in HOURLY_COLUMNS to only include the metrics of those columns.
+    """
+
+    if metrics is not None:
+        unknown = [m for m in metrics if m not in METRICS]
+        if unknown:
+            raise Exception (f"Unknown metric: {unknown[0]}. The available metrics are {list(METRICS)}")
+        definitions = {name: HOURLY_METRIC_DEFINITIONS[name] for name in metrics if name in HOURLY_METRIC_DEFINITIONS}
+    else:
+        definitions = {name: d for name, d in HOURLY_METRIC_DEFINITIONS.items() if d.get("default", True) or (monthly and d["reduction"] == "monthlySum")}
+
+    if columns is not None:
+        definitions = {name: d for name, d in definitions.items() if d["column"] in columns}
+
+    return definitions
+
+
+def runMetrics (data, definitions, months = None, occupied = None):
+    """
+    Calculate the metrics of a single run from its hourly results.
+    data is a dictionary of {column: array of the value of each timestep}, with the columns of the definitions. months and occupied are as in evaluateMetrics.
+
+    Each metric is reduced directly with numpy, as the chunks and dataframe of evaluateMetrics only pay off for batches of runs.
+    Returns a dictionary of the results, named as the columns of evaluateMetrics (eg. "monthlyHeatingSum[1]"). Threshold counts are returned as integers.
+    """
+
+    monthStarts = None
+    results = {}
+    for name, d in definitions.items():
+        x = data[d["column"]]
+        if d.get("occupied"):
+            if occupied is None:
+                occupied = occupiedMask(len(x))
+            x = x[occupied]
+
+        if d["reduction"] == "sum":
+            result = x.sum()
+        elif d["reduction"] == "max":
+            result = x.max()
+        elif d["reduction"] == "hoursAbove":
+            result = int(np.count_nonzero(x > d["threshold"]))
+        elif d["reduction"] == "monthlySum":
+            if months is None:
+                raise Exception ("The months of the timesteps are needed to calculate monthly metrics.")
+            if monthStarts is None:
+                months = np.asarray(months)
+                monthStarts = np.flatnonzero(np.r_[True, months[1:] != months[:-1]])
+            for month, total in zip(months[monthStarts], np.add.reduceat(x, monthStarts)):
+                results[f"{name}[{month}]"] = total * d["scale"] if "scale" in d else total
+            continue
+        else:
+            raise Exception (f"Unsupported reduction for the metric {name}: {d['reduction']}")
+
+        results[name] = result * d["scale"] if "scale" in d else result
+
+    return results
+
+
+def evaluateIterations (iterationPaths, definitions = None, occupied = None, max_workers = None):
+    """
+    Calculate metrics for many completed simulations at once: read the eplusout.csv files of the iteration folders (in parallel) into one stacked array,
+    and evaluate every metric with evaluateMetrics.
+
+    Returns a dataframe with a row for each of the iterationPaths (in the same order) and a column for each metric.
+    """
+
+    if definitions is None:
+        definitions = HOURLY_METRIC_DEFINITIONS
+    columns = list(dict.fromkeys(d["column"] for d in definitions.values()))
+
+    values, months = readHourlyBatch(iterationPaths, columns = columns, max_workers = max_workers)
+
+    return evaluateMetrics(values, columns, definitions, months = months, occupied = occupied)
@@ -0,0 +1,221 @@
+import asyncio
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from pymoo.algorithms.moo.nsga2 import NSGA2
+from pymoo.core.population import Population
+from pymoo.core.problem import Problem
+from pymoo.core.termination import NoTermination
+from pymoo.operators.crossover.sbx import SBX
+from pymoo.operators.mutation.pm import PM
+from pymoo.operators.sampling.rnd import FloatRandomSampling
+from pymoo.operators.selection.rnd import RandomSelection
+from pymoo.util.nds.non_dominated_sorting import NonDominatedSorting
+
+from src.instrumentation import log
+from src.scheduler import runBatch
+
+# The objectives of Exercise 8B
+OBJECTIVES = ["heatingMax", "SET > 30°C Degree-Hours [°C·hr]"]
+
+
+def parameterProblem (parameters, objectives = OBJECTIVES):
+    """
+    Returns a pymoo Problem with the bounds of the parameters in a parameters json file and one objective for each name in objectives.
+    It is only used to describe the design space to the algorithm, as the designs are evaluated by SteadyStateNSGA2.
+    """
+
+    xl = np.array([min(x["values"]) for x in parameters.values()])
+    xu = np.array([max(x["values"]) for x in parameters.values()])
+
+    return Problem(n_var = len(parameters), n_obj = len(objectives), xl = xl, xu = xu)
+
+
+class SteadyStateNSGA2:
+    """
+    An asynchronous, steady-state version of NSGA-II which keeps every worker busy.
+
+    Running NSGA-II with minimize() evaluates each generation as one batch, so workers sit idle while the slowest simulation of the generation finishes,
+    and no more than n_offsprings simulations can ever run at once. Here the pymoo algorithm is driven with its ask/tell interface instead:
+        - max_concurrent simulations are kept running at all times (the number of processors by default).
+        - As soon as a simulation finishes, its design is folded into the population (NSGA-II survival of the population plus the new design),
+          and a new design is bred from the updated population (ask() with one offspring) to take its place.
+    The first pop_size designs are the algorithm's initial sample. While fewer than two of them have finished, any free worker is given another random design.
+
+    Failed simulations are given infinite objectives so that they do not survive.
+    The algorithm is NSGA-II with the operators of Exercise 8B by default, but any pymoo GeneticAlgorithm can be passed (its n_offsprings is set to 1).
+    Any other keyword arguments (eg. cache, workspace, watchdog, fidelity, metrics or instrumentation) are passed to runBatch.
+    """
+
+    def __init__ (self, ep_dir, baseline_idf_path, weather_file_path, parameters, objectives = OBJECTIVES, pop_size = 32, max_concurrent = None, algorithm = None, seed = None, **kwargs):
+        self.ep_dir = ep_dir
+        self.baseline_idf_path = baseline_idf_path
+        self.weather_file_path = weather_file_path
+        self.parameterNames = list(parameters.keys())
+        self.objectives = list(objectives)
+        self.max_concurrent = max_concurrent if max_concurrent is not None else os.cpu_count()
+        self.kwargs = kwargs
+
+        if algorithm is None:
+            algorithm = NSGA2(
+                pop_size = pop_size,
+                sampling = FloatRandomSampling(),
+                selection = RandomSelection(),
+                crossover = SBX(),
+                mutation = PM(eta = 20),
+                eliminate_duplicates = True,
+            )
+        # Each ask() breeds a single design, to replace the simulation which has just finished
+        algorithm.n_offsprings = 1
+
+        self.problem = parameterProblem(parameters, self.objectives)
+        self.algorithm = algorithm
+        # The run is stopped by run() rather than by a pymoo termination
+        self.algorithm.setup(self.problem, termination = NoTermination(), seed = seed)
+
+        self.initial = list(self.algorithm.ask())
+        self.waiting = []
+        self.pending = {}
+        self.rows = []
+        self.n_proposed = 0
+        self.n_told = 0
+
+    def propose (self):
+        """
+        Returns the next design to simulate as a pymoo Individual.
+        """
+
+        if self.initial:
+            return self.initial.pop(0)
+
+        if not self.algorithm.is_initialized:
+            if len(self.waiting) < 2:
+                # There are not yet enough results to breed from, so keep the worker busy with another random design
+                return self.algorithm.initialization.do(self.problem, 1, algorithm = self.algorithm, random_state = self.algorithm.random_state)[0]
+
+            # The initial population is made up of the results so far, and the rest of the initial designs are added as they finish
+            self.algorithm.tell(infills = Population.create(*self.waiting))
+            self.n_told += len(self.waiting)
+            self.waiting = []
+
+        offspring = self.algorithm.ask()
+        if offspring is None or len(offspring) == 0:
+            # Mating could not breed a design which is not already in the population
+            return self.algorithm.initialization.do(self.problem, 1, algorithm = self.algorithm, random_state = self.algorithm.random_state)[0]
+
+        return offspring[0]
+
+    def designs (self, max_evaluations, deadline):
+        """
+        A generator of the inputs of each design, which runBatch consumes whenever a worker is free. It stops after max_evaluations designs or once the deadline has passed.
+        """
+
+        while self.n_proposed < max_evaluations and (deadline is None or time.time() < deadline):
+            individual = self.propose()
+            self.pending[self.n_proposed] = (individual, self.n_told)
+            self.n_proposed += 1
+
+            yield dict(zip(self.parameterNames, individual.X))
+
+    def tell (self, i, retcode, hourlyResults, resilienceResults, start):
+        """
+        Fold the result of design i into the population, and add it to the history.
+        """
+
+        individual, told = self.pending.pop(i)
+
+        if retcode.returncode == 0:
+            results = {**hourlyResults, **resilienceResults}
+            F = np.array([results[o] for o in self.objectives], dtype = float)
+        else:
+            F = np.full(len(self.objectives), np.inf)
+        individual.set("F", F)
+
+        if self.algorithm.is_initialized:
+            self.algorithm.tell(infills = Population.create(individual))
+            self.n_told += 1
+        else:
+            self.waiting.append(individual)
+
+        self.rows.append({
+            "evaluation": len(self.rows),
+            "i": i,
+            "proposedAfter": told,
+            "time [s]": time.time() - start,
+            "returncode": retcode.returncode,
+            **dict(zip(self.parameterNames, individual.X)),
+            **dict(zip(self.objectives, F)),
+        })
+
+    async def runAsync (self, max_evaluations = 500, time_limit = None):
+        """
+        The asyncio version of run().
+        """
+
+        start = time.time()
+        deadline = start + time_limit if time_limit is not None else None
+
+        async for i, retcode, hourlyResults, resilienceResults in runBatch(self.ep_dir, self.baseline_idf_path, self.weather_file_path, self.designs(max_evaluations, deadline), self.max_concurrent, **self.kwargs):
+            self.tell(i, retcode, hourlyResults, resilienceResults, start)
+            if len(self.rows) % self.max_concurrent == 0:
+                log (f"Completed {len(self.rows)} evaluations in {time.time() - start:.1f} s.")
+
+        # Fold in any initial designs which finished after the last design was proposed
+        if self.waiting:
+            self.algorithm.tell(infills = Population.create(*self.waiting))
+            self.n_told += len(self.waiting)
+            self.waiting = []
+
+        return self.result()
+
+    def run (self, max_evaluations = 500, time_limit = None):
+        """
+        Run the optimisation until max_evaluations designs have been simulated, or until time_limit seconds have passed (the simulations which are running are allowed to finish).
+        Returns a tuple of (X, F, history) as described in result().
+
+        Jupyter notebooks already have a running event loop, so the optimisation is run in its own event loop on a background thread, as with iterBatch.
+        """
+
+        outcome = {}
+
+        def target ():
+            try:
+                outcome["result"] = asyncio.run(self.runAsync(max_evaluations, time_limit))
+            except BaseException as e:
+                outcome["error"] = e
+
+        thread = threading.Thread(target = target, daemon = True)
+        thread.start()
+        thread.join()
+
+        if "error" in outcome:
+            raise outcome["error"]
+        return outcome["result"]
+
+    def result (self):
+        """
+        Returns a tuple of:
+            X: a dataframe of the parameters of the non-dominated designs of the population
+            F: a dataframe of their objectives
+            history: a dataframe with a row for every simulated design in the order they finished, with its parameters and objectives,
+                the time since the start of the run when it finished [s], and proposedAfter, the number of results which had been folded into the population when it was bred.
+                generation is the equivalent NSGA-II generation (every pop_size evaluations), so the history can be plotted in the same way as Exercise 8B.
+        """
+
+        history = pd.DataFrame(self.rows)
+        if not history.empty:
+            history.insert(1, "generation", history["evaluation"] // self.algorithm.pop_size)
+
+        pop = self.algorithm.pop
+        if pop is None or len(pop) == 0:
+            return pd.DataFrame(columns = self.parameterNames), pd.DataFrame(columns = self.objectives), history
+
+        X, F = pop.get("X", "F")
+        feasible = np.all(np.isfinite(F), axis = 1)
+        X, F = X[feasible], F[feasible]
+        front = NonDominatedSorting().do(F, only_non_dominated_front = True) if len(F) > 0 else []
+
+        return pd.DataFrame(X[front], columns = self.parameterNames), pd.DataFrame(F[front], columns = self.objectives), history
@@ -1,44 +1,132 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+from pathlib import Path
+import sqlite3
+
+import numpy as np
 import pandas as pd
 
-def processHourlyResults (filePath):
+# The columns of eplusout.csv which are used to calculate the hourly results.
+HOURLY_COLUMNS = {
+    "heating": "ZONE 1 IDEAL LOADS AIR SYSTEM:Zone Ideal Loads Supply Air Total Heating Energy [J](Hourly)",
+    "cooling": "ZONE 1 IDEAL LOADS AIR SYSTEM:Zone Ideal Loads Supply Air Total Cooling Energy [J](Hourly)",
+    "lighting": "LIGHTING_ZONE 1:Lights Electricity Energy [J](Hourly)",
+    "equipment": "ELECTRICEQUIPMENT_ZONE 1:Electric Equipment Electricity Energy [J](Hourly)",
+    "hotWater": "WATER HEATER:Water Heater Heating Energy [J](Hourly)",
+    "operativeTemperature": "ZONE 1:Zone Operative Temperature [C](Hourly)",
+}
+
+def readHourlyColumns (filePath, columns = HOURLY_COLUMNS, dates = False):
+    """
+    Reads only the given columns of an EnergyPlus results file as float arrays.
+
+    columns is a dictionary of {name: column header}. Returns a dictionary of {name: numpy array}.
+    If dates is True, the raw Date/Time strings are also returned under the "Date/Time" key. They are not parsed here.
+    """
+
+    usecols = list(columns.values())
+    if dates:
+        usecols = ["Date/Time"] + usecols
+
+    df = pd.read_csv(filePath, usecols = usecols, dtype = {c: np.float64 for c in columns.values()}, engine = "c")
+
+    data = {name: df[column].to_numpy() for name, column in columns.items()}
+    if dates:
+        data["Date/Time"] = df["Date/Time"].to_numpy()
+
+    return data
+
+
+def processHourlyResults (filePath, monthly = False, columns = None, metrics = None):
     """
     Opens the given EnergyPlus results file and extracts the results of interest as a dict.
+
+    The results are the metrics of src.metrics.HOURLY_METRIC_DEFINITIONS, which are calculated with runMetrics. Only the columns these metrics need are read.
+    metrics can be a list of metrics to only calculate those (eg. ["heatingMax", "monthlyHeatingSum"]), and columns can be a list of the names in HOURLY_COLUMNS
+    to only calculate the metrics of those columns. The monthly sums are calculated if monthly = True or if they are in metrics, and are returned for each month,
+    eg. "monthlyHeatingSum[1]" for January. The timestamps are only parsed for the monthly sums.
     """
 
-    results = {}
+    # Imported here as src.metrics depends on this module
+    from src.metrics import hourlyDefinitions, runMetrics
 
-    df = pd.read_csv(filePath)
-    # Convert EnergyPlus' timestamps into a standardized datetime object 
-    # Need to include the .str.strip() to remove all leading whitespace otherwise an error can occur.
-    df["Date/Time"] = pd.to_datetime(df["Date/Time"].str.strip(), format = "%Y-%m-%dT%H:%M:%S")
-    df.set_index("Date/Time", inplace=True)
-
-    # Energy related results
-    results["heatingSum"] = df["ZONE 1 IDEAL LOADS AIR SYSTEM:Zone Ideal Loads Supply Air Total Heating Energy [J](Hourly)"].sum()          # Annual heating demand [J]
-    results["heatingMax"] = df["ZONE 1 IDEAL LOADS AIR SYSTEM:Zone Ideal Loads Supply Air Total Heating Energy [J](Hourly)"].max() / 3600   # Peak heating demand [W] 
-    results["coolingSum"] = df["ZONE 1 IDEAL LOADS AIR SYSTEM:Zone Ideal Loads Supply Air Total Cooling Energy [J](Hourly)"].sum()          # Annual cooling demand [J]
-    results["coolingMax"] = df["ZONE 1 IDEAL LOADS AIR SYSTEM:Zone Ideal Loads Supply Air Total Cooling Energy [J](Hourly)"].max() / 3600   # Peak cooling demand [W]
-    results["lightingSum"] = df["LIGHTING_ZONE 1:Lights Electricity Energy [J](Hourly)"].sum()              # Annual Lighting electricity usage [J] 
-    results["equipmentSum"] = df["ELECTRICEQUIPMENT_ZONE 1:Electric Equipment Electricity Energy [J](Hourly)"].sum()     # Annual equipment usage (will be constant across simulations)
-    results["hotWaterSum"] = df["WATER HEATER:Water Heater Heating Energy [J](Hourly)"].sum()            # Annual Hot Water gas usage [J]
-
-
-    #Overheating related results
-    results["temperature>25C"] = df["ZONE 1:Zone Operative Temperature [C](Hourly)"][df["ZONE 1:Zone Operative Temperature [C](Hourly)"] > 25].count() # Hours indoor temperature was greater than 25C [h]
-    results["temperature>28C"] = df["ZONE 1:Zone Operative Temperature [C](Hourly)"][df["ZONE 1:Zone Operative Temperature [C](Hourly)"] > 28].count() # Hours indoor temperature was greater than 28C [h]
-    results["temperature>30C"] = df["ZONE 1:Zone Operative Temperature [C](Hourly)"][df["ZONE 1:Zone Operative Temperature [C](Hourly)"] > 30].count() # Hours indoor temperature was greater than 30C [h]
-    results["temperatureMax"] = df["ZONE 1:Zone Operative Temperature [C](Hourly)"].max() # Peak zone air temperature [C]
-    
+    definitions = hourlyDefinitions(metrics, columns, monthly)
+    if not definitions:
+        return {}
+    columns = list(dict.fromkeys(d["column"] for d in definitions.values()))
+    dates = any(d["reduction"] == "monthlySum" for d in definitions.values())
+
+    data = readHourlyColumns(filePath, columns = {c: HOURLY_COLUMNS[c] for c in columns}, dates = dates)
+    months = timestepMonths(data["Date/Time"]) if dates else None
+
+    return runMetrics(data, definitions, months = months)
+
+
+def processHourlyResultsBatch (iterationPaths, monthly = False, max_workers = None):
+    """
+    Process the eplusout.csv files of many iteration folders at once using a pool of threads.
+    pandas releases the GIL while parsing, so the files are read in parallel.
+
+    Returns a list of the hourly results dictionaries in the same order as iterationPaths.
+    """
+
+    if max_workers is None:
+        max_workers = os.cpu_count()
+
+    filePaths = [Path(p, "eplusout.csv") for p in iterationPaths]
+    with ThreadPoolExecutor(max_workers = max_workers) as executor:
+        return list(executor.map(lambda filePath: processHourlyResults(filePath, monthly = monthly), filePaths))
+
+
+def timestepMonths (dates):
+    """
+    Returns the month of each of the Date/Time strings of an eplusout.csv file, in either the ISO format (2025-01-01T01:00:00) or EnergyPlus' format ( 01/01  01:00:00).
     """
-    # NOTE The monthly sums not being used for the time being.
 
-    # Get monthly sums using resampling
-    results["monthlyHeatingSum"] = df.resample(rule ='ME')["ZONE 1 IDEAL LOADS AIR SYSTEM:Zone Ideal Loads Supply Air Total Heating Energy [J](Hourly)"].sum() # Monthly heating demand [J]
+    dates = pd.Series(dates).str.strip()
+    iso = dates.str.match(r"\d{4}-")
+    months = dates.str[0:2].to_numpy()
+
+    # Each timestamp is the end of its hour, so in the ISO format the hour ending at midnight on the 1st belongs to the month before
+    # (EnergyPlus' own format writes it as 24:00:00 on the last day of that month)
+    if iso.any():
+        months = np.where(iso, (pd.to_datetime(dates[iso], format = "%Y-%m-%dT%H:%M:%S") - pd.Timedelta(seconds = 1)).dt.month.reindex(dates.index).to_numpy(), months)
 
-    # Get monthly sums using resampling
-    results["monthlyCoolingSum"] = df.resample(rule ='ME')["ZONE 1 IDEAL LOADS AIR SYSTEM:Zone Ideal Loads Supply Air Total Cooling Energy [J](Hourly)"].sum() # Monthly cooling demand [J]
+    return months.astype(np.int64)
+
+
+def readHourlyBatch (iterationPaths, columns = None, max_workers = None):
+    """
+    Read the given columns (names in HOURLY_COLUMNS) of the eplusout.csv files of many iteration folders into one stacked array, using a pool of threads.
+
+    Returns a tuple of a (runs, timesteps, columns) float64 array in the same order as iterationPaths, and the month of each timestep.
+    Every run must have the same number of timesteps.
     """
-    return results
+
+    if columns is None:
+        columns = list(HOURLY_COLUMNS)
+    if max_workers is None:
+        max_workers = os.cpu_count()
+
+    filePaths = [Path(p, "eplusout.csv") for p in iterationPaths]
+    if not filePaths:
+        return np.empty((0, 0, len(columns))), np.empty(0, dtype = np.int64)
+
+    # The dates of the first file give the months of the timesteps
+    first = readHourlyColumns(filePaths[0], columns = {c: HOURLY_COLUMNS[c] for c in columns}, dates = True)
+    months = timestepMonths(first["Date/Time"])
+
+    values = np.empty((len(filePaths), len(months), len(columns)))
+    values[0] = np.column_stack([first[c] for c in columns])
+
+    def read (k):
+        data = readHourlyColumns(filePaths[k], columns = {c: HOURLY_COLUMNS[c] for c in columns})
+        values[k] = np.column_stack([data[c] for c in columns])
+
+    with ThreadPoolExecutor(max_workers = max_workers) as executor:
+        list(executor.map(read, range(1, len(filePaths))))
+
+    return values, months
 
 
 def processResilienceResults (filePath):
@@ -75,7 +163,7 @@ def processResilienceResults (filePath):
     resilienceResults["Humidex:Little to no Discomfort [hr]"] = float(line[2])              # (> 39.4°C, ≤ 51.7°C) 
     resilienceResults["Humidex:Some Discomfort [hr]"] = float(line[3])                      # (> 29, ≤ 40)
     resilienceResults["Humidex:Great Discomfort; Avoid Exertion [hr]"] = float(line[4])     # (> 40, ≤ 45) 
-    resilienceResults["Humidex:Dangerous [hr]"] = float(line[5]),                           # (> 45, ≤ 50) 
+    resilienceResults["Humidex:Dangerous [hr]"] = float(line[5])                            # (> 45, ≤ 50) 
     resilienceResults["Humidex:Heat Stroke Quite Possible [hr]"] = float(line[6])           #  (> 50)
 
     # Heating SET Degree-Hours
@@ -101,7 +189,229 @@ def processResilienceResults (filePath):
     #resilienceResults["SET > 30°C Occupant-Weighted Degree-Hours [°C·hr]"] = float(line[3])
     #resilienceResults["SET > 30°C Occupied Degree-Hours [°C·hr]"] = float(line[4])
     resilienceResults["Longest SET > 30°C Duration for Occupied Period [hr]"] = float(line[5])
-    resilienceResults["Start Time of the Longest SET > 30°C Duration for Occupied Period"] = line[6]
+    # The last column of the line still ends with its newline
+    resilienceResults["Start Time of the Longest SET > 30°C Duration for Occupied Period"] = line[6].strip()
+
+
+    return resilienceResults
+
+
+# The thermal resilience results which are read from the tabular reports in eplusout.sql.
+# Each table maps the start of a column name to the name of the result, in the same order as processResilienceResults.
+RESILIENCE_TABLES = {
+    "Heat Index Hours": [
+        ("Safe", "HeatIndex:Safe [hr]"),
+        ("Caution", "HeatIndex:Caution [hr]"),
+        ("Extreme Caution", "HeatIndex:Extreme Caution [hr]"),
+        ("Danger", "HeatIndex:Danger [hr]"),
+        ("Extreme Danger", "HeatIndex:Extreme Danger [hr]"),
+    ],
+    "Humidex Hours": [
+        ("Little to no Discomfort", "Humidex:Little to no Discomfort [hr]"),
+        ("Some Discomfort", "Humidex:Some Discomfort [hr]"),
+        ("Great Discomfort", "Humidex:Great Discomfort; Avoid Exertion [hr]"),
+        ("Dangerous", "Humidex:Dangerous [hr]"),
+        ("Heat Stroke", "Humidex:Heat Stroke Quite Possible [hr]"),
+    ],
+    "Cooling SET Degree-Hours": [
+        ("SET > 30°C Degree-Hours", "SET > 30°C Degree-Hours [°C·hr]"),
+        ("Longest SET > 30°C Duration", "Longest SET > 30°C Duration for Occupied Period [hr]"),
+        ("Start Time of the Longest SET > 30°C Duration", "Start Time of the Longest SET > 30°C Duration for Occupied Period"),
+    ],
+}
+
+# The zone which the results are taken from
+RESILIENCE_ZONE = "ZONE 1"
+
+
+def parseColumnHeader (header):
+    """
+    Split an eplusout.csv column header such as 'ZONE 1:Zone Operative Temperature [C](Hourly)' into its key value, variable name, and reporting frequency.
+    """
+
+    key, variable = header.split(":", 1)
+    name = variable.split(" [")[0].strip()
+    frequency = variable.rsplit("(", 1)[-1].rstrip(")")
+
+    return key, name, frequency
+
+
+def processSQLiteResults (filePath, columns = None, resilience = True, metrics = None, monthly = False):
+    """
+    Reads the hourly results and thermal resilience results from the eplusout.sql file written when Output:SQLite is turned on (see idf.enableSQLite).
+
+    The hourly metrics of src.metrics.HOURLY_METRIC_DEFINITIONS are calculated by SQLite in a single grouped query (and one more for the monthly sums) rather than reading the hourly data into Python.
+    The thermal resilience tables are looked up by table and column name, so unlike processResilienceResults this does not depend on the layout of eplustbl.csv.
+    columns, metrics and monthly select the hourly metrics in the same way as processHourlyResults. If resilience is False, the resilience tables are not read.
+
+    Returns a tuple of dictionaries with the same results as processHourlyResults and processResilienceResults.
+    """
+
+    # Open the database read-only so that many readers never block each other
+    uri = f"{Path(filePath).resolve().as_uri()}?mode=ro"
+    with sqlite3.connect(uri, uri = True) as conn:
+        hourlyResults = querySQLiteHourlyResults(conn, columns, metrics, monthly)
+        resilienceResults = querySQLiteResilienceResults(conn) if resilience else {}
+    conn.close()
+
+    return hourlyResults, resilienceResults
+
+
+def querySQLiteHourlyResults (conn, columns = None, metrics = None, monthly = False):
+
+    # Imported here as src.metrics depends on this module
+    from src.metrics import OCCUPIED_HOURS, hourlyDefinitions
+
+    definitions = hourlyDefinitions(metrics, columns, monthly)
+    if not definitions:
+        return {}
+
+    # Find the dictionary index of each of the variables
+    variables = {}
+    for name in dict.fromkeys(d["column"] for d in definitions.values()):
+        header = HOURLY_COLUMNS[name]
+        key, variable, frequency = parseColumnHeader(header)
+        row = conn.execute(
+            """
+            SELECT ReportDataDictionaryIndex FROM ReportDataDictionary
+            WHERE UPPER(KeyValue) = UPPER(?) AND Name = ? AND ReportingFrequency = ?
+            """,
+            (key, variable, frequency),
+        ).fetchone()
+        if row is None:
+            raise Exception (f"Could not find the variable {header} in the SQLite output.")
+        variables[name] = row[0]
+
+    # Each metric is an aggregate over the timesteps. EnergyPlus numbers the hours by their end (1 to 24), while OCCUPIED_HOURS numbers them by their start.
+    occupied = f"(t.Hour - 1) IN ({', '.join(str(h) for h in OCCUPIED_HOURS)})"
+    expressions = {}
+    monthlyExpressions = {}
+    for name, d in definitions.items():
+        value = f"(CASE WHEN {occupied} THEN r.Value END)" if d.get("occupied") else "r.Value"
+        if d["reduction"] == "sum":
+            expressions[name] = f"SUM({value})"
+        elif d["reduction"] == "max":
+            expressions[name] = f"MAX({value})"
+        elif d["reduction"] == "hoursAbove":
+            expressions[name] = f"COUNT(CASE WHEN {value} > {d['threshold']} THEN 1 END)"
+        elif d["reduction"] == "monthlySum":
+            monthlyExpressions[name] = f"TOTAL({value})"
+        else:
+            raise Exception (f"Unsupported reduction for the metric {name}: {d['reduction']}")
+
+    # Calculate every aggregate of every variable in a single pass over the data. Each aggregate is only calculated once, however many metrics use it.
+    aggregates = list(dict.fromkeys(expressions.values()))
+    indices = ", ".join("?" * len(variables))
+    rows = conn.execute(
+        f"""
+        SELECT r.ReportDataDictionaryIndex, {", ".join(aggregates)}
+        FROM ReportData r
+        JOIN Time t ON r.TimeIndex = t.TimeIndex
+        WHERE r.ReportDataDictionaryIndex IN ({indices})
+        AND (t.WarmupFlag IS NULL OR t.WarmupFlag = 0)
+        GROUP BY r.ReportDataDictionaryIndex
+        """,
+        list(variables.values()),
+    ).fetchall()
+    values = {row[0]: dict(zip(aggregates, row[1:])) for row in rows}
+
+    monthlyValues = {}
+    if monthlyExpressions:
+        monthlyAggregates = list(dict.fromkeys(monthlyExpressions.values()))
+        rows = conn.execute(
+            f"""
+            SELECT r.ReportDataDictionaryIndex, t.Month, {", ".join(monthlyAggregates)}
+            FROM ReportData r
+            JOIN Time t ON r.TimeIndex = t.TimeIndex
+            WHERE r.ReportDataDictionaryIndex IN ({indices})
+            AND (t.WarmupFlag IS NULL OR t.WarmupFlag = 0)
+            GROUP BY r.ReportDataDictionaryIndex, t.Month
+            ORDER BY MIN(t.TimeIndex)
+            """,
+            list(variables.values()),
+        ).fetchall()
+        for row in rows:
+            monthlyValues.setdefault(row[0], []).append((row[1], dict(zip(monthlyAggregates, row[2:]))))
+
+    results = {}
+    for name, d in definitions.items():
+        index = variables[d["column"]]
+        scale = d.get("scale", 1)
+        if name in monthlyExpressions:
+            for month, aggregate in monthlyValues.get(index, []):
+                results[f"{name}[{month}]"] = aggregate[monthlyExpressions[name]] * scale
+        elif d["reduction"] == "hoursAbove":
+            results[name] = int(values[index][expressions[name]])
+        else:
+            result = values[index][expressions[name]]
+            results[name] = result * scale if result is not None else np.nan
+
+    return results
+
+
+def querySQLiteResilienceResults (conn):
+
+    # The ThermalResilienceSummary report is written as AnnualThermalResilienceSummary, and any reporting periods as separate reports with the same suffix,
+    # so the report is matched by its suffix and the annual report is put first
+    tables = ", ".join("?" * len(RESILIENCE_TABLES))
+    rows = conn.execute(
+        f"""
+        SELECT TableName, ColumnName, Value FROM TabularDataWithStrings
+        WHERE ReportName LIKE '%ThermalResilienceSummary' AND UPPER(RowName) = ? AND TableName IN ({tables})
+        ORDER BY ReportName NOT LIKE 'Annual%', TabularDataIndex
+        """,
+        [RESILIENCE_ZONE] + list(RESILIENCE_TABLES),
+    ).fetchall()
+
+    # If a table still appears more than once, the first one is used
+    values = {}
+    for table, column, value in rows:
+        values.setdefault((table, column.strip()), value.strip())
+
+    resilienceResults = {}
+    for table, columns in RESILIENCE_TABLES.items():
+        for prefix, name in columns:
+            matches = [v for (t, c), v in values.items() if t == table and c.startswith(prefix)]
+            if not matches:
+                raise Exception (f"Could not find the '{prefix}' column of the '{table}' table in the SQLite output.")
+            resilienceResults[name] = matches[0]
+
+    for name, value in resilienceResults.items():
+        if not name.startswith("Start Time"):
+            resilienceResults[name] = float(value)
+
+    return resilienceResults
+
+
+def readHourlySQLite (filePath, columns = HOURLY_COLUMNS):
+    """
+    The SQLite equivalent of readHourlyColumns. Reads the hourly values of the given columns from eplusout.sql as float arrays.
+
+    columns is a dictionary of {name: column header}. Returns a dictionary of {name: numpy array}, and the month of each timestep under the "Month" key.
+    """
+
+    data = {}
+    uri = f"{Path(filePath).resolve().as_uri()}?mode=ro"
+    with sqlite3.connect(uri, uri = True) as conn:
+        for name, header in columns.items():
+            key, variable, frequency = parseColumnHeader(header)
+            rows = conn.execute(
+                """
+                SELECT r.Value, t.Month FROM ReportData r
+                JOIN ReportDataDictionary d ON r.ReportDataDictionaryIndex = d.ReportDataDictionaryIndex
+                JOIN Time t ON r.TimeIndex = t.TimeIndex
+                WHERE UPPER(d.KeyValue) = UPPER(?) AND d.Name = ? AND d.ReportingFrequency = ?
+                AND (t.WarmupFlag IS NULL OR t.WarmupFlag = 0)
+                ORDER BY r.TimeIndex
+                """,
+                (key, variable, frequency),
+            ).fetchall()
+            if not rows:
+                raise Exception (f"Could not find the variable {header} in the SQLite output.")
 
+            rows = np.array(rows, dtype = np.float64)
+            data[name] = rows[:, 0]
+            data.setdefault("Month", rows[:, 1].astype(np.int64))
+    conn.close()
 
-    return resilienceResults
\ No newline at end of file
+    return data
@@ -0,0 +1,156 @@
+import os
+from pathlib import Path
+import time
+import uuid
+
+import pandas as pd
+
+from src.instrumentation import log
+
+
+class ResultsStore:
+    """
+    An append-only store of the results of a study, saved as a Parquet dataset in store_dir.
+
+    Each record holds the index of the simulation, its return code (and the reason it failed), the simulation time [s], its inputs, and the metrics from processHourlyResults and processResilienceResults.
+    Records are buffered and written to a new part file every flush_every records, so a crash loses at most the last few simulations rather than the whole study.
+    Each part file is written to a temporary file first and then moved into place, so a reader never sees a partial file.
+
+    Parquet is columnar, so read() only loads the columns and rows which are asked for. compact() merges the part files into one file once a study is finished.
+    Pass the store to runBatch or iterBatch to record each simulation as it finishes and to skip the simulations which have already completed,
+    so an interrupted study can be resumed by running the same command again.
+    """
+
+    def __init__ (self, store_dir, flush_every = 16, row_group_size = 4096):
+        self.store_dir = Path(store_dir)
+        self.flush_every = flush_every
+        self.row_group_size = row_group_size
+        self.buffer = []
+
+        Path.mkdir(self.store_dir, parents = True, exist_ok = True)
+
+    def parts (self):
+        """
+        Returns a sorted list of the part files in the store.
+        """
+
+        return sorted(self.store_dir.glob("*.parquet"))
+
+    def append (self, i, inputs, retcode, hourlyResults = None, resilienceResults = None):
+        """
+        Add the results of simulation i to the store. inputs is the dictionary of the inputs of the simulation.
+        """
+
+        record = {
+            "index": i,
+            "returncode": retcode.returncode,
+            "reason": getattr(retcode, "reason", None),
+            "time [s]": getattr(retcode, "elapsed", None),
+        }
+        record.update(inputs)
+        if hourlyResults is not None:
+            record.update(hourlyResults)
+        if resilienceResults is not None:
+            record.update(resilienceResults)
+
+        self.buffer.append(record)
+        if len(self.buffer) >= self.flush_every:
+            self.flush()
+
+    def flush (self):
+        """
+        Write the buffered records to a new part file.
+        """
+
+        if not self.buffer:
+            return
+
+        self.writeTable(pd.DataFrame(self.buffer))
+        self.buffer = []
+
+    def writeTable (self, records):
+        # Imported here as pyarrow is only needed when results are stored
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pandas(records, preserve_index = False)
+
+        # Part files are named by the time they were written, so that the latest record of a simulation is read last
+        name = f"part-{time.time_ns()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        tmp_path = Path(self.store_dir, f"{name}.tmp")
+        pq.write_table(table, tmp_path, row_group_size = self.row_group_size)
+        path = Path(self.store_dir, f"{name}.parquet")
+        os.replace(tmp_path, path)
+
+        return path
+
+    def dataset (self):
+        # The part files can have different columns (eg. a part with only failed simulations has no metrics), so read them with their combined schema
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        import pyarrow.parquet as pq
+
+        parts = self.parts()
+        schema = pa.unify_schemas([pq.read_schema(p) for p in parts], promote_options = "permissive")
+
+        return ds.dataset(parts, schema = schema, format = "parquet")
+
+    def read (self, columns = None, filters = None):
+        """
+        Returns a dataframe of the records in the store, indexed by the simulation index.
+
+        columns is a list of the columns to load (all of them by default).
+        filters selects the rows to load, either as a pyarrow expression or in the same format as pandas.read_parquet, eg. [("returncode", "==", 0), ("heatingSum", "<", 5000)].
+        If a simulation has been recorded more than once, only the latest record is kept.
+        """
+
+        self.flush()
+
+        if not self.parts():
+            return pd.DataFrame(columns = columns).rename_axis("index")
+
+        import pyarrow.parquet as pq
+
+        if filters is not None and not hasattr(filters, "to_substrait"):
+            filters = pq.filters_to_expression(filters)
+
+        dataset = self.dataset()
+        load = None if columns is None else ["index"] + [c for c in columns if c != "index"]
+        results = dataset.to_table(columns = load, filter = filters).to_pandas()
+
+        results = results.drop_duplicates(subset = "index", keep = "last").set_index("index").sort_index()
+
+        return results
+
+    def completedIndices (self, successful = True):
+        """
+        Returns the set of the indices of the simulations in the store.
+        If successful is True, only the simulations which completed without an error are included, so the failed ones are run again when a study is resumed.
+        """
+
+        self.flush()
+
+        if not self.parts():
+            return set()
+
+        records = self.read(columns = ["returncode"])
+        if successful:
+            records = records[records["returncode"] == 0]
+
+        return set(records.index)
+
+    def compact (self):
+        """
+        Merge the part files into a single file (with only the latest record of each simulation) and delete the old part files.
+        """
+
+        self.flush()
+        parts = self.parts()
+        if len(parts) <= 1:
+            return
+
+        path = self.writeTable(self.read().reset_index())
+        for p in parts:
+            p.unlink()
+
+        log (f"Compacted {len(parts)} part files into {path}.")
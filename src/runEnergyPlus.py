@@ -3,58 +3,215 @@ from pathlib import Path
 import subprocess
 import time
 
-from src.idf import modifyIDF
-from src.processResults import processHourlyResults, processResilienceResults
+from src.idf import fidelityMetrics, fidelityScale, renderIDF
+from src.instrumentation import RunTimer, log
+from src.metrics import requiredOutputs, scaleResults, selectResults
+from src.processResults import processHourlyResults, processResilienceResults, processSQLiteResults
+from src.watchdog import SimulationProcess, Watchdog
 
-def run_energyPlus (ep_dir, baseline_idf_path, weather_file_path, inputs, i):
+# The EnergyPlus version is only looked up once per process for each EnergyPlus directory.
+_energyPlusVersions = {}
+
+def run_energyPlus (ep_dir, baseline_idf_path, weather_file_path, inputs, i, cache = None, backend = "csv", tables = True, metrics = None, workspace = None, watchdog = None, fidelity = "full", cube = None, instrumentation = None, store = None):
     """
     This function modifies a baseline idf file usisng the modifyIDF function.
 
     This function creates a unique idf file by using the search and replace method.
-    
+
     The simulation is then run in a temporary folder (iterations/iteration_{i})
 
+    If a ResultCache is given (see src/cache.py), the results of an identical idf and weather file are reused rather than running EnergyPlus again.
+    A cached run returns a SimulationProcess with the reason "cached".
+
+    The results are read from eplusout.csv and eplustbl.csv by default (backend = "csv").
+    With backend = "sqlite", Output:SQLite is turned on and the results are read from eplusout.sql instead.
+    With backend = "sqlite" and tables = False, the eplusout.csv and eplustbl.* reports are not written at all.
+
+    metrics can be a list of the metrics in src.metrics.METRICS (eg. ["heatingMax", "monthlyHeatingSum", "SET > 30°C Degree-Hours [°C·hr]"]).
+    Only the EnergyPlus outputs needed for these metrics are requested, and only these metrics are returned (monthly sums are returned for each month, eg. "monthlyHeatingSum[1]").
+
+    If a Workspace is given (see src/workspace.py), the simulation is run in the workspace's scratch folder instead, and only the whitelisted files are kept once the results have been read.
+
+    The simulation is supervised by a Watchdog (see src/watchdog.py) which stops it as soon as a fatal error is written to eplusout.err.
+    Pass a Watchdog to also set a time limit, stop on severe errors, or retry failed simulations. The reason for a failure is stored in retcode.reason.
+
+    fidelity selects a cheaper version of the simulation for screening designs, eg. "coarse", "sampled" or "peak" (see src.idf.FIDELITY_LEVELS).
+    Summed results of partial-year levels are scaled to annual estimates, and levels which only support some metrics only return those.
+
+    If a TimeseriesCube is given (see src/timeseriesCube.py), the hourly values of the simulation are also written to it as run i.
+    When a cache is used as well, the hourly values are saved with the cache entry, so that a cached run can also be written to the cube.
+
+    If a ResultsStore is given (see src/resultsStore.py), the inputs and results are recorded in it, including cached runs.
+    The record is written straight away, as pool workers may exit without flushing the store.
+
+    If an Instrumentation is given (see src/instrumentation.py), the time of each phase of the simulation and the resources used by EnergyPlus are recorded.
+    The progress messages can be turned off with src.instrumentation.setVerbose(False).
+
     Returns a tuple of the returncode, and dictionaries of the hourly results, and thermal resilience results.
 
     """
 
+    timer = RunTimer(i, instrumentation)
+
     # Create the folder which the simulation will run in
-    output_path = Path("iterations", f"iteration_{i}")
-    Path.mkdir(output_path, exist_ok = True)
+    if workspace is not None:
+        output_path = workspace.runPath(i)
+    else:
+        output_path = Path("iterations", f"iteration_{i}")
 
     # Create new path to save idf file based on iteration number
-    new_idf_path = Path("iterations", f"iteration_{i}", f"iteration_{i}.idf")
-
-    # Modify the idf file based on the inputs and save a new idf file
-    modifyIDF (baseline_idf_path, new_idf_path, inputs)
+    new_idf_path = Path(output_path, f"iteration_{i}.idf")
 
+    # Modify the idf file based on the inputs
+    with timer.phase("render"):
+        contents = renderIDF (baseline_idf_path, inputs, sqlite = backend == "sqlite", tables = tables, metrics = metrics, fidelity = fidelity)
 
     # Prepare the EnergyPlus command for Windows (NT) or Mac/Linux (Posix)
-    if os.name == "nt": # Command for Windows users
-        ep_path = Path (ep_dir, "energyplus.exe")
-        ep_cmd = f'"{ep_path}" {new_idf_path} -w {weather_file_path} -d {output_path}'
-
-    elif os.name == "posix": # Generate command for Mac/Linux Users
-        ep_path = Path (ep_dir, "energyplus")
-        ep_cmd = f"/{ep_path} {new_idf_path} -w {weather_file_path} -d {output_path}"
-
+    ep_args = getEnergyPlusArgs(ep_dir, new_idf_path, weather_file_path, output_path)
+
+    # Check if this idf has already been simulated with the same weather file and version of EnergyPlus
+    if cache is not None:
+        key = cache.key(contents, weather_file_path, energyPlusVersion(ep_dir), metrics)
+        cached = cache.get(key)
+        if cached is not None:
+            log (f"Using cached results for iteration {i}.")
+            hourlyResults, resilienceResults = cached
+            retcode = SimulationProcess(ep_args, 0, reason = "cached", elapsed = 0.0)
+
+            if cube is not None:
+                with timer.phase("parse"):
+                    cube.writeCached(i, cache, key)
+                    cube.flush()
+
+            # Nothing was written to the simulation folder, but it has already been created
+            if workspace is not None:
+                with timer.phase("finalize"):
+                    workspace.finalize(i)
+
+            if store is not None:
+                store.append(i, inputs, retcode, hourlyResults, resilienceResults)
+                store.flush()
+
+            timer.finish(retcode, cached = True)
+            return retcode, hourlyResults, resilienceResults
+
+    # Save the new idf file
+    with timer.phase("write"):
+        Path.mkdir(output_path, exist_ok = True)
+        with open(new_idf_path, "w") as f:
+            f.write(contents)
+
+    if watchdog is None:
+        watchdog = Watchdog()
 
     # Run the simulation through a command line call.
-    print (f"Beginning EnergyPlus simulation of iteration {i}.", flush = True)
+    log (f"Beginning EnergyPlus simulation of iteration {i}.")
     t0 = time.time()
-    retcode = subprocess.run(ep_cmd, shell = True, stdout = subprocess.DEVNULL, stderr=subprocess.STDOUT) 
+    with timer.phase("simulation"):
+        retcode = watchdog.run(ep_args, output_path)
     t1 = time.time()
 
     if retcode.returncode == 0:
-        print (f"Finished EnergyPlus simulation of iteration {i}. Time of simulation = {t1 - t0:.4f} s.", flush = True)
+        log (f"Finished EnergyPlus simulation of iteration {i}. Time of simulation = {t1 - t0:.4f} s.")
         # Analyse the results
-        hourlyResults = processHourlyResults(Path("iterations", f"iteration_{i}", "eplusout.csv"))
-        resilienceResults = processResilienceResults(Path("iterations", f"iteration_{i}", "eplustbl.csv"))
+        with timer.phase("parse"):
+            hourlyResults, resilienceResults = processIteration(output_path, backend, metrics, fidelity)
+            series = None
+            if cube is not None:
+                series = cube.writeIteration(i, output_path, backend)
+                cube.flush()
+
+        if cache is not None:
+            cache.put(key, hourlyResults, resilienceResults, series)
 
     else:
-        print (f"Error in EnergyPlus simulation of iteration {i}", flush = True)
+        log (f"Error in EnergyPlus simulation of iteration {i}: {retcode.reason}")
         # Return dummy results
         hourlyResults = None
         resilienceResults = None
 
-    return retcode, hourlyResults, resilienceResults
\ No newline at end of file
+    if workspace is not None:
+        with timer.phase("finalize"):
+            workspace.finalize(i)
+
+    if store is not None:
+        store.append(i, inputs, retcode, hourlyResults, resilienceResults)
+        store.flush()
+
+    timer.finish(retcode)
+
+    return retcode, hourlyResults, resilienceResults
+
+
+def processIteration (output_path, backend = "csv", metrics = None, fidelity = "full"):
+    """
+    Returns the hourly results and thermal resilience results of a completed simulation using the given results backend ("csv" or "sqlite").
+    If a list of metrics is given, only the outputs needed for those metrics are read and only those metrics are returned.
+    The results of a simulation run at a reduced fidelity level are scaled to annual estimates.
+    """
+
+    metrics = fidelityMetrics(fidelity, metrics)
+
+    if metrics is None:
+        columns = None
+        resilience = True
+    else:
+        columns, reports = requiredOutputs(metrics)
+        resilience = "ThermalResilienceSummary" in reports
+
+    if backend == "sqlite":
+        hourlyResults, resilienceResults = processSQLiteResults(Path(output_path, "eplusout.sql"), resilience = resilience, metrics = metrics)
+
+    elif backend == "csv":
+        hourlyResults = processHourlyResults(Path(output_path, "eplusout.csv"), metrics = metrics) if columns != [] else {}
+        resilienceResults = processResilienceResults(Path(output_path, "eplustbl.csv")) if resilience else {}
+
+    else:
+        raise Exception (f"Unsupported results backend: {backend}")
+
+    if metrics is not None:
+        hourlyResults, resilienceResults = selectResults(hourlyResults, resilienceResults, metrics)
+
+    scale = fidelityScale(fidelity)
+    if scale != 1:
+        hourlyResults, resilienceResults = scaleResults(hourlyResults, resilienceResults, scale)
+
+    return hourlyResults, resilienceResults
+
+
+def getEnergyPlusPath (ep_dir):
+    """
+    Returns the path to the EnergyPlus executable for Windows (NT) or Mac/Linux (Posix)
+    """
+
+    if os.name == "nt": # Windows users
+        return Path (ep_dir, "energyplus.exe")
+    else: # Mac/Linux Users
+        return Path (ep_dir, "energyplus")
+
+
+def getEnergyPlusArgs (ep_dir, idf_path, weather_file_path, output_path):
+    """
+    Returns the EnergyPlus command as a list of arguments so that it can be launched directly without a shell.
+    """
+
+    return [str(getEnergyPlusPath(ep_dir)), str(idf_path), "-w", str(weather_file_path), "-d", str(output_path)]
+
+
+def energyPlusVersion (ep_dir):
+    """
+    Returns the version string reported by 'energyplus --version'.
+    If the version cannot be determined, the path to the EnergyPlus directory is used instead so that different installations are still kept apart.
+    """
+
+    key = str(ep_dir)
+    if key not in _energyPlusVersions:
+        try:
+            output = subprocess.run([str(getEnergyPlusPath(ep_dir)), "--version"], capture_output = True, text = True, timeout = 30)
+            version = output.stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            version = ""
+
+        _energyPlusVersions[key] = version if version else f"unknown ({Path(ep_dir).resolve()})"
+
+    return _energyPlusVersions[key]
@@ -1,17 +1,18 @@
-import os
 from pathlib import Path
-import subprocess
 import time
 
+from src.instrumentation import log
 from src.processResults import processHourlyResults, processResilienceResults
+from src.runEnergyPlus import getEnergyPlusArgs
+from src.watchdog import Watchdog
 
-def run_energyPlus_6A(ep_dir, baseline_idf_path, weather_file_path, value, i):
+def run_energyPlus_6A(ep_dir, baseline_idf_path, weather_file_path, value, i, watchdog = None):
     """
     This function prepares the idf file 1-storey_Example6A.idf by modifying the wall insulation thickness value only.
     
     This function creates a unique idf file by using the search and replace method.
     
-    The simulation is then run in a temporary folder (iterations/iteration_{i})
+    The simulation is then run in a temporary folder (iterations/iteration_{i}) and supervised by a Watchdog, as in run_energyPlus.
 
     Returns a tuple of the returncode, and dictionaries of the hourly results, and thermal resilience results.
 
@@ -35,18 +36,15 @@ def run_energyPlus_6A(ep_dir, baseline_idf_path, weather_file_path, value, i):
         f.write(contents)
 
     # Prepare the EnergyPlus command for Windows (NT) or Mac/Linux (Posix)
-    if os.name == "nt": # Command for Windows users
-        ep_path = Path (ep_dir, "energyplus.exe")
-        ep_cmd = f'"{ep_path}" {new_idf_path} -w {weather_file_path} -d {output_path}'
+    ep_args = getEnergyPlusArgs(ep_dir, new_idf_path, weather_file_path, output_path)
 
-    elif os.name == "posix": # Generate command for Mac/Linux Users
-        ep_path = Path (ep_dir, "energyplus")
-        ep_cmd = f"/{ep_path} {new_idf_path} -w {weather_file_path} -d {output_path}"
+    if watchdog is None:
+        watchdog = Watchdog()
 
     # Run the simulation through a command line call.
-    print (f"Beginning EnergyPlus simulation of iteration {i}.", flush = True)
+    log (f"Beginning EnergyPlus simulation of iteration {i}.")
     t0 = time.time()
-    retcode = subprocess.run(ep_cmd, shell = True, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT) 
+    retcode = watchdog.run(ep_args, output_path)
     t1 = time.time()
 
 
@@ -55,13 +53,13 @@ def run_energyPlus_6A(ep_dir, baseline_idf_path, weather_file_path, value, i):
     # If the simulation has successfully completed we will also collect the results
 
     if retcode.returncode == 0:
-        print (f"Finished EnergyPlus simulation of iteration {i}. Time of simulation = {t1 - t0:.4f} s.", flush = True)
+        log (f"Finished EnergyPlus simulation of iteration {i}. Time of simulation = {t1 - t0:.4f} s.")
         # Analyse the results
         hourlyResults = processHourlyResults(Path("iterations", f"iteration_{i}", "eplusout.csv"))
         resilienceResults = processResilienceResults(Path("iterations", f"iteration_{i}", "eplustbl.csv"))
 
     else:
-        print (f"Error in EnergyPlus simulation of iteration {i}", flush = True)
+        log (f"Error in EnergyPlus simulation of iteration {i}: {retcode.reason}")
         # Return dummy results
         hourlyResults = None
         resilienceResults = None
@@ -1,15 +1,14 @@
-import itertools
 import math
 import numpy as np
 import pandas as pd
-import random
+import time
+import warnings
 
-from scipy.stats import skewnorm
-# scikit-optimize modules. 
-from skopt.sampler import Lhs
-from skopt.space.space import Categorical, Integer, Real
+from scipy.stats import qmc, skewnorm
 
-def statisticalSampling(variables, n):
+from src.instrumentation import log
+
+def statisticalSampling(variables, n, seed = None):
     """
     Generate unique parameters for each simulation based on the instructions in the Variables dictionary
     The are several methods which can be used for each parameter.
@@ -18,40 +17,76 @@ def statisticalSampling(variables, n):
     normal: randomly selected values from a normal/gaussian distribution
     skew: randomly selected values from a skewed normal distribution
     uniform : randomly selct from a uniform distribution
-    constant : a repeated constant value
+    constant : a repeated constant value, given either as the value itself or as a list of it
 
     NOTE: latin hypercube sampling is done in another function
+
+    Parameters in the format of the simulationParameters json files (with a type and values rather than a method) are translated with statisticalMethod.
+    All the random values are drawn from a single numpy Generator, so the same seed gives the same parameters.
     
     """
 
+    rng = np.random.default_rng(seed)
+
     # Initialize a dictionary of parameters
     parameters = {}
 
     for key, input in variables.items():
         #print (key, input)
+        input = statisticalMethod(input)
         if input["method"] == "discrete":
-            v = random.choices(input["values"], k = n)
+            v = pd.Series(input["values"]).to_numpy()[rng.integers(len(input["values"]), size = n)]
             parameters[key] = v
 
         elif input["method"] == "normal":
-            v = np.random.normal(input["mu"], input["sigma"], n)
+            v = rng.normal(input["mu"], input["sigma"], n)
             parameters[key] = v
 
         elif input["method"] == "skew":
-            v = skewnorm.rvs(input["skew"], loc = input["mu"] - input["sigma"], scale = input["sigma"], size = n)
+            v = skewnorm.rvs(input["skew"], loc = input["mu"] - input["sigma"], scale = input["sigma"], size = n, random_state = rng)
             parameters[key] = v
 
-        elif input["uniform"] == "uniform":
-            v = np.random.uniform(min(input["range"]), input["range"], n)
+        elif input["method"] == "uniform":
+            v = rng.uniform(min(input["range"]), max(input["range"]), n)
             parameters[key] = v
 
         elif input["method"] == "constant":
-            v = [input["values"]] * n
+            # values is either the value itself (eg. "values": 99) or a list of it (eg. "values": [99], as in the simulationParameters files)
+            value = input["values"]
+            if isinstance(value, (list, tuple, np.ndarray)):
+                value = value[0]
+            # A typed array of the value, as with the other methods
+            v = np.full(n, value)
             parameters[key] = v
 
+        else:
+            raise Exception (f"Unsupported statistical sampling method for {key}: {input['method']}")
+
     return parameters
 
-def latinHypercubeSampling (variables, n, lhs_type = "classic", criterion = "maximin"):
+def statisticalMethod (input):
+    """
+    Returns the statisticalSampling instructions for a parameter. Parameters which already have a method are returned unchanged.
+    Parameters in the format of the simulationParameters json files are translated into the method which samples them in the same way as Sampler:
+    categorical values are discrete choices, ints are discrete choices of every integer in their range, floats are uniform over their range, and constants are constant.
+    """
+
+    if "method" in input:
+        return input
+
+    values = input["values"]
+    if input["type"] in ["discrete", "categorical", "bool", bool]:
+        return {"method": "discrete", "values": values}
+    if input["type"] in ["constant"] or (input["type"] in [int, "int", float, "float"] and len(values) == 1):
+        return {"method": "constant", "values": [values[0]]}
+    if input["type"] in [int, "int"]:
+        return {"method": "discrete", "values": list(range(int(min(values)), int(max(values)) + 1))}
+    if input["type"] in [float, "float"]:
+        return {"method": "uniform", "range": [min(values), max(values)]}
+
+    raise Exception (f"Unsupported input type for sampling: {input['type']}")
+
+def latinHypercubeSampling (variables, n, lhs_type = "classic", criterion = "maximin", seed = None, iterations = None, time_limit = None):
     """
     Generate unique parameters for each simulation using latin hypercune sampling
     The are several methods which can be used for each parameter.
@@ -61,10 +96,30 @@ def latinHypercubeSampling (variables, n, lhs_type = "classic", criterion = "max
     float: randomly choose a float value from a range
     constant : a repeated constant value
 
+    lhs_type is "classic" (a random value in each interval) or "centered" (the centre of each interval).
+    criterion is None for a basic latin hypercube, or "maximin" to spread the points out (see LatinHypercube.optimise).
+    iterations and time_limit [s] limit how long the maximin optimisation runs for. Pass a seed to generate the same combinations again.
+    The "correlation" and "ratio" criteria are still generated with scikit-optimize, which is much slower for large designs.
+
     Return a dataframe of all combinations.
+    """
+
+    if criterion in ["correlation", "ratio"]:
+        return skoptLatinHypercubeSampling(variables, n, lhs_type, criterion)
 
-    TODO: Refactor the names
+    lhs = LatinHypercube(variables, lhs_type = lhs_type, seed = seed)
+
+    return lhs.generate(n, criterion = criterion, iterations = iterations, time_limit = time_limit)
+
+def skoptLatinHypercubeSampling (variables, n, lhs_type = "classic", criterion = "maximin"):
+    """
+    Generate a latin hypercube sample with scikit-optimize, as latinHypercubeSampling did originally.
     """
+
+    # scikit-optimize is slow to import, so it is only imported when it is used
+    from skopt.sampler import Lhs
+    from skopt.space.space import Categorical, Integer, Real
+
     lhs_instructions = []
 
     # Iterate through each variable and append the instructions for each variable to lhs_instructions list
@@ -97,70 +152,350 @@ def latinHypercubeSampling (variables, n, lhs_type = "classic", criterion = "max
 
     return lhs_values
 
-def randomSampling (parameters, n):
+
+class LatinHypercube:
+    """
+    A latin hypercube sample of the parameters in a simulationParameters json file.
+
+    The design is built in the unit hypercube: each parameter which is not constant is split into n equal intervals, and each interval holds exactly one point.
+    The points are then scaled to the values of each parameter in the same way as Sampler (categorical values and integers take an equal share of the interval).
+
+    The maximin criterion starts from a latin hypercube built from the ranks of a scrambled Sobol sequence, then spreads the points out further
+    by swapping the values of two points in one column, which keeps the latin property (see optimise).
+    Only the nearest neighbours of the moved points are checked after each swap, so a design of 100,000 points takes seconds rather than hours.
+
+    The design can be grown with grow(), which adds points in the intervals left empty by the existing points.
+    """
+
+    def __init__ (self, variables, lhs_type = "classic", seed = None):
+        if lhs_type not in ["classic", "centered"]:
+            raise Exception (f"Unsupported lhs_type: {lhs_type}")
+
+        self.variables = variables
+        self.lhs_type = lhs_type
+        self.sampler = Sampler(variables, seed = seed)
+        self.rng = self.sampler.rng
+        self.unit = np.empty((0, len(self.sampler.dimensions)))
+
+    def dataFrame (self, unit, start = 0):
+        """
+        Scale points in the unit hypercube to a dataframe of parameter values, indexed from start.
+        """
+
+        return pd.DataFrame(self.sampler.transform(unit), columns = list(self.variables.keys()), index = np.arange(start, start + len(unit)))
+
+    def intervals (self, strata):
+        """
+        Returns the position of a point within each of the given intervals of each column, as a fraction of the interval.
+        """
+
+        if self.lhs_type == "centered":
+            return np.full(strata.shape, 0.5)
+
+        return self.rng.random(strata.shape)
+
+    def generate (self, n, criterion = "maximin", iterations = None, time_limit = None):
+        """
+        Returns a dataframe of a new latin hypercube design of n points.
+        """
+
+        d = self.unit.shape[1]
+        if criterion == "maximin" and d > 0:
+            # Start from the ranks of a scrambled Sobol sequence, which is already evenly spread, so the optimisation has less to do
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", UserWarning)
+                sobol = qmc.Sobol(d, scramble = True, seed = self.rng).random(n)
+            strata = np.argsort(np.argsort(sobol, axis = 0), axis = 0)
+        else:
+            strata = np.column_stack([self.rng.permutation(n) for _ in range(d)]) if d else np.empty((n, 0), dtype = int)
+        self.unit = (strata + self.intervals(strata)) / n
+
+        if criterion == "maximin":
+            self.unit = self.optimise(self.unit, iterations = iterations, time_limit = time_limit)
+        elif criterion is not None:
+            raise Exception (f"Unsupported criterion for latin hypercube sampling: {criterion}")
+
+        return self.dataFrame(self.unit)
+
+    def grow (self, m, criterion = "maximin", iterations = None, time_limit = None):
+        """
+        Add m points to the design and return a dataframe of only the new points (indexed after the existing points).
+
+        With n existing points, each column is split into n + m intervals and the new points are placed in the intervals which are still empty.
+        If n + m is a multiple of n, every old interval splits evenly and the grown design is an exact latin hypercube.
+        Otherwise, two existing points can share an interval and a few intervals are left empty, so the design is as close to latin as the existing points allow.
+        Only the new points are moved by the maximin optimisation.
+        """
+
+        n, d = self.unit.shape
+        total = n + m
+
+        strata = np.empty((m, d), dtype = int)
+        for j in range(d):
+            occupied = np.zeros(total, dtype = bool)
+            occupied[np.minimum((self.unit[:, j] * total).astype(int), total - 1)] = True
+            empty = np.flatnonzero(~occupied)
+            # If points share intervals there are more empty intervals than new points, so choose among them at random
+            strata[:, j] = self.rng.permutation(self.rng.choice(empty, size = m, replace = False))
+
+        new = (strata + self.intervals(strata)) / total
+        unit = np.vstack([self.unit, new])
+
+        if criterion == "maximin":
+            unit = self.optimise(unit, fixed = n, iterations = iterations, time_limit = time_limit)
+        elif criterion is not None:
+            raise Exception (f"Unsupported criterion for latin hypercube sampling: {criterion}")
+
+        self.unit = unit
+
+        return self.dataFrame(unit[n:], start = n)
+
+    def optimise (self, unit, fixed = 0, iterations = None, time_limit = None):
+        """
+        Increase the smallest distance between any two points of the design (maximin) by swapping values within columns.
+
+        Each round, the points closest to their nearest neighbour are each given a random partner and a random column to swap.
+        The swap is kept if it increases the smaller of the two points' nearest neighbour distances, using a k-d tree to find the neighbours of their new positions.
+        The nearest neighbour distance of every point is kept up to date between rounds, and only the points which have moved (or whose nearest neighbour moved) are looked up again.
+        These distances can overestimate the distances of points which were not looked up, so every point is looked up again whenever the design looks like the best so far.
+        Each swap costs a few k-d tree lookups rather than recalculating the distances between every pair of points.
+        The first fixed points are never moved (used when growing a design).
+
+        iterations is the total number of swaps to try and time_limit [s] stops the optimisation early.
+        The nearest neighbour lookups get slower as the design grows (especially with many parameters), so the default number of swaps falls as the design grows:
+        20 swaps per point up to about 3,500 points, and then 250,000,000 / n swaps, eg. 25,000 swaps for 10,000 points and 2,500 for 100,000 points.
+        Most of the improvement comes from the first swaps, so pass a larger number of iterations (or a time_limit) to spread a large design out further.
+        Note that with a time_limit the design depends on the speed of the computer as well as the seed.
+        Returns the design with the largest minimum distance found.
+        """
+
+        # Imported here as the k-d tree is only needed for the maximin criterion
+        from scipy.spatial import cKDTree
+
+        unit = unit.copy()
+        n, d = unit.shape
+        free = n - fixed
+        if d == 0 or free < 2 or n < 3:
+            return unit
+
+        if iterations is None:
+            # Each swap costs more as the design grows, so the number of swaps falls with the size of the design to keep the time roughly level
+            iterations = min(20 * free, 250000000 // free)
+        # The old positions of the two swapped points may be among the neighbours of a new position, so look up two extra
+        k = min(4, n)
+        batch = max(1, free // 20)
+
+        t0 = time.time()
+        attempts = 0
+        distance = np.empty(n)
+        nearest = np.empty(n, dtype = int)
+        stale = np.arange(n)
+        best, bestDistance = unit.copy(), -1
+
+        while True:
+            tree = cKDTree(unit)
+            lookup = tree.query(unit[stale], k = 2, workers = -1)
+            distance[stale], nearest[stale] = lookup[0][:, 1], lookup[1][:, 1]
+
+            minDistance = distance.min()
+            if minDistance > bestDistance:
+                # The distances of the points which were not looked up again are only updated where a moved point came closer, so they can be too high.
+                # Look every point up again before keeping the design, so the best design is judged on its exact minimum distance.
+                # minDistance is the distance between two actual points, so the exact minimum is no larger, and the search can stop at minDistance.
+                lookup = tree.query(unit, k = 2, distance_upper_bound = np.nextafter(minDistance, np.inf), workers = -1)
+                minDistance = lookup[0][:, 1].min()
+                if minDistance > bestDistance:
+                    best, bestDistance = unit.copy(), minDistance
+
+            if attempts >= iterations or (time_limit is not None and time.time() - t0 > time_limit):
+                break
+
+            # Pair each of the worst placed points with a random partner. Each point may only be moved once per round.
+            size = min(batch, iterations - attempts)
+            worst = fixed + np.argpartition(distance[fixed:], size - 1)[:size]
+            partners = self.rng.integers(fixed, n, size = len(worst))
+            columns = self.rng.integers(d, size = len(worst))
+            attempts += len(worst)
+
+            used = np.zeros(n, dtype = bool)
+            keep = np.zeros(len(worst), dtype = bool)
+            for i, (a, b) in enumerate(zip(worst, partners)):
+                if a != b and not used[a] and not used[b]:
+                    used[a] = used[b] = keep[i] = True
+            a, b, columns = worst[keep], partners[keep], columns[keep]
+
+            rows = np.arange(len(a))
+            newA, newB = unit[a].copy(), unit[b].copy()
+            newA[rows, columns], newB[rows, columns] = unit[b, columns], unit[a, columns]
+
+            # Find the nearest neighbours of the new positions, ignoring the old positions of the two points being swapped
+            positions = np.vstack([newA, newB])
+            owners = np.concatenate([a, b])
+            others = np.concatenate([b, a])
+            candidates = tree.query(positions, k = k, workers = -1)[1]
+            distances = np.linalg.norm(unit[candidates] - positions[:, None, :], axis = 2)
+            distances[(candidates == owners[:, None]) | (candidates == others[:, None])] = np.inf
+            newDistance = distances.min(axis = 1)
+            pairDistance = np.linalg.norm(newA - newB, axis = 1)
+
+            before = np.minimum(distance[a], distance[b])
+            after = np.minimum(np.minimum(newDistance[:len(a)], newDistance[len(a):]), pairDistance)
+            accept = after > before
+
+            unit[a[accept]] = newA[accept]
+            unit[b[accept]] = newB[accept]
+
+            # The neighbours of the new positions may now be closer to a moved point than to their previous nearest neighbour
+            accepted = np.concatenate([accept, accept])
+            closer = distances[accepted] < distance[candidates[accepted]]
+            distance[candidates[accepted][closer]] = distances[accepted][closer]
+            nearest[candidates[accepted][closer]] = np.broadcast_to(owners[accepted][:, None], closer.shape)[closer]
+
+            # The moved points, and the points which had them as their nearest neighbour, need looking up again
+            moved = np.zeros(n, dtype = bool)
+            moved[a[accept]] = moved[b[accept]] = True
+            stale = np.flatnonzero(moved | moved[nearest])
+
+        return best
+
+    @staticmethod
+    def minDistance (unit):
+        """
+        Returns the smallest distance between any two points of a design in the unit hypercube.
+        """
+
+        from scipy.spatial import cKDTree
+
+        return cKDTree(unit).query(unit, k = 2)[0][:, 1].min()
+
+def randomSampling (parameters, n, seed = None):
     """
     Generate unique parameters for each simulation based on random sampling methods
     The are several methods which can be used for each parameter.
 
     discrete/categorical: a randomly selected choice from a list of options
-    int: randomly choose an integer from a range
+    int: randomly choose an integer from a range (including both ends)
     float: randomly choose a float value from a range
     constant : a repeated constant value
 
-    Return a dataframe of all combinations.
+    Return a dataframe of all combinations. Each column keeps the type of its parameter (eg. int64 or float64).
+    Pass a seed to generate the same combinations again. See Sampler for quasi-random sampling and streaming large samples.
 
     """
 
-    # Initiate a list to store the values
-    random_values = []
+    return Sampler(parameters, seed = seed).sampleDataFrame(n, method = "random")
 
-    # Iterate through each variable and append an array of length n, to the list
-    # Depending on the 'type' a different random function will be used
-    for k, v in parameters.items():
 
-        if v["type"] in ["discrete", "categorical", "bool", bool]:
-            random_values.append(random.choices(v["values"], k = n))
+class Sampler:
+    """
+    Generates samples of the parameters in a simulationParameters json file.
 
-        elif v["type"] in ["constant"]:
-                 random_values.append ([v["values"][0]] * n)   
+    The methods are:
+        random: independent uniform random values
+        sobol: a scrambled Sobol sequence
+        halton: a scrambled Halton sequence
 
+    Sobol and Halton sequences are quasi-random: they fill the parameter space more evenly than random values, so statistics such as the mean converge with fewer simulations.
+    Sobol sequences are best used in powers of 2 (eg. 256, 512 or 1024 samples).
 
-        elif v["type"] in [int, "int"]:
-            # Perform an error check if only one value was given. Assume it is like a constant value.
-            if len (v["values"]) == 1:
-                 random_values.append ([v["values"][0]] * n)  
-            # Ensure the given values are in the correct order
-            else: 
-                min_value = min(v["values"])
-                max_value = max(v["values"])
+    Every method draws from a single numpy Generator created from the seed, so the same seed gives the same samples.
+    Samples are returned as a dictionary with one typed numpy array per parameter. The sequences continue between calls, so a large study can be generated in chunks.
+    """
+
+    def __init__ (self, parameters, seed = None):
+        self.parameters = parameters
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        self.engines = {}
+
+        # Each parameter which is not constant takes one dimension of the unit hypercube
+        self.dimensions = []
+        self.constants = {}
+        for k, v in parameters.items():
+            if v["type"] in ["discrete", "categorical", "bool", bool]:
+                self.dimensions.append(k)
+            elif v["type"] in ["constant"] or (v["type"] in [int, "int", float, "float"] and len(v["values"]) == 1):
+                self.constants[k] = v["values"][0]
+            elif v["type"] in [int, "int", float, "float"]:
+                self.dimensions.append(k)
+            else:
+                raise Exception (f"Unsupported input type for sampling: {v['type']}")
+
+    def unitSample (self, n, method = "random"):
+        """
+        Returns an n x d array of points in the unit hypercube, where d is the number of parameters which are not constant.
+        """
+
+        d = len(self.dimensions)
+
+        if method == "random":
+            return self.rng.random((n, d))
 
-                random_values.append(np.random.randint(
-                    min_value,
-                    max_value,
-                    n
-                ))
+        if d == 0:
+            return np.empty((n, 0))
+
+        if method not in self.engines:
+            if method == "sobol":
+                self.engines[method] = qmc.Sobol(d, scramble = True, seed = self.rng)
+            elif method == "halton":
+                self.engines[method] = qmc.Halton(d, scramble = True, seed = self.rng)
+            else:
+                raise Exception (f"Unsupported sampling method: {method}")
+
+        return self.engines[method].random(n)
+
+    def transform (self, u):
+        """
+        Scale an n x d array of points in the unit hypercube to the values of each parameter.
+        Returns a dictionary with a numpy array for each parameter.
+        """
+
+        n = len(u)
+        samples = {}
+        for k, v in self.parameters.items():
+            if k in self.constants:
+                samples[k] = np.full(n, self.constants[k])
+                continue
+
+            x = u[:, self.dimensions.index(k)]
+
+            if v["type"] in ["discrete", "categorical", "bool", bool]:
+                values = pd.Series(v["values"]).to_numpy()
+                samples[k] = values[np.minimum((x * len(values)).astype(np.int64), len(values) - 1)]
+
+            elif v["type"] in [int, "int"]:
+                min_value = int(min(v["values"]))
+                max_value = int(max(v["values"]))
+                samples[k] = np.minimum(min_value + (x * (max_value - min_value + 1)).astype(np.int64), max_value)
 
-        elif v["type"] in [float, "float"]:
-                # Perform an error check if only one value was given. Assume it is like a constant value.
-            if len (v["values"]) == 1:
-                 random_values.append ([v["values"][0]] * n)   
             else:
                 min_value = min(v["values"])
                 max_value = max(v["values"])
+                samples[k] = min_value + x * (max_value - min_value)
 
-                random_values.append(np.random.uniform(
-                    min_value,
-                    max_value,
-                    n
-                ))
-        else:
-            raise Exception (f"Unsupported input type for random sampling: {v['type']}")
+        return samples
+
+    def sample (self, n, method = "random"):
+        """
+        Returns a dictionary of n samples of each parameter, as typed numpy arrays.
+        """
 
-    # Convert the list of lists into a dataframe. The transpose function is required to orient them correctly.
-    random_values = pd.DataFrame(random_values).T
-    random_values.columns = parameters.keys()
+        return self.transform(self.unitSample(n, method))
 
-    return random_values
+    def sampleDataFrame (self, n, method = "random"):
+        """
+        Returns a dataframe of n samples of the parameters, with a column for each parameter.
+        """
+
+        return pd.DataFrame(self.sample(n, method), columns = list(self.parameters.keys()))
+
+    def chunks (self, n, chunk_size = 65536, method = "random"):
+        """
+        Yield n samples as dictionaries of at most chunk_size samples each, so that large Monte Carlo studies do not need to be held in memory at once.
+        """
+
+        for start in range(0, n, chunk_size):
+            yield self.sample(min(chunk_size, n - start), method)
 
 
 def fullFactorialSampling(parameters):
@@ -169,25 +504,116 @@ def fullFactorialSampling(parameters):
     All parameters must be either a constant or categorical datatype otherwise an error will be thrown.
 
     Returns a dataframe of all combinations.
+    For large designs, use FactorialDesign directly to generate the combinations in chunks instead.
+    """
+
+    design = FactorialDesign(parameters)
+
+    log (f"A total of {len(design)} will be generated using the full-factorial method.")
+
+    return design.toDataFrame()
+
+
+class FactorialDesign:
     """
+    A full-factorial design which generates its combinations on demand rather than holding them all in memory.
+
+    The combinations are numbered in the same order as itertools.product, ie. the last parameter changes fastest.
+    Combination i is found directly from i by treating it as a mixed-radix number, where each digit is the index into the values of one parameter.
+    This means any slice of the design can be generated without enumerating the combinations before it,
+    so each worker (or node) can generate only its own shard and start simulating straight away.
+
+    The dataframes returned are indexed by the combination number, so the iteration numbers are unique across chunks and shards.
+    """
+
+    def __init__ (self, parameters):
+        self.names = list(parameters.keys())
+        self.values = [list(v["values"]) for v in parameters.values()]
+        self.radices = [len(v) for v in self.values]
+
+        for name, radix in zip(self.names, self.radices):
+            if radix == 0:
+                raise Exception (f"The parameter {name} has no values.")
+
+        # Keep the dtype of each parameter (eg. int, float, or str) when values are picked out by index
+        self.columns = [pd.Series(v).to_numpy() for v in self.values]
+
+    def __len__ (self):
+        return math.prod(self.radices)
+
+    @property
+    def size (self):
+        return len(self)
+
+    def __getitem__ (self, index):
+        return self.combination(index)
+
+    def combination (self, index):
+        """
+        Returns the dictionary of parameter values of combination number index.
+        """
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError (f"Combination {index} is out of range for a design of {len(self)} combinations.")
+
+        combination = {}
+        for name, values, radix in zip(reversed(self.names), reversed(self.values), reversed(self.radices)):
+            index, digit = divmod(index, radix)
+            combination[name] = values[digit]
+
+        return {name: combination[name] for name in self.names}
+
+    def rows (self, start, stop):
+        """
+        Returns a dataframe of the combinations numbered from start up to (but not including) stop.
+        """
+
+        stop = min(stop, len(self))
+        indices = np.arange(start, stop, dtype = np.int64)
+
+        columns = {}
+        remainder = indices.copy()
+        for name, column, radix in zip(reversed(self.names), reversed(self.columns), reversed(self.radices)):
+            remainder, digits = np.divmod(remainder, radix)
+            columns[name] = column[digits]
+
+        return pd.DataFrame({name: columns[name] for name in self.names}, index = indices)
+
+    def chunks (self, chunk_size = 1000, start = 0, stop = None):
+        """
+        Yield the combinations from start to stop as dataframes of at most chunk_size rows.
+        """
+
+        if stop is None:
+            stop = len(self)
 
-    # Calculate how many runs will be generated
-    n_values = [len(v["values"]) for v in parameters.values()]
+        for chunk_start in range(start, stop, chunk_size):
+            yield self.rows(chunk_start, min(chunk_start + chunk_size, stop))
 
-    # calculate the factorial
-    n_simulations = 1
-    for i in n_values:
-        n_simulations *= i
+    def shardRange (self, k, n):
+        """
+        Returns the range of combination numbers in the k-th of n shards (k = 0, 1, ... n - 1).
+        The shards are contiguous and differ in size by at most one combination.
+        """
 
-    print (f"A total of {n_simulations} will be generated using the full-factorial method.")
+        if not 0 <= k < n:
+            raise Exception (f"Shard {k} is out of range for {n} shards.")
 
-    # Generate the full-factorial set using itertools.product
-    list_of_values = [v["values"] for v in parameters.values()]
+        return range(k * len(self) // n, (k + 1) * len(self) // n)
 
-    factorial_values = list(itertools.product(*list_of_values))
+    def shard (self, k, n, chunk_size = 1000):
+        """
+        Yield the combinations of the k-th of n shards as dataframes of at most chunk_size rows.
+        """
 
-    # Place this into a dataframe
-    factorial_values = pd.DataFrame(factorial_values, columns = parameters.keys())
+        shard = self.shardRange(k, n)
+        yield from self.chunks(chunk_size, shard.start, shard.stop)
 
-    return factorial_values
+    def toDataFrame (self):
+        """
+        Returns a dataframe of every combination.
+        """
 
+        return self.rows(0, len(self))
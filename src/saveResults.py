@@ -1,6 +1,13 @@
+import json
 from pathlib import Path
+import time
 
+import numpy as np
 import pandas as pd
+from pymoo.core.callback import Callback
+
+from src.instrumentation import log
+from src.resultsStore import ResultsStore
 
 
 def saveNSGA2History(history, parameters, saveName):
@@ -8,6 +15,7 @@ def saveNSGA2History(history, parameters, saveName):
     This function parses through the res.history object and retrieves the design space parameters (X) and objective function values (F) for each individual in each generation and stores them in a pandas dataframe.
 
     It then saves the results and also returns the history of X and F.
+    This needs minimize(..., save_history = True), which keeps a copy of the algorithm for every generation in memory. For long runs use HistoryRecorder instead.
     """
 
     # Initialize a list of lists for the design and objective spaces
@@ -51,3 +59,108 @@ def saveNSGA2Optimal(X, F, n_generations, saveName):
     print(f"Objective space optimal set dataframe saved to {savePath}.")
 
     return X, F
+
+
+class HistoryRecorder(Callback):
+    """
+    A pymoo callback which saves the population of every generation to disk as soon as the generation finishes, eg. minimize(problem, algorithm, termination, callback = HistoryRecorder(saveName)).
+
+    Unlike save_history = True, nothing is kept in memory, and the history up to the last finished generation survives if the run is stopped or the kernel dies.
+    Each generation is written as its own Parquet file in outputs/results/history_{saveName}/ (see src/resultsStore.py), with a row for each individual holding:
+        generation, individual: as in saveNSGA2History
+        the parameters (X), the objectives (F), the inequality and equality constraints (G1, G2, ..., H1, H2, ...) and the constraint violation (CV)
+        n_eval: the number of evaluations so far
+        time [s] and generation time [s]: the time since the start of the run, and the time taken by this generation (mostly spent evaluating it)
+
+    The names of the parameters and objectives are taken from the problem's parameterNames and objectives attributes if it has them,
+    otherwise from the parameters and objectives arguments, otherwise they are numbered (x1, x2, ..., f1, f2, ...).
+    Read the history back with loadNSGA2History.
+
+    If a history has already been saved with the same saveName, an exception is raised when the run starts, unless overwrite is True, in which case the old history is removed.
+    """
+
+    def __init__ (self, saveName, parameters = None, objectives = None, overwrite = False):
+        super().__init__()
+        self.saveName = saveName
+        self.overwrite = overwrite
+        self.parameterNames = list(parameters.keys()) if parameters is not None else None
+        self.objectives = list(objectives) if objectives is not None else None
+        self.store = ResultsStore(historyPath(saveName))
+
+    def initialize (self, algorithm):
+        problem = algorithm.problem
+        self.parameterNames = list(getattr(problem, "parameterNames", None) or self.parameterNames or [f"x{k + 1}" for k in range(problem.n_var)])
+        self.objectives = list(getattr(problem, "objectives", None) or self.objectives or [f"f{k + 1}" for k in range(problem.n_obj)])
+
+        if len(self.parameterNames) != problem.n_var or len(self.objectives) != problem.n_obj:
+            raise Exception (f"The problem has {problem.n_var} parameters and {problem.n_obj} objectives, but {len(self.parameterNames)} parameter names and {len(self.objectives)} objective names were given.")
+
+        # Remove the history of any previous run with the same saveName
+        parts = self.store.parts()
+        if parts:
+            if not self.overwrite:
+                raise Exception (f"A history has already been saved to {self.store.store_dir}. Use another saveName, or HistoryRecorder(..., overwrite = True) to replace it.")
+            log (f"Removing the {len(parts)} generations of the previous history in {self.store.store_dir}.")
+            for part in parts:
+                part.unlink()
+
+        with open (Path(self.store.store_dir, "columns.json"), "w", encoding = "UTF-8") as f:
+            json.dump({"parameters": self.parameterNames, "objectives": self.objectives}, f, indent = 4)
+
+        self.last = algorithm.start_time if algorithm.start_time is not None else time.time()
+
+    def notify (self, algorithm):
+        X, F, G, H, CV = algorithm.pop.get("X", "F", "G", "H", "CV")
+        n = len(X)
+        now = time.time()
+
+        columns = {
+            "generation": np.full(n, algorithm.n_gen - 1),
+            "individual": np.arange(n),
+        }
+        columns.update({name: X[:, k] for k, name in enumerate(self.parameterNames)})
+        columns.update({name: F[:, k] for k, name in enumerate(self.objectives)})
+        columns.update({f"G{k + 1}": G[:, k] for k in range(G.shape[1])})
+        columns.update({f"H{k + 1}": H[:, k] for k in range(H.shape[1])})
+        columns["CV"] = CV[:, 0]
+        columns["n_eval"] = np.full(n, algorithm.evaluator.n_eval)
+        columns["time [s]"] = np.full(n, now - algorithm.start_time)
+        columns["generation time [s]"] = np.full(n, now - self.last)
+
+        self.store.writeTable(pd.DataFrame(columns))
+        self.last = now
+
+
+def historyPath (saveName):
+    return Path("outputs", "results", f"history_{saveName}")
+
+
+def loadNSGA2History(saveName, generations = None, columns = None):
+    """
+    Read the history saved by HistoryRecorder, and return history_X and history_F dataframes in the same format as saveNSGA2History.
+
+    Only the files and columns which are needed are read, so generations can be a list of the generations to load (all of them by default),
+    and columns a list of the extra columns to add to history_F, eg. ["CV", "time [s]"].
+    """
+
+    path = historyPath(saveName)
+    store = ResultsStore(path)
+    if not store.parts():
+        raise Exception (f"No history has been saved to {path}.")
+
+    import pyarrow.dataset as ds
+
+    with open (Path(path, "columns.json"), encoding = "UTF-8") as f:
+        names = json.load(f)
+
+    keys = ["generation", "individual"]
+    extra = list(columns) if columns is not None else []
+    filters = ds.field("generation").isin(list(generations)) if generations is not None else None
+
+    history = store.dataset().to_table(columns = keys + names["parameters"] + names["objectives"] + extra, filter = filters).to_pandas()
+    history = history.sort_values(keys, ignore_index = True)
+
+    history_X = history[keys + names["parameters"]]
+    history_F = history[keys + names["objectives"] + extra]
+
+    return history_X, history_F
@@ -0,0 +1,164 @@
+from collections import Counter
+import itertools
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.idf import renderIDF
+from src.instrumentation import log
+from src.runEnergyPlus import energyPlusVersion, getEnergyPlusArgs
+from src.scheduler import iterAsync, runJobs
+from src.studyRunner import designId, inputRecords
+from src.watchdog import SimulationProcess
+
+
+def scenarioList (scenarios):
+    """
+    Returns a list of (name, baseline_idf_path, weather_file_path) tuples.
+    scenarios can be a dictionary of {name: (baseline_idf_path, weather_file_path)}, or a list of (baseline_idf_path, weather_file_path) tuples,
+    which are named "{baseline} | {weather}" after the names of the files.
+    """
+
+    if isinstance(scenarios, dict):
+        scenarios = [(name, Path(baseline), Path(weather)) for name, (baseline, weather) in scenarios.items()]
+    else:
+        scenarios = [(f"{Path(baseline).stem} | {Path(weather).stem}", Path(baseline), Path(weather)) for baseline, weather in scenarios]
+
+    names = [s[0] for s in scenarios]
+    if len(set(names)) != len(names):
+        raise Exception (f"The scenario names must be unique: {names}")
+
+    return scenarios
+
+
+def scenarioMatrix (baselines, weather_files):
+    """
+    Returns the list of every combination of the baseline idfs and weather files, eg. scenarioMatrix([baseline_idf_path], [current_epw, future_epw]).
+    """
+
+    return list(itertools.product(baselines, weather_files))
+
+
+async def runScenarioBatch (ep_dir, designs, scenarios, max_concurrent = None, cache = None, backend = "csv", tables = True, metrics = None, watchdog = None, fidelity = "full", scenario_dir = Path("iterations", "scenarios")):
+    """
+    Simulate every design in every scenario as one batch with runJobs, and yield the result of each simulation as soon as it completes.
+
+    Each design is rendered once per baseline, and the idf is shared by all the weather files of that baseline rather than rendered again.
+    The simulations are queued design by design, so the scenarios are interleaved and all of them progress together.
+    The idfs are written to {scenario_dir}/{design_id}_b{k}.idf and each simulation is run in {scenario_dir}/{design_id}_s{j}, where k and j number the baselines and scenarios.
+    Designs which appear more than once in designs (which is common when int or categorical parameters are sampled) are only simulated once, so each folder is only used by one simulation.
+
+    This is an async generator which yields a tuple of (design_id, scenario, inputs, returncode, hourlyResults, resilienceResults).
+    """
+
+    # Duplicate designs have the same ID, so they would be run in the same folders at the same time
+    records = {}
+    for inputs in inputRecords(designs):
+        records.setdefault(designId(inputs), inputs)
+    scenarios = scenarioList(scenarios)
+    baselines = list(dict.fromkeys(baseline for _, baseline, _ in scenarios))
+
+    Path.mkdir(Path(scenario_dir), parents = True, exist_ok = True)
+    version = energyPlusVersion(ep_dir) if cache is not None else None
+
+    jobs = {}
+    cached = []
+
+    def prepareJobs ():
+        n = 0
+        for design, inputs in records.items():
+            for k, baseline in enumerate(baselines):
+                contents = renderIDF(baseline, inputs, sqlite = backend == "sqlite", tables = tables, metrics = metrics, fidelity = fidelity)
+                idf_path = Path(scenario_dir, f"{design}_b{k}.idf")
+                written = False
+
+                for j, (name, scenarioBaseline, weather_file_path) in enumerate(scenarios):
+                    if scenarioBaseline != baseline:
+                        continue
+
+                    key = None
+                    if cache is not None:
+                        key = cache.key(contents, weather_file_path, version, metrics)
+                        results = cache.get(key)
+                        if results is not None:
+                            log (f"Using cached results for design {design} in scenario {name}.")
+                            ep_args = getEnergyPlusArgs(ep_dir, idf_path, weather_file_path, Path(scenario_dir, f"{design}_s{j}"))
+                            cached.append((design, name, inputs, SimulationProcess(ep_args, 0, reason = "cached", elapsed = 0.0), *results))
+                            continue
+
+                    if not written:
+                        with open (idf_path, "w") as f:
+                            f.write(contents)
+                        written = True
+
+                    output_path = Path(scenario_dir, f"{design}_s{j}")
+                    Path.mkdir(output_path, exist_ok = True)
+                    jobs[n] = (design, name, inputs, key)
+                    yield n, idf_path, weather_file_path, output_path
+                    n += 1
+
+    batch = runJobs(ep_dir, prepareJobs(), max_concurrent, backend, metrics, watchdog, fidelity)
+    try:
+        async for n, retcode, hourlyResults, resilienceResults in batch:
+            while cached:
+                yield cached.pop(0)
+
+            design, name, inputs, key = jobs.pop(n)
+            if cache is not None and retcode.returncode == 0:
+                cache.put(key, hourlyResults, resilienceResults)
+
+            yield design, name, inputs, retcode, hourlyResults, resilienceResults
+    finally:
+        # Stop the simulations which are still running if this generator is closed early
+        await batch.aclose()
+
+    while cached:
+        yield cached.pop(0)
+
+
+def runScenarios (ep_dir, designs, scenarios, max_concurrent = None, **kwargs):
+    """
+    Simulate every design in every scenario (see runScenarioBatch) and return a tidy dataframe with one row per design and scenario, indexed by (design_id, scenario).
+
+    designs can be a combinations dataframe, a list of input dictionaries or the output of Sampler.sample. design_id is the stable ID of the inputs (see src/studyRunner.py).
+    A design which appears more than once in designs is only simulated once and has a single row, and count is the number of times it appears.
+    scenarios is a list of (baseline_idf_path, weather_file_path) tuples (eg. from scenarioMatrix) or a dictionary of {name: (baseline_idf_path, weather_file_path)}.
+    Each row has the baseline and weather file of the scenario, the return code and reason of the simulation (the reason of cached results is "cached"), the inputs, and the results.
+    The results of failed simulations are NaN. Any other keyword arguments are passed to runScenarioBatch.
+
+    As with iterBatch, the batch is run in its own event loop on a background thread (see iterAsync), so this also works in a Jupyter notebook.
+    """
+
+    designs = inputRecords(designs)
+    counts = Counter(designId(r) for r in designs)
+    scenarioFiles = {name: (baseline, weather) for name, baseline, weather in scenarioList(scenarios)}
+
+    rows = []
+    for result in iterAsync(lambda: runScenarioBatch(ep_dir, designs, scenarios, max_concurrent, **kwargs), max_concurrent):
+        design, name, inputs, retcode, hourlyResults, resilienceResults = result
+        baseline, weather = scenarioFiles[name]
+        row = {
+            "design_id": design,
+            "scenario": name,
+            "count": counts[design],
+            "baseline": baseline.name,
+            "weather": weather.name,
+            "returncode": retcode.returncode,
+            "reason": getattr(retcode, "reason", None),
+        }
+        row.update(inputs)
+        row.update(hourlyResults or {})
+        row.update(resilienceResults or {})
+        rows.append(row)
+
+    if not rows:
+        return pd.DataFrame(columns = ["design_id", "scenario"]).set_index(["design_id", "scenario"])
+
+    # Sort the rows into the order of the designs and scenarios, rather than the order the simulations finished in
+    table = pd.DataFrame(rows)
+    designOrder = {d: k for k, d in enumerate(dict.fromkeys(designId(r) for r in designs))}
+    scenarioOrder = {name: k for k, name in enumerate(scenarioFiles)}
+    order = np.lexsort((table["scenario"].map(scenarioOrder), table["design_id"].map(designOrder)))
+
+    return table.iloc[order].set_index(["design_id", "scenario"])
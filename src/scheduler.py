@@ -0,0 +1,317 @@
+import asyncio
+import os
+from pathlib import Path
+import queue
+import threading
+import time
+
+from src.idf import renderIDF
+from src.instrumentation import RunTimer, log
+from src.runEnergyPlus import energyPlusVersion, getEnergyPlusArgs, processIteration
+from src.watchdog import SimulationProcess, Watchdog
+
+
+async def runJobs (ep_dir, jobs, max_concurrent = None, backend = "csv", metrics = None, watchdog = None, fidelity = "full", timers = None):
+    """
+    Run a batch of EnergyPlus simulations from an asyncio event loop and yield the results of each one as soon as it completes.
+
+    jobs is an iterable of (i, idf_path, weather_file_path, output_path) tuples. It is consumed lazily, so it can be a generator which prepares each idf just before it is needed.
+    EnergyPlus is launched directly without a shell. At most max_concurrent simulations are run at once (defaults to the number of processors).
+    Each running simulation is waited for on its own thread so that its resource usage can be recorded (see Watchdog.runAsync).
+    backend, metrics and fidelity are passed to processIteration to select how the results are read.
+    Each simulation is supervised by the watchdog (see src/watchdog.py), which stops it early on a fatal error and can also enforce a time limit and retries.
+    timers is an optional dictionary of {i: RunTimer} (see src/instrumentation.py) which the simulation and parse phases of each job are timed with.
+    If the batch is stopped early (the generator is closed or an error is raised), the simulations which are still running are cancelled and their EnergyPlus processes are stopped.
+
+    This is an async generator which yields a tuple of (i, returncode, hourlyResults, resilienceResults) in the order the simulations finish.
+    """
+
+    if max_concurrent is None:
+        max_concurrent = os.cpu_count()
+    if watchdog is None:
+        watchdog = Watchdog()
+
+    jobs = iter(jobs)
+    running = set()
+    exhausted = False
+
+    try:
+        while True:
+            # Top up the number of running simulations
+            while not exhausted and len(running) < max_concurrent:
+                try:
+                    job = next(jobs)
+                except StopIteration:
+                    exhausted = True
+                    break
+                timer = timers.get(job[0]) if timers is not None else None
+                running.add(asyncio.ensure_future(runJob(ep_dir, *job, backend = backend, metrics = metrics, watchdog = watchdog, fidelity = fidelity, timer = timer)))
+
+            if not running:
+                break
+
+            done, running = await asyncio.wait(running, return_when = asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        # Cancelling a job stops its EnergyPlus process (see Watchdog.runAsync)
+        for task in running:
+            task.cancel()
+        if running:
+            await asyncio.gather(*running, return_exceptions = True)
+
+
+async def runJob (ep_dir, i, idf_path, weather_file_path, output_path, backend = "csv", metrics = None, watchdog = None, fidelity = "full", timer = None):
+    """
+    Run a single EnergyPlus simulation from an asyncio event loop (see Watchdog.runAsync) and parse the results.
+    If a RunTimer is given, the simulation and parse phases are timed with it.
+    If the results cannot be read, the simulation is treated as failed, with the kind "parse", rather than stopping the whole batch.
+    Returns a tuple of (i, returncode, hourlyResults, resilienceResults).
+    """
+
+    ep_args = getEnergyPlusArgs(ep_dir, idf_path, weather_file_path, output_path)
+
+    log (f"Beginning EnergyPlus simulation of iteration {i}.")
+    if watchdog is None:
+        watchdog = Watchdog()
+    if timer is None:
+        timer = RunTimer(i)
+
+    t0 = time.time()
+    with timer.phase("simulation"):
+        retcode = await watchdog.runAsync(ep_args, output_path)
+    t1 = time.time()
+
+    if retcode.returncode == 0:
+        log (f"Finished EnergyPlus simulation of iteration {i}. Time of simulation = {t1 - t0:.4f} s.")
+        # Parse the results in a thread so that the event loop can keep launching simulations
+        try:
+            with timer.phase("parse"):
+                hourlyResults, resilienceResults = await asyncio.to_thread(processIteration, output_path, backend, metrics, fidelity)
+        except Exception as e:
+            log (f"Error reading the results of iteration {i}: {e!r}")
+            retcode = SimulationProcess(ep_args, retcode.exitcode, reason = f"parse: {e!r}", kind = "parse", attempts = retcode.attempts, elapsed = retcode.elapsed, spawn = retcode.spawn, rusage = retcode.rusage)
+            hourlyResults = None
+            resilienceResults = None
+    else:
+        log (f"Error in EnergyPlus simulation of iteration {i}: {retcode.reason}")
+        hourlyResults = None
+        resilienceResults = None
+
+    return i, retcode, hourlyResults, resilienceResults
+
+
+async def runBatch (ep_dir, baseline_idf_path, weather_file_path, inputs, max_concurrent = None, cache = None, backend = "csv", tables = True, metrics = None, workspace = None, watchdog = None, fidelity = "full", store = None, cube = None, instrumentation = None):
+    """
+    The asyncio equivalent of running run_energyPlus for each set of inputs with pool.starmap.
+
+    inputs can be a combinations dataframe, a list of input dictionaries, or a dictionary of {i: inputs}.
+    Each simulation is run in iterations/iteration_{i} just like run_energyPlus.
+    If a ResultCache is given, cached results are yielded straight away without running EnergyPlus.
+    backend, tables, metrics and fidelity select how the simulations are run and the results are written and read, as in run_energyPlus.
+    If a Workspace is given, the simulations are run in its scratch folder and finalized once their results have been read.
+    The watchdog supervises each simulation, as in runJobs.
+    If a ResultsStore is given, each simulation is recorded in it as soon as it finishes, and the simulations which have already completed successfully are skipped (and not yielded),
+    so an interrupted study resumes where it stopped. Read the full results from the store.
+    If a TimeseriesCube is given (see src/timeseriesCube.py), the hourly values of each successful simulation are written to it before the results folder is finalized.
+    The hourly values are also saved with the cache entry, so cached results are written to the cube too (see TimeseriesCube.writeCached).
+    Cached results have a SimulationProcess return code with the reason "cached".
+    If an Instrumentation is given (see src/instrumentation.py), the time of each phase of every simulation and the resources used by EnergyPlus are recorded.
+
+    This is an async generator which yields a tuple of (i, returncode, hourlyResults, resilienceResults) as soon as each simulation completes.
+    """
+
+    if hasattr(inputs, "to_dict"):
+        rows = zip(inputs.index, inputs.to_dict("records"))
+    elif isinstance(inputs, dict):
+        rows = inputs.items()
+    else:
+        rows = enumerate(inputs)
+
+    cached = []
+    keys = {}
+    inputRows = {}
+    outputPaths = {}
+    timers = {}
+
+    if instrumentation is not None:
+        instrumentation.restart()
+
+    completed = set()
+    if store is not None:
+        completed = store.completedIndices()
+        if completed:
+            log (f"Skipping {len(completed)} simulations which are already in the results store.")
+
+    def prepareJobs ():
+        for i, row in rows:
+            if i in completed:
+                continue
+            if store is not None:
+                inputRows[i] = row
+            timer = RunTimer(i, instrumentation)
+
+            if workspace is not None:
+                output_path = workspace.runPath(i)
+            else:
+                output_path = Path("iterations", f"iteration_{i}")
+            new_idf_path = Path(output_path, f"iteration_{i}.idf")
+            with timer.phase("render"):
+                contents = renderIDF(baseline_idf_path, row, sqlite = backend == "sqlite", tables = tables, metrics = metrics, fidelity = fidelity)
+
+            if cache is not None:
+                key = cache.key(contents, weather_file_path, energyPlusVersion(ep_dir), metrics)
+                results = cache.get(key)
+                if results is not None:
+                    log (f"Using cached results for iteration {i}.")
+                    ep_args = getEnergyPlusArgs(ep_dir, new_idf_path, weather_file_path, output_path)
+                    retcode = SimulationProcess(ep_args, 0, reason = "cached", elapsed = 0.0)
+                    if cube is not None:
+                        with timer.phase("parse"):
+                            cube.writeCached(i, cache, key)
+                    # Nothing was written to the simulation folder, but it has already been created
+                    if workspace is not None:
+                        with timer.phase("finalize"):
+                            workspace.finalize(i)
+                    timer.finish(retcode, cached = True)
+                    cached.append((i, retcode, *results))
+                    continue
+                keys[i] = key
+
+            with timer.phase("write"):
+                Path.mkdir(output_path, exist_ok = True)
+                with open(new_idf_path, "w") as f:
+                    f.write(contents)
+            outputPaths[i] = output_path
+            timers[i] = timer
+
+            yield i, new_idf_path, weather_file_path, output_path
+
+    def record (result):
+        if store is not None:
+            i, retcode, hourlyResults, resilienceResults = result
+            store.append(i, inputRows.pop(i), retcode, hourlyResults, resilienceResults)
+        return result
+
+    batch = runJobs(ep_dir, prepareJobs(), max_concurrent, backend, metrics, watchdog, fidelity, timers)
+    try:
+        async for i, retcode, hourlyResults, resilienceResults in batch:
+            # Cached results are found while the next job is being prepared, so pass them on first
+            while cached:
+                yield record(cached.pop(0))
+
+            output_path = outputPaths.pop(i)
+            timer = timers.pop(i)
+            series = None
+            if cube is not None and retcode.returncode == 0:
+                with timer.phase("parse"):
+                    series = await asyncio.to_thread(cube.writeIteration, i, output_path, backend)
+
+            if cache is not None and retcode.returncode == 0:
+                cache.put(keys.pop(i), hourlyResults, resilienceResults, series)
+
+            if workspace is not None:
+                with timer.phase("finalize"):
+                    await asyncio.to_thread(workspace.finalize, i)
+
+            timer.finish(retcode)
+
+            yield record((i, retcode, hourlyResults, resilienceResults))
+
+        while cached:
+            yield record(cached.pop(0))
+    finally:
+        # Stop the simulations which are still running if this generator is closed early
+        await batch.aclose()
+        if store is not None:
+            store.flush()
+        if cube is not None:
+            cube.flush()
+
+
+def iterBatch (ep_dir, baseline_idf_path, weather_file_path, inputs, max_concurrent = None, cache = None, backend = "csv", tables = True, metrics = None, workspace = None, watchdog = None, fidelity = "full", store = None, cube = None, instrumentation = None):
+    """
+    A normal (synchronous) generator version of runBatch which can be used in a for loop in a script or a Jupyter notebook.
+
+    Jupyter notebooks already have a running event loop, so the batch is run in its own event loop on a background thread (see iterAsync).
+    The results are yielded as a tuple of (i, returncode, hourlyResults, resilienceResults) as soon as each simulation completes.
+    If the for loop is left early, the simulations which are still running are stopped.
+    """
+
+    return iterAsync(lambda: runBatch(ep_dir, baseline_idf_path, weather_file_path, inputs, max_concurrent, cache, backend, tables, metrics, workspace, watchdog, fidelity, store, cube, instrumentation), max_concurrent)
+
+
+def iterAsync (batch, maxsize = None):
+    """
+    Run an async generator in its own event loop on a background thread, and yield its items from a normal generator.
+    batch is a function which returns the async generator, eg. lambda: runBatch(...).
+
+    At most maxsize items (the number of processors by default) are held until they are taken, and the async generator is not resumed while the buffer is full,
+    so no more simulations are started than the consumer keeps up with.
+    If this generator is closed early (eg. by breaking out of a for loop), the async generator is cancelled and closed before this returns, so its simulations are stopped.
+    """
+
+    if maxsize is None:
+        maxsize = os.cpu_count()
+
+    results = queue.Queue(maxsize = maxsize)
+    stop = threading.Event()
+    finished = object()
+    running = {}
+
+    async def consume ():
+        running["loop"] = asyncio.get_running_loop()
+        running["task"] = asyncio.current_task()
+        if stop.is_set():
+            return
+
+        generator = batch()
+        try:
+            async for result in generator:
+                # Wait for space in the buffer without blocking the event loop, which still has simulations to supervise
+                while True:
+                    try:
+                        results.put_nowait(result)
+                        break
+                    except queue.Full:
+                        await asyncio.sleep(0.05)
+        finally:
+            await generator.aclose()
+
+    def put (item):
+        # Once the consumer has stopped, nothing will take the item
+        while not stop.is_set():
+            try:
+                results.put(item, timeout = 0.1)
+                return
+            except queue.Full:
+                pass
+
+    def target ():
+        try:
+            asyncio.run(consume())
+        except BaseException as e:
+            put(e)
+        finally:
+            put(finished)
+
+    thread = threading.Thread(target = target, daemon = True)
+    thread.start()
+
+    try:
+        while True:
+            result = results.get()
+            if result is finished:
+                break
+            if isinstance(result, BaseException):
+                raise result
+            yield result
+    finally:
+        stop.set()
+        if "task" in running:
+            try:
+                running["loop"].call_soon_threadsafe(running["task"].cancel)
+            except RuntimeError:
+                # The event loop has already finished
+                pass
+        thread.join()
@@ -0,0 +1,200 @@
+import json
+from pathlib import Path
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from src.fidelity import runLevel
+from src.instrumentation import log
+from src.sampling import Sampler
+
+
+def morrisDesign (parameters, r = 10, levels = 4, seed = None):
+    """
+    Build a Morris elementary effects design for the parameters in a simulationParameters json file.
+
+    Each of the r trajectories starts at a random point on a grid of levels values per parameter, and then changes one parameter at a time by delta = levels / (2 * (levels - 1)),
+    in a random order and direction. A trajectory over k varying parameters therefore has k + 1 points, and the design has r * (k + 1) combinations.
+    Constant parameters are not screened. The grid is scaled to the values of each parameter in the same way as Sampler.
+
+    Returns a tuple of:
+        combinations: a dataframe of the design
+        design: a dictionary describing the trajectories, which is needed by morrisIndices
+    """
+
+    sampler = Sampler(parameters, seed = seed)
+    rng = sampler.rng
+    names = sampler.dimensions
+    k = len(names)
+    if k == 0:
+        raise Exception ("There are no varying parameters to screen.")
+
+    delta = levels / (2 * (levels - 1))
+    grid = np.arange(levels) / (levels - 1)
+    # The starting points are chosen so that adding delta stays on the grid
+    starts = grid[grid + delta <= 1 + 1e-12]
+
+    # For each trajectory, the order the parameters are changed in and the direction of each change
+    order = np.argsort(rng.random((r, k)), axis = 1)
+    direction = rng.choice([-1, 1], size = (r, k))
+    base = rng.choice(starts, size = (r, k))
+
+    # Start each parameter at the top of its step if it will be decreased, so that every point stays in the unit hypercube
+    start = np.where(direction < 0, base + delta, base)
+
+    unit = np.empty((r, k + 1, k))
+    unit[:, 0, :] = start
+    trajectories = np.arange(r)
+    for step in range(k):
+        unit[:, step + 1, :] = unit[:, step, :]
+        changed = order[:, step]
+        unit[trajectories, step + 1, changed] += direction[trajectories, changed] * delta
+
+    unit = np.clip(unit, 0, 1)
+    combinations = pd.DataFrame(sampler.transform(unit.reshape(r * (k + 1), k)), columns = list(parameters.keys()))
+
+    design = {
+        "names": names,
+        "r": r,
+        "levels": levels,
+        "delta": delta,
+        "order": order,
+        "direction": np.take_along_axis(direction, order, axis = 1),
+    }
+
+    return combinations, design
+
+
+def morrisIndices (results, design):
+    """
+    Calculate the Morris sensitivity indices of each output from the results of a morrisDesign.
+    results is a dataframe with a row for each combination of the design (in the same order) and a column for each output.
+
+    The elementary effect of a parameter is the change in an output when only that parameter changes, divided by the step in the unit hypercube.
+    Returns a dataframe with a row for each output and parameter with:
+        mu: the mean elementary effect (positive and negative effects can cancel out)
+        muStar: the mean absolute elementary effect, which measures the overall influence of the parameter
+        sigma: the standard deviation of the elementary effects, which is large for non-linear effects and interactions
+        muStarNormalised: muStar divided by the largest muStar of that output
+        rank: the rank of the parameter by muStar for that output (1 is the most influential)
+    Failed simulations (missing results) are left out of the elementary effects they affect.
+    If every effect on an output is missing or zero, the output says nothing about which parameters matter, so its muStarNormalised is NaN and a warning is logged.
+
+    Int and categorical parameters are discretised (see Sampler.transform), so the step delta moves them by a whole number of values, which can differ between trajectories.
+    A step can leave a parameter with few values unchanged, so its effects can be zero even if it is influential. Check the effects of these parameters before freezing them.
+    """
+
+    r, names = design["r"], design["names"]
+    k = len(names)
+    outputs = [c for c in results.columns if pd.api.types.is_numeric_dtype(results[c])]
+
+    Y = results[outputs].to_numpy(dtype = float).reshape(r, k + 1, len(outputs))
+    effects = np.diff(Y, axis = 1) / (design["direction"][:, :, None] * design["delta"])
+
+    # Put the elementary effects in parameter order rather than the order they were changed in each trajectory
+    ordered = np.empty_like(effects)
+    np.put_along_axis(ordered, np.broadcast_to(design["order"][:, :, None], effects.shape), effects, axis = 1)
+
+    # An output which failed in every simulation has no effects, which is reported below rather than as numpy warnings
+    with np.errstate(invalid = "ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        mu = np.nanmean(ordered, axis = 0)
+        muStar = np.nanmean(np.abs(ordered), axis = 0)
+        sigma = np.nanstd(ordered, axis = 0, ddof = 1)
+
+    rows = []
+    for j, output in enumerate(outputs):
+        largest = np.nanmax(muStar[:, j]) if np.any(np.isfinite(muStar[:, j])) else np.nan
+        if not largest > 0:
+            log (f"Warning: every elementary effect on {output} is missing or zero, so it is left out of the screening.")
+            largest = np.nan
+        ranks = pd.Series(muStar[:, j]).rank(ascending = False, method = "min")
+        for i, name in enumerate(names):
+            rows.append({
+                "output": output,
+                "parameter": name,
+                "mu": mu[i, j],
+                "muStar": muStar[i, j],
+                "sigma": sigma[i, j],
+                "muStarNormalised": muStar[i, j] / largest,
+                "rank": ranks[i],
+            })
+
+    return pd.DataFrame(rows)
+
+
+def reducedParameters (parameters, indices, threshold = 0.1, outputs = None, values = None):
+    """
+    Returns a copy of the parameters with the insignificant parameters frozen as constants.
+
+    A parameter is insignificant if its muStarNormalised is below threshold for every output (or for every one of the given outputs).
+    Outputs with no effects (a NaN muStarNormalised, see morrisIndices) are ignored, and an exception is raised if no output is left, rather than freezing every parameter.
+    Frozen parameters are fixed at the value given in values (a dictionary), otherwise at the middle of their range, or their middle option for categorical parameters.
+    """
+
+    if outputs is not None:
+        indices = indices[indices["output"].isin(outputs)]
+    values = values or {}
+
+    informative = indices.groupby("output")["muStarNormalised"].transform(lambda x: x.notna().any())
+    if not informative.any():
+        raise Exception ("None of the outputs have any elementary effects, so the parameters cannot be screened.")
+    indices = indices[informative]
+
+    significant = set(indices.loc[indices["muStarNormalised"] >= threshold, "parameter"])
+
+    reduced = {}
+    for k, v in parameters.items():
+        if k not in set(indices["parameter"]) or k in significant:
+            reduced[k] = dict(v)
+            continue
+
+        if k in values:
+            value = values[k]
+        elif v["type"] in [int, "int"]:
+            value = int(round((min(v["values"]) + max(v["values"])) / 2))
+        elif v["type"] in [float, "float"]:
+            value = (min(v["values"]) + max(v["values"])) / 2
+        else:
+            value = v["values"][(len(v["values"]) - 1) // 2]
+
+        reduced[k] = {"type": "constant", "values": [value]}
+
+    return reduced
+
+
+def saveReducedParameters (reduced, saveName):
+    """
+    Save a reduced parameters dictionary to simulationParameters/{saveName}.json so it can be used for the main study.
+    """
+
+    savePath = Path("simulationParameters", f"{saveName}.json")
+    with open (savePath, "w") as f:
+        json.dump(reduced, f, indent = 4)
+    log (f"Reduced parameters saved to {savePath}.")
+
+    return savePath
+
+
+def morrisScreening (ep_dir, baseline_idf_path, weather_file_path, parameters, r = 10, levels = 4, seed = None, threshold = 0.1, **kwargs):
+    """
+    Screen the parameters of a simulationParameters json file with a Morris design simulated in EnergyPlus.
+    Any other keyword arguments (eg. metrics, fidelity or max_concurrent) are passed to runLevel.
+
+    Returns a tuple of the combinations and their results, the Morris indices (see morrisIndices), and the reduced parameters (see reducedParameters).
+    """
+
+    combinations, design = morrisDesign(parameters, r = r, levels = levels, seed = seed)
+    log (f"Screening {len(design['names'])} parameters with {len(combinations)} simulations.")
+
+    results = runLevel(ep_dir, baseline_idf_path, weather_file_path, combinations, **kwargs)
+    results = results.drop(columns = ["time [s]"])
+
+    indices = morrisIndices(results, design)
+    reduced = reducedParameters(parameters, indices, threshold = threshold)
+
+    frozen = [k for k in parameters if reduced[k] != parameters[k]]
+    log (f"Froze {len(frozen)} insignificant parameters: {frozen}")
+
+    return combinations.join(results), indices, reduced
@@ -0,0 +1,338 @@
+import hashlib
+import json
+import multiprocessing
+import os
+from pathlib import Path
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+from src.instrumentation import log
+from src.runEnergyPlus import run_energyPlus
+from src.watchdog import SimulationProcess
+
+LEDGER_SCHEMA = """
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS items (
+    id TEXT PRIMARY KEY,
+    position INTEGER,
+    inputs TEXT,
+    status TEXT DEFAULT 'pending',
+    worker TEXT,
+    lease REAL,
+    attempts INTEGER DEFAULT 0,
+    returncode INTEGER,
+    reason TEXT,
+    results TEXT,
+    started REAL,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS items_status ON items (status, position);
+"""
+
+# The settings of a study which every worker uses to run its simulations
+STUDY_SETTINGS = ["baseline_idf_path", "weather_file_path", "backend", "tables", "metrics", "fidelity"]
+
+
+def designId (inputs):
+    """
+    Returns a stable ID for a set of inputs: a hash of the inputs, so the same design always has the same ID on every machine, whatever order the designs are in.
+    """
+
+    text = json.dumps({k: jsonValue(v) for k, v in inputs.items()}, sort_keys = True)
+    return hashlib.sha256(text.encode("UTF-8")).hexdigest()[:16]
+
+
+def jsonValue (value):
+    # numpy values (eg. from a combinations dataframe) are converted to the equivalent Python values
+    return value.item() if hasattr(value, "item") else value
+
+
+def inputRecords (inputs):
+    """
+    Returns a list of input dictionaries from a combinations dataframe, a list of input dictionaries, or the dictionary of arrays returned by Sampler.sample.
+    """
+
+    if hasattr(inputs, "to_dict"):
+        return inputs.to_dict("records")
+    if isinstance(inputs, dict):
+        # pandas is only needed to transpose the arrays of a sample, so it is only imported when it is used
+        import pandas as pd
+        return pd.DataFrame(inputs).to_dict("records")
+    return list(inputs)
+
+
+class StudyLedger:
+    """
+    The manifest of a study: a SQLite database in study_dir which records every design (work item) of the study and how far it has got.
+
+    Each item has a stable ID from designId, so items can be added again (eg. by running createStudy twice) without being duplicated.
+    An item is pending until a worker claims it. Claiming is a single transaction, so many worker processes (on one machine, or on several machines which share study_dir)
+    can take items from the same ledger without two of them running the same item.
+    A claimed item holds a lease which its worker renews while the simulation runs. If a worker crashes, its lease runs out and the item is claimed again by another worker.
+    An item which has been abandoned max_attempts times is marked as failed, so that a design which crashes its worker cannot stall the study.
+
+    SQLite relies on the file locks of the file system. These work on local disks and most shared file systems, but are unreliable on some NFS setups, so check with a small study first.
+    """
+
+    def __init__ (self, study_dir, timeout = 60):
+        self.study_dir = Path(study_dir)
+        self.path = Path(self.study_dir, "ledger.sqlite")
+        self.timeout = timeout
+
+        Path.mkdir(self.study_dir, parents = True, exist_ok = True)
+        with self.connect() as connection:
+            connection.executescript(LEDGER_SCHEMA)
+
+    def connect (self):
+        # Transactions are started explicitly, so that a claim can lock the ledger before it reads it
+        connection = sqlite3.connect(self.path, timeout = self.timeout, isolation_level = None)
+        return Connection(connection)
+
+    def settings (self):
+        with self.connect() as connection:
+            rows = connection.execute("SELECT key, value FROM settings").fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def addItems (self, inputs, settings):
+        """
+        Add designs to the study. Designs which are already in the study are ignored.
+        The settings of a study cannot be changed once it has been created.
+        Returns the list of the IDs of the designs, in order.
+        """
+
+        records = inputRecords(inputs)
+        ids = [designId(r) for r in records]
+
+        with self.connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                existing = {key: json.loads(value) for key, value in connection.execute("SELECT key, value FROM settings")}
+                if existing and existing != settings:
+                    raise Exception (f"The study in {self.study_dir} was created with different settings: {existing}")
+                if not existing:
+                    connection.executemany("INSERT INTO settings (key, value) VALUES (?, ?)", [(k, json.dumps(v)) for k, v in settings.items()])
+
+                start = connection.execute("SELECT COALESCE(MAX(position) + 1, 0) FROM items").fetchone()[0]
+                connection.executemany(
+                    "INSERT OR IGNORE INTO items (id, position, inputs) VALUES (?, ?, ?)",
+                    [(item, start + k, json.dumps({key: jsonValue(v) for key, v in r.items()})) for k, (item, r) in enumerate(zip(ids, records))],
+                )
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+
+        return ids
+
+    def claim (self, worker, lease = 120, max_attempts = 3):
+        """
+        Claim the next pending item (or an item whose lease has run out) for worker.
+        Returns a tuple of the item ID and its inputs, or None if there is nothing left to claim.
+        """
+
+        now = time.time()
+        with self.connect() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                # Items left behind by crashed workers which have already been tried too many times are given up on
+                connection.execute(
+                    "UPDATE items SET status = 'failed', reason = 'abandoned by ' || worker, finished = ? WHERE status = 'running' AND lease < ? AND attempts >= ?",
+                    (now, now, max_attempts),
+                )
+                row = connection.execute(
+                    "SELECT id, inputs FROM items WHERE status = 'pending' OR (status = 'running' AND lease < ?) ORDER BY position LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row is not None:
+                    connection.execute(
+                        "UPDATE items SET status = 'running', worker = ?, lease = ?, attempts = attempts + 1, started = ? WHERE id = ?",
+                        (worker, now + lease, now, row[0]),
+                    )
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def renew (self, item, worker, lease = 120):
+        with self.connect() as connection:
+            connection.execute("UPDATE items SET lease = ? WHERE id = ? AND worker = ? AND status = 'running'", (time.time() + lease, item, worker))
+
+    def complete (self, item, worker, retcode, hourlyResults = None, resilienceResults = None):
+        """
+        Record the result of an item. If another worker has already completed it (because this worker's lease ran out), the first result is kept.
+        """
+
+        results = None
+        if retcode.returncode == 0:
+            results = json.dumps({k: jsonValue(v) for k, v in {**(hourlyResults or {}), **(resilienceResults or {})}.items()})
+
+        with self.connect() as connection:
+            connection.execute(
+                "UPDATE items SET status = ?, worker = ?, returncode = ?, reason = ?, results = ?, finished = ? WHERE id = ? AND status NOT IN ('done', 'failed')",
+                ("done" if retcode.returncode == 0 else "failed", worker, retcode.returncode, getattr(retcode, "reason", None), results, time.time(), item),
+            )
+
+    def reset (self, status = ("failed",)):
+        """
+        Make the items with the given statuses pending again, eg. to retry the failed simulations after fixing the cause.
+        """
+
+        with self.connect() as connection:
+            connection.execute(
+                f"UPDATE items SET status = 'pending', worker = NULL, lease = NULL, attempts = 0 WHERE status IN ({','.join('?' * len(status))})",
+                tuple(status),
+            )
+
+    def progress (self):
+        """
+        Returns a dictionary of the number of items with each status.
+        """
+
+        with self.connect() as connection:
+            rows = connection.execute("SELECT status, COUNT(*) FROM items GROUP BY status").fetchall()
+        return dict(rows)
+
+    def results (self):
+        """
+        Returns a dataframe indexed by item ID with the status of every item, its inputs and its results.
+        """
+
+        with self.connect() as connection:
+            rows = connection.execute("SELECT id, status, worker, attempts, returncode, reason, started, finished, inputs, results FROM items ORDER BY position").fetchall()
+
+        # pandas is only needed for the results, so it is only imported when they are read
+        import pandas as pd
+
+        records = []
+        for item, status, worker, attempts, returncode, reason, started, finished, inputs, results in rows:
+            record = {"id": item, "status": status, "worker": worker, "attempts": attempts, "returncode": returncode, "reason": reason,
+                      "time [s]": finished - started if finished is not None and started is not None else None}
+            record.update(json.loads(inputs))
+            if results is not None:
+                record.update(json.loads(results))
+            records.append(record)
+
+        return pd.DataFrame(records).set_index("id") if records else pd.DataFrame(columns = ["status"]).rename_axis("id")
+
+
+class Connection:
+    # sqlite3 connections do not close themselves at the end of a with block, so this wrapper does
+    def __init__ (self, connection):
+        self.connection = connection
+
+    def __enter__ (self):
+        return self.connection
+
+    def __exit__ (self, *args):
+        self.connection.close()
+
+
+def createStudy (study_dir, inputs, baseline_idf_path, weather_file_path, backend = "csv", tables = True, metrics = None, fidelity = "full"):
+    """
+    Create a study in study_dir (or add designs to an existing one) from a combinations dataframe, a list of input dictionaries or the output of Sampler.sample.
+    The baseline idf, weather file and the way the simulations are run and read (see run_energyPlus) are saved with the study, so every worker runs them in the same way.
+    The paths must be valid on every machine which runs workers, eg. relative paths in a shared project folder.
+    Returns the StudyLedger of the study.
+    """
+
+    settings = {
+        "baseline_idf_path": str(baseline_idf_path),
+        "weather_file_path": str(weather_file_path),
+        "backend": backend,
+        "tables": tables,
+        "metrics": list(metrics) if metrics is not None else None,
+        "fidelity": fidelity,
+    }
+
+    ledger = StudyLedger(study_dir)
+    ids = ledger.addItems(inputs, settings)
+    log (f"The study in {study_dir} has {len(set(ids))} designs: {ledger.progress()}.")
+
+    return ledger
+
+
+def runWorker (study_dir, ep_dir, worker = None, max_items = None, lease = 120, max_attempts = 3, **kwargs):
+    """
+    Claim and run the items of a study one at a time with run_energyPlus until there are none left (or max_items have been run).
+    Start as many workers as there are processors on each machine, eg. with runLocalWorkers, or `python -m src worker` from a batch scheduler.
+
+    Each simulation is run in iterations/iteration_{id}, so workers on different machines never share a folder. Pass a Workspace to run them somewhere else.
+    While a simulation runs, its lease is renewed every lease / 3 seconds. lease should be much longer than the time it takes to renew it, but is not a limit on the simulation time
+    (use a Watchdog for that). A renewal which fails (eg. because the ledger is locked) is logged and tried again at the next interval.
+    If run_energyPlus raises an error, the item is marked as failed with the error as its reason, and the worker carries on. Any other keyword arguments (eg. cache, workspace, watchdog or instrumentation) are passed to run_energyPlus.
+    Returns the number of items which were run.
+    """
+
+    ledger = StudyLedger(study_dir)
+    settings = ledger.settings()
+    if not settings:
+        raise Exception (f"There is no study in {study_dir}. Create one with createStudy first.")
+    if worker is None:
+        worker = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+    n = 0
+    while max_items is None or n < max_items:
+        claimed = ledger.claim(worker, lease, max_attempts)
+        if claimed is None:
+            break
+        item, inputs = claimed
+
+        # Renew the lease on a thread while the simulation runs, so that the item is not claimed by another worker
+        stop = threading.Event()
+        def heartbeat ():
+            while not stop.wait(lease / 3):
+                try:
+                    ledger.renew(item, worker, lease)
+                except Exception as e:
+                    # eg. the ledger was locked by other workers for longer than its timeout. The lease has not run out yet, so keep trying.
+                    log (f"Worker {worker} could not renew its lease of item {item}: {e!r}")
+        thread = threading.Thread(target = heartbeat, daemon = True)
+        thread.start()
+
+        try:
+            retcode, hourlyResults, resilienceResults = run_energyPlus(
+                ep_dir, Path(settings["baseline_idf_path"]), Path(settings["weather_file_path"]), inputs, item,
+                backend = settings["backend"], tables = settings["tables"], metrics = settings["metrics"], fidelity = settings["fidelity"], **kwargs)
+        except Exception as e:
+            # eg. the idf could not be rendered. The item is failed rather than the worker, which carries on with the next item.
+            log (f"Error running item {item}: {e!r}")
+            retcode = SimulationProcess([], 1, reason = f"error: {e!r}", kind = "error")
+            hourlyResults, resilienceResults = None, None
+        finally:
+            stop.set()
+            thread.join()
+
+        ledger.complete(item, worker, retcode, hourlyResults, resilienceResults)
+        n += 1
+
+    log (f"Worker {worker} finished after {n} simulations: {ledger.progress()}.")
+
+    return n
+
+
+def runLocalWorkers (study_dir, ep_dir, n_workers = None, **kwargs):
+    """
+    Run a study with n_workers worker processes on this machine (the number of processors by default), and return the results dataframe of the study.
+    The keyword arguments are passed to runWorker. More workers can be started on other machines against the same study_dir at the same time.
+    """
+
+    if n_workers is None:
+        n_workers = os.cpu_count()
+
+    processes = [multiprocessing.Process(target = runWorker, args = (study_dir, ep_dir), kwargs = kwargs) for _ in range(n_workers)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join()
+
+    return StudyLedger(study_dir).results()
@@ -0,0 +1,273 @@
+import math
+import warnings
+
+import numpy as np
+import pandas as pd
+from pymoo.core.problem import Problem
+from pymoo.util.nds.non_dominated_sorting import NonDominatedSorting
+from sklearn.gaussian_process import GaussianProcessRegressor
+from sklearn.exceptions import ConvergenceWarning
+from sklearn.gaussian_process.kernels import ConstantKernel, Matern, WhiteKernel
+
+from src.instrumentation import log
+from src.scheduler import iterBatch
+
+
+class SurrogateModel:
+    """
+    A cheap approximation of EnergyPlus which is trained on every design evaluated so far.
+
+    A Gaussian process is fitted to each objective (eg. "heatingMax" and "SET > 30°C Degree-Hours [°C·hr]") over the parameter vector.
+    Gaussian processes predict both a value and its uncertainty, so the optimiser can choose between designs which look promising and designs the surrogate knows little about.
+
+    Training is incremental: each update adds the new designs and refits using the kernel hyperparameters learnt so far.
+    The hyperparameters themselves are only re-optimised every refit_every updates, as this is the expensive part of fitting a Gaussian process.
+
+    Before each update the surrogate predicts the new designs, so errorReport() shows how accurate it was against real EnergyPlus runs it had not seen.
+    """
+
+    def __init__ (self, parameterNames, objectives, xl, xu, refit_every = 5, seed = None):
+        self.parameterNames = list(parameterNames)
+        self.objectives = list(objectives)
+        self.xl = np.asarray(xl, dtype = float)
+        self.xu = np.asarray(xu, dtype = float)
+        self.refit_every = refit_every
+        self.seed = seed
+
+        self.X = np.empty((0, len(self.parameterNames)))
+        self.Y = np.empty((0, len(self.objectives)))
+        self.models = [None] * len(self.objectives)
+        self.updates = 0
+        self.errors = []
+
+    def scale (self, X):
+        # Gaussian processes work best when each parameter has the same range
+        span = np.where(self.xu > self.xl, self.xu - self.xl, 1)
+        return (np.asarray(X, dtype = float) - self.xl) / span
+
+    @property
+    def trained (self):
+        return all(model is not None for model in self.models)
+
+    def update (self, X, Y):
+        """
+        Add newly evaluated designs (X: n x n_var, Y: n x n_obj) and retrain the surrogate.
+        Designs with missing results (eg. failed simulations) are ignored.
+        """
+
+        X = np.atleast_2d(np.asarray(X, dtype = float))
+        Y = np.atleast_2d(np.asarray(Y, dtype = float))
+        valid = np.all(np.isfinite(Y), axis = 1)
+        X, Y = X[valid], Y[valid]
+        if len(X) == 0:
+            return
+
+        if self.trained:
+            self.recordErrors(X, Y)
+
+        self.X = np.vstack([self.X, X])
+        self.Y = np.vstack([self.Y, Y])
+
+        optimise = self.updates % self.refit_every == 0
+        for k in range(len(self.objectives)):
+            if self.models[k] is None:
+                kernel = ConstantKernel() * Matern(length_scale = np.ones(self.X.shape[1]), nu = 2.5) + WhiteKernel(noise_level = 1e-3)
+            else:
+                kernel = self.models[k].kernel_
+
+            model = GaussianProcessRegressor(
+                kernel = kernel,
+                normalize_y = True,
+                optimizer = "fmin_l_bfgs_b" if optimise else None,
+                random_state = self.seed,
+            )
+            # Parameters with no influence on an objective push their length scale to its bound, which is expected here
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", ConvergenceWarning)
+                model.fit(self.scale(self.X), self.Y[:, k])
+            self.models[k] = model
+
+        self.updates += 1
+
+    def predict (self, X):
+        """
+        Returns a tuple of the predicted mean and standard deviation of each objective for the designs X, each as an n x n_obj array.
+        """
+
+        if not self.trained:
+            raise Exception ("The surrogate model has not been trained yet.")
+
+        X = self.scale(np.atleast_2d(X))
+        mean = np.empty((len(X), len(self.objectives)))
+        std = np.empty((len(X), len(self.objectives)))
+        for k, model in enumerate(self.models):
+            mean[:, k], std[:, k] = model.predict(X, return_std = True)
+
+        return mean, std
+
+    def recordErrors (self, X, Y):
+        """
+        Compare the predictions for designs which have just been simulated with their actual results.
+        """
+
+        mean, std = self.predict(X)
+        for k, objective in enumerate(self.objectives):
+            error = mean[:, k] - Y[:, k]
+            relativeError = np.abs(error) / np.where(Y[:, k] != 0, np.abs(Y[:, k]), np.nan)
+            self.errors.append({
+                "update": self.updates,
+                "objective": objective,
+                "trainingSize": len(self.X),
+                "n": len(Y),
+                "meanAbsoluteError": np.mean(np.abs(error)),
+                "meanRelativeError [%]": np.nanmean(relativeError) * 100 if np.any(np.isfinite(relativeError)) else np.nan,
+                # The fraction of actual results within the 95% confidence interval. This should be close to 0.95 if the uncertainty is reliable.
+                "coverage95": np.mean(np.abs(error) <= 1.96 * std[:, k]),
+            })
+
+    def errorReport (self):
+        """
+        Returns a dataframe of the prediction errors of the surrogate against real runs, for each update and objective.
+        """
+
+        return pd.DataFrame(self.errors, columns = ["update", "objective", "trainingSize", "n", "meanAbsoluteError", "meanRelativeError [%]", "coverage95"])
+
+    def selectCandidates (self, X, n, exploration = 0.25):
+        """
+        Choose n of the designs X to be simulated with EnergyPlus.
+        Most are the designs with the best predicted objectives (ranked by their Pareto front), and a share set by exploration are the designs with the most uncertain predictions.
+
+        Returns a tuple of the indices of the chosen designs, and the predicted mean and standard deviation of every design.
+        """
+
+        mean, std = self.predict(X)
+        n = min(n, len(X))
+
+        n_uncertain = int(round(n * exploration))
+        n_promising = n - n_uncertain
+
+        fronts = NonDominatedSorting().do(mean)
+        ranking = np.concatenate(fronts)
+        chosen = list(ranking[:n_promising])
+
+        # Compare the uncertainty of each objective relative to the spread of its training data
+        spread = np.where(self.Y.std(axis = 0) > 0, self.Y.std(axis = 0), 1)
+        uncertainty = (std / spread).mean(axis = 1)
+        for i in np.argsort(-uncertainty):
+            if len(chosen) >= n:
+                break
+            if i not in chosen:
+                chosen.append(i)
+
+        return np.array(chosen, dtype = int), mean, std
+
+
+class SurrogateAssistedProblem(Problem):
+    """
+    A pymoo Problem which only sends some of the candidates in each generation to EnergyPlus.
+
+    evaluate is a function which takes an n x n_var array of designs and returns the n x n_obj array of their objectives, eg. the one returned by energyPlusEvaluator().
+    The first generation is always fully simulated to train the surrogate. In later generations only a fraction of the candidates are simulated,
+    chosen by SurrogateModel.selectCandidates, and the other candidates are given their predicted objectives.
+    Each individual is flagged with whether its objectives were predicted (the "predicted" attribute, eg. result.pop.get("predicted")),
+    so pymoo's result.X and result.F may include designs which were never simulated. Use front(result.pop) to get a front of simulated designs only.
+
+    Every simulated design is used to retrain the surrogate, so it improves as the optimisation goes on. See surrogate.errorReport() for its accuracy.
+    """
+
+    def __init__ (self, evaluate, parameters, objectives, fraction = 0.25, exploration = 0.25, min_samples = None, surrogate = None, seed = None):
+        self.parameterNames = list(parameters.keys())
+        xl = np.array([min(x["values"]) for x in parameters.values()])
+        xu = np.array([max(x["values"]) for x in parameters.values()])
+
+        super().__init__(n_var = len(parameters), n_obj = len(objectives), xl = xl, xu = xu)
+
+        self.simulate = evaluate
+        self.objectives = list(objectives)
+        self.fraction = fraction
+        self.exploration = exploration
+        # The surrogate needs a few designs for each parameter before its predictions are useful
+        self.min_samples = min_samples if min_samples is not None else 2 * len(parameters) + 1
+        self.surrogate = surrogate if surrogate is not None else SurrogateModel(self.parameterNames, self.objectives, xl, xu, seed = seed)
+
+        self.n_simulated = 0
+        self.n_predicted = 0
+
+    def _evaluate (self, x, out, *args, **kwargs):
+        if not self.surrogate.trained or len(self.surrogate.X) < self.min_samples:
+            chosen = np.arange(len(x))
+            F = np.full((len(x), self.n_obj), np.nan)
+        else:
+            n = max(1, math.ceil(self.fraction * len(x)))
+            chosen, F, _ = self.surrogate.selectCandidates(x, n, self.exploration)
+
+        F[chosen] = self.simulateDesigns(x[chosen])
+        predicted = np.ones(len(x), dtype = bool)
+        predicted[chosen] = False
+
+        self.n_simulated += len(chosen)
+        self.n_predicted += len(x) - len(chosen)
+        log (f"Simulated {len(chosen)} and predicted {len(x) - len(chosen)} designs ({self.n_simulated} simulations in total).")
+
+        # Failed simulations are given the worst possible objectives so that they are not selected
+        out["F"] = np.where(np.isfinite(F), F, np.inf)
+        out["predicted"] = predicted
+
+    def simulateDesigns (self, x):
+        """
+        Simulate the designs x, retrain the surrogate with them, and return their objectives (NaN for failed simulations).
+        """
+
+        simulated = np.asarray(self.simulate(x), dtype = float)
+        self.surrogate.update(x, simulated)
+        return simulated
+
+    def front (self, pop):
+        """
+        Returns a tuple of dataframes of the parameters and simulated objectives of the non-dominated designs of a population, eg. problem.front(minimize(problem, ...).pop).
+
+        Members of the front which were only predicted by the surrogate are simulated, and the front is found again with their simulated objectives.
+        This is repeated until every member of the front has been simulated, so no predicted objectives are ever reported as results.
+        """
+
+        X = pop.get("X")
+        F = np.array(pop.get("F"), dtype = float)
+        flags = pop.get("predicted")
+        predicted = np.array([bool(p) if p is not None else False for p in flags]) if flags is not None else np.zeros(len(X), dtype = bool)
+
+        while True:
+            feasible = np.flatnonzero(np.all(np.isfinite(F), axis = 1))
+            front = feasible[NonDominatedSorting().do(F[feasible], only_non_dominated_front = True)] if len(feasible) > 0 else feasible
+
+            unverified = front[predicted[front]]
+            if len(unverified) == 0:
+                break
+
+            simulated = self.simulateDesigns(X[unverified])
+            F[unverified] = np.where(np.isfinite(simulated), simulated, np.inf)
+            predicted[unverified] = False
+            self.n_simulated += len(unverified)
+            log (f"Simulated {len(unverified)} designs of the front which had only been predicted.")
+
+        return pd.DataFrame(X[front], columns = self.parameterNames), pd.DataFrame(F[front], columns = self.objectives)
+
+
+def energyPlusEvaluator (ep_dir, baseline_idf_path, weather_file_path, parameters, objectives, max_concurrent = None, **kwargs):
+    """
+    Returns a function which simulates an n x n_var array of designs with EnergyPlus and returns the n x n_obj array of the objectives.
+    Failed simulations have NaN objectives. Any other keyword arguments (eg. metrics or fidelity) are passed to iterBatch.
+    """
+
+    parameterNames = list(parameters.keys())
+
+    def evaluate (x):
+        inputs = pd.DataFrame(x, columns = parameterNames)
+        F = np.full((len(x), len(objectives)), np.nan)
+        for i, retcode, hourlyResults, resilienceResults in iterBatch(ep_dir, baseline_idf_path, weather_file_path, inputs, max_concurrent, **kwargs):
+            if retcode.returncode == 0:
+                results = {**hourlyResults, **resilienceResults}
+                F[i] = [results[o] for o in objectives]
+
+        return F
+
+    return evaluate
@@ -0,0 +1,273 @@
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.instrumentation import log
+from src.metrics import HOURLY_METRIC_DEFINITIONS, evaluateMetrics
+from src.processResults import HOURLY_COLUMNS, readHourlyColumns, readHourlySQLite, timestepMonths
+
+# The number of runs which are loaded into memory at a time by TimeseriesCube.reduce
+CHUNK_RUNS = 512
+
+
+class TimeseriesCube:
+    """
+    The hourly results of every run of a study, stored in one memory-mapped float32 array of shape (runs, timesteps, variables).
+
+    The cube is made up of three files:
+        {path}.npy: the array itself. It is created full size up front, and each run writes only its own slice, so many simulations (or processes) can fill it at once.
+        {path}.filled.npy: a boolean array of which runs have been written, as unwritten runs are left as zeros.
+        {path}.json: the names and column headers of the variables, the shape of the array, and the number of timesteps in each month.
+
+    Once a study has finished, new metrics can be calculated for every run as numpy reductions over the cube (see metrics, reduce, monthlySums, hoursAbove and peakWindow),
+    without reading any of the eplusout.csv files again. Only the parts of the array which are used are read from disk.
+
+    The variables are names in HOURLY_COLUMNS (see src/processResults.py), and must be written by the simulations, so do not pass metrics which leave them out of the idf.
+    Runs are stored by their iteration number, which must be less than n_runs. Runs with fewer timesteps than the cube (eg. the "sampled" fidelity level) are padded with NaN.
+    Runs whose results come from a ResultCache are written from the hourly values saved with the cache entry (see writeCached). Entries saved without a cube have none, so those runs are left unfilled.
+    """
+
+    def __init__ (self, path, mode = "r"):
+        self.path = Path(path)
+        self.mode = mode
+
+        with open (self.path.with_suffix(".json"), encoding = "UTF-8") as f:
+            self.metadata = json.load(f)
+        self.variables = self.metadata["variables"]
+
+        self._data = None
+        self._filled = None
+
+    @classmethod
+    def create (cls, path, n_runs, variables = None, n_timesteps = 8760, overwrite = False):
+        """
+        Create a new empty cube for n_runs runs of n_timesteps timesteps, and return it open for writing.
+        variables is a list of names in HOURLY_COLUMNS (all of them by default).
+        """
+
+        path = Path(path)
+        if variables is None:
+            variables = list(HOURLY_COLUMNS)
+        for v in variables:
+            if v not in HOURLY_COLUMNS:
+                raise Exception (f"Unsupported hourly variable: {v}. The supported variables are {list(HOURLY_COLUMNS)}")
+
+        if path.with_suffix(".npy").exists() and not overwrite:
+            raise Exception (f"The timeseries cube {path} already exists. Open it with TimeseriesCube({str(path)!r}, mode = 'r+') to add runs to it.")
+
+        Path.mkdir(path.parent, parents = True, exist_ok = True)
+
+        # The array is created as a sparse file, so no disk space is used until the runs are written
+        np.lib.format.open_memmap(path.with_suffix(".npy"), mode = "w+", dtype = np.float32, shape = (n_runs, n_timesteps, len(variables)))
+        np.lib.format.open_memmap(path.with_suffix(".filled.npy"), mode = "w+", dtype = np.bool_, shape = (n_runs,))
+
+        metadata = {
+            "variables": list(variables),
+            "headers": [HOURLY_COLUMNS[v] for v in variables],
+            "n_runs": n_runs,
+            "n_timesteps": n_timesteps,
+            "dtype": "float32",
+            "months": None,
+        }
+        with open (path.with_suffix(".json"), "w", encoding = "UTF-8") as f:
+            json.dump(metadata, f, indent = 4)
+
+        return cls(path, mode = "r+")
+
+    # The arrays are opened when they are first used, so a cube can be passed to pool workers (each one opens its own memory map)
+    def __getstate__ (self):
+        return {"path": self.path, "mode": self.mode}
+
+    def __setstate__ (self, state):
+        self.__init__(state["path"], state["mode"])
+
+    @property
+    def data (self):
+        if self._data is None:
+            self._data = np.load(self.path.with_suffix(".npy"), mmap_mode = self.mode)
+        return self._data
+
+    @property
+    def filled (self):
+        if self._filled is None:
+            self._filled = np.load(self.path.with_suffix(".filled.npy"), mmap_mode = self.mode)
+        return self._filled
+
+    @property
+    def shape (self):
+        return self.data.shape
+
+    def write (self, i, data, months = None):
+        """
+        Write the hourly values of run i. data is a dictionary of {variable: array}.
+        months is the month of each timestep, which is saved the first time it is given.
+        """
+
+        if self.mode == "r":
+            raise Exception ("The timeseries cube is open read-only. Open it with mode = 'r+' to write to it.")
+
+        n_timesteps = self.metadata["n_timesteps"]
+        values = np.column_stack([np.asarray(data[v], dtype = np.float32) for v in self.variables])
+        if len(values) > n_timesteps:
+            raise Exception (f"Run {i} has {len(values)} timesteps, but the timeseries cube only has space for {n_timesteps}.")
+
+        self.data[i, :len(values)] = values
+        self.data[i, len(values):] = np.nan
+        self.filled[i] = True
+
+        if months is not None and self.metadata["months"] is None and len(months) == n_timesteps:
+            # The timesteps are in order, so the months are saved as a list of [month, number of timesteps] to keep the metadata small
+            months = np.asarray(months)
+            starts = np.flatnonzero(np.r_[True, months[1:] != months[:-1]])
+            counts = np.diff(np.r_[starts, len(months)])
+            self.metadata["months"] = [[int(months[k]), int(n)] for k, n in zip(starts, counts)]
+            # Several processes may be writing runs, so write the metadata to a temporary file and move it into place
+            tmp_path = self.path.with_suffix(f".{os.getpid()}.json.tmp")
+            with open (tmp_path, "w", encoding = "UTF-8") as f:
+                json.dump(self.metadata, f, indent = 4)
+            os.replace(tmp_path, self.path.with_suffix(".json"))
+
+    def readIteration (self, output_path, backend = "csv"):
+        """
+        Returns a tuple of the hourly values of the cube's variables ({variable: array}) and the month of each timestep, from the results of a completed simulation.
+        """
+
+        columns = {v: HOURLY_COLUMNS[v] for v in self.variables}
+
+        if backend == "sqlite":
+            data = readHourlySQLite(Path(output_path, "eplusout.sql"), columns = columns)
+            months = data["Month"]
+        elif backend == "csv":
+            data = readHourlyColumns(Path(output_path, "eplusout.csv"), columns = columns, dates = True)
+            months = timestepMonths(data["Date/Time"])
+        else:
+            raise Exception (f"Unsupported results backend: {backend}")
+
+        return {v: data[v] for v in self.variables}, months
+
+    def writeIteration (self, i, output_path, backend = "csv"):
+        """
+        Read the hourly values of the cube's variables from the results of a completed simulation, and write them as run i.
+        Returns the tuple of the values and months which were written, so they can be saved with the cache entry of the simulation.
+        """
+
+        series = self.readIteration(output_path, backend)
+        self.write(i, *series)
+
+        return series
+
+    def writeCached (self, i, cache, key):
+        """
+        Write the hourly values saved with a ResultCache entry as run i.
+        Entries only have hourly values if their simulation was written to a cube (with the same variables). Otherwise run i is left unfilled and False is returned.
+        """
+
+        series = cache.getSeries(key)
+        if series is None or any(v not in series[0] for v in self.variables):
+            log (f"The cached results of iteration {i} have no hourly values, so it is not written to the timeseries cube.")
+            return False
+
+        self.write(i, *series)
+        return True
+
+    def flush (self):
+        if self._data is not None and self.mode != "r":
+            self._data.flush()
+            self._filled.flush()
+
+    def variable (self, name):
+        """
+        Returns a (runs, timesteps) view of one variable. The values are read from disk as they are used.
+        """
+
+        return self.data[:, :, self.variables.index(name)]
+
+    def reduce (self, name, function, runs = None):
+        """
+        Apply function to the (runs, timesteps) array of one variable in chunks of runs, and return the results for every run stacked together.
+        function must reduce along axis 1, eg. lambda x: x.sum(axis = 1). Runs which have not been written are NaN.
+        runs can be an array of the runs to include (all of them by default).
+        """
+
+        if runs is None:
+            runs = np.arange(self.shape[0])
+        runs = np.asarray(runs)
+
+        j = self.variables.index(name)
+        results = []
+        for start in range(0, len(runs), CHUNK_RUNS):
+            chunk = runs[start:start + CHUNK_RUNS]
+            # Reduce in float64, as float32 sums of a year of hourly values lose precision
+            values = np.asarray(self.data[chunk, :, j], dtype = np.float64)
+            result = np.asarray(function(values), dtype = np.float64)
+            result[~np.asarray(self.filled[chunk])] = np.nan
+            results.append(result)
+
+        return np.concatenate(results) if results else np.empty(0)
+
+    def months (self):
+        """
+        Returns the month of each timestep.
+        """
+
+        if self.metadata["months"] is None:
+            raise Exception ("The months of the timesteps are not known until a run with every timestep has been written.")
+        return np.repeat(*np.array(self.metadata["months"]).T)
+
+    def sums (self, name):
+        return self.reduce(name, lambda x: np.nansum(x, axis = 1))
+
+    def maxima (self, name):
+        return self.reduce(name, lambda x: np.nanmax(x, axis = 1))
+
+    def hoursAbove (self, name, threshold):
+        """
+        Returns the number of timesteps each run was above the threshold, eg. hoursAbove("operativeTemperature", 26).
+        """
+
+        return self.reduce(name, lambda x: (x > threshold).sum(axis = 1))
+
+    def monthlySums (self, name):
+        """
+        Returns a (runs, months) dataframe of the monthly sums of a variable.
+        """
+
+        months = self.months()
+        # The timesteps are in order, so each month is a contiguous block
+        starts = np.flatnonzero(np.r_[True, months[1:] != months[:-1]])
+        sums = self.reduce(name, lambda x: np.add.reduceat(np.nan_to_num(x), starts, axis = 1))
+
+        return pd.DataFrame(sums, columns = months[starts])
+
+    def peakWindow (self, name, hours = 168):
+        """
+        Returns the largest sum of a variable over any window of consecutive hours for each run, eg. the peak week heating load with hours = 168.
+        """
+
+        def windowMax (x):
+            cumulative = np.concatenate([np.zeros((len(x), 1)), np.nancumsum(x, axis = 1)], axis = 1)
+            return (cumulative[:, hours:] - cumulative[:, :-hours]).max(axis = 1)
+
+        return self.reduce(name, windowMax)
+
+    def metrics (self, definitions = None, occupied = None):
+        """
+        Calculate metrics for every run in the cube with evaluateMetrics (see src/metrics.py). Runs which have not been written are NaN.
+        Only the metrics whose columns are in the cube are calculated.
+        The monthly sums are skipped if the months of the timesteps are not known, eg. in a cube of "sampled" or "peak" fidelity runs, which do not cover the whole year.
+        """
+
+        if definitions is None:
+            definitions = HOURLY_METRIC_DEFINITIONS
+
+        months = self.months() if self.metadata["months"] is not None else None
+        if months is None:
+            definitions = {name: d for name, d in definitions.items() if d["reduction"] != "monthlySum"}
+
+        results = evaluateMetrics(self.data, self.variables, definitions, months = months, occupied = occupied)
+        results.loc[~np.asarray(self.filled)] = np.nan
+
+        return results
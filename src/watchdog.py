@@ -0,0 +1,365 @@
+import asyncio
+import os
+from pathlib import Path
+import re
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+from src.instrumentation import log
+
+# EnergyPlus writes its errors to eplusout.err. A fatal error always ends the simulation, so there is no point waiting for it to finish.
+FATAL_PATTERNS = [r"\*\*\s*Fatal\s*\*\*"]
+
+
+class SimulationProcess(subprocess.CompletedProcess):
+    """
+    The result of a supervised EnergyPlus simulation.
+    This behaves like the subprocess.CompletedProcess returned by subprocess.run, with extra information about the run.
+    As with EnergyPlus itself, the returncode of a failed simulation is always 1 (the notebooks check for this), and the actual exit code is kept in exitcode.
+        reason: None if the simulation succeeded, "cached" if its results were reused from a ResultCache (see src/cache.py), otherwise a description of why it failed,
+            eg. "timeout after 600 s" or "fatal: ** Fatal ** ..."
+        kind: None, "timeout", "fatal", "severe", "crash", "parse" (the results could not be read, see src/scheduler.py)
+            or "error" (an error was raised before or after the simulation, see runWorker in src/studyRunner.py)
+        attempts: the number of times the simulation was run
+        elapsed: the wall-clock time of the final attempt [s]
+        exitcode: the exit code of the EnergyPlus process, which is negative if it was stopped by a signal
+        spawn: the time taken to start the EnergyPlus process of the final attempt [s]
+        rusage: a dictionary of the resources used by the EnergyPlus process of the final attempt (see processUsage), or None on Windows
+    """
+
+    def __init__ (self, args, exitcode, reason = None, kind = None, attempts = 1, elapsed = None, spawn = None, rusage = None):
+        super().__init__(args, 0 if kind is None else 1)
+        self.exitcode = exitcode
+        self.reason = reason
+        self.kind = kind
+        self.attempts = attempts
+        self.elapsed = elapsed
+        self.spawn = spawn
+        self.rusage = rusage
+
+    def __repr__ (self):
+        return f"SimulationProcess(returncode={self.returncode}, exitcode={self.exitcode}, reason={self.reason!r}, attempts={self.attempts}, elapsed={self.elapsed})"
+
+
+class ErrFileMonitor:
+    """
+    Follows the eplusout.err file of a running simulation and reports the first line which matches any of the patterns.
+    Only the text added since the last check is read.
+    """
+
+    def __init__ (self, path, patterns):
+        self.path = Path(path)
+        self.patterns = [re.compile(p) for p in patterns]
+        self.offset = 0
+        self.remainder = ""
+
+    def check (self, final = False):
+        """
+        Returns the first new line matching one of the patterns, or None.
+        If final is True, the process has finished, so the last line is checked even if it does not end with a new line.
+        """
+
+        if not self.patterns:
+            return None
+
+        try:
+            with open (self.path, "r", encoding = "UTF-8", errors = "replace") as f:
+                f.seek(self.offset)
+                text = f.read()
+                self.offset = f.tell()
+        except FileNotFoundError:
+            return None
+
+        lines = (self.remainder + text).split("\n")
+        # The last line may still be being written
+        self.remainder = "" if final else lines.pop()
+
+        for line in lines:
+            for pattern in self.patterns:
+                if pattern.search(line):
+                    return line.strip()
+
+        return None
+
+
+class Watchdog:
+    """
+    Supervises EnergyPlus simulations.
+
+    While a simulation is running its eplusout.err file is followed, and the simulation is stopped as soon as a fatal error (or any of the severe_patterns) appears.
+    Each attempt is limited to timeout seconds of wall-clock time.
+    Failures of the kinds in retry_on are retried up to retries times. By default timeouts and crashes (a non-zero return code without a fatal error) are retried,
+    as these are usually caused by the machine rather than the idf. Fatal errors are not retried as the same idf will fail again.
+    """
+
+    def __init__ (self, timeout = None, retries = 0, severe_patterns = (), fatal_patterns = FATAL_PATTERNS, retry_on = ("timeout", "crash"), poll_interval = 0.5):
+        self.timeout = timeout
+        self.retries = retries
+        self.severe_patterns = list(severe_patterns)
+        self.fatal_patterns = list(fatal_patterns)
+        self.retry_on = list(retry_on)
+        self.poll_interval = poll_interval
+
+    def errPath (self, output_path):
+        return Path(output_path, "eplusout.err")
+
+    def prepare (self, output_path):
+        # Remove the error file of any previous attempt so that its messages are not picked up again
+        try:
+            self.errPath(output_path).unlink()
+        except FileNotFoundError:
+            pass
+
+        return ErrFileMonitor(self.errPath(output_path), self.fatal_patterns), ErrFileMonitor(self.errPath(output_path), self.severe_patterns)
+
+    def checkErrors (self, fatal, severe):
+        """
+        Returns a tuple of the kind and reason if a fatal or severe error has been written, otherwise (None, None)
+        """
+
+        line = fatal.check()
+        if line:
+            return "fatal", f"fatal: {line}"
+
+        line = severe.check()
+        if line:
+            return "severe", f"severe: {line}"
+
+        return None, None
+
+    def classify (self, returncode, kind, reason, fatal):
+        """
+        Determine why a simulation with a non-zero return code failed.
+        """
+
+        if kind is not None:
+            return kind, reason
+
+        # Check the error file one last time for a fatal error which was written just before EnergyPlus exited
+        line = fatal.check(final = True)
+        if line:
+            return "fatal", f"fatal: {line}"
+
+        return "crash", f"returncode {returncode}"
+
+    def run (self, ep_args, output_path):
+        """
+        Run EnergyPlus with the given list of arguments (see getEnergyPlusArgs) and supervise it.
+        Returns a SimulationProcess.
+        """
+
+        for attempt in range(1, self.retries + 2):
+            fatal, severe = self.prepare(output_path)
+
+            t0 = time.time()
+            process = startProcess(ep_args)
+            spawn = time.time() - t0
+
+            # The process is waited for on a thread, so that its resource usage can be collected when it exits
+            waiter = ProcessWaiter(process)
+
+            kind, reason = None, None
+            while not waiter.done.wait(self.poll_interval):
+                kind, reason = self.checkErrors(fatal, severe)
+                if kind is None and self.timeout is not None and time.time() - t0 > self.timeout:
+                    kind, reason = "timeout", f"timeout after {self.timeout} s"
+
+                if kind is not None:
+                    waiter.stop()
+                    waiter.done.wait()
+                    break
+
+            returncode, rusage = waiter.result
+            elapsed = time.time() - t0
+
+            if returncode == 0 and kind is None:
+                return SimulationProcess(ep_args, returncode, attempts = attempt, elapsed = elapsed, spawn = spawn, rusage = rusage)
+
+            kind, reason = self.classify(returncode, kind, reason, fatal)
+            if kind not in self.retry_on or attempt > self.retries:
+                return SimulationProcess(ep_args, returncode, reason = reason, kind = kind, attempts = attempt, elapsed = elapsed, spawn = spawn, rusage = rusage)
+
+            log (f"Retrying EnergyPlus simulation in {output_path} ({reason}).")
+
+    async def runAsync (self, ep_args, output_path):
+        """
+        The asyncio equivalent of run(), used by src/scheduler.py.
+        EnergyPlus is started with startProcess rather than asyncio.create_subprocess_exec, and its exit is passed back to the event loop by a ProcessWaiter (see there for why).
+        The event loop itself only wakes every poll_interval to check the error file and the time limit.
+        """
+
+        loop = asyncio.get_running_loop()
+
+        for attempt in range(1, self.retries + 2):
+            fatal, severe = self.prepare(output_path)
+
+            t0 = time.time()
+            process = startProcess(ep_args)
+            spawn = time.time() - t0
+
+            exited = loop.create_future()
+            waiter = ProcessWaiter(process, lambda result: notifyLoop(loop, exited, result))
+
+            kind, reason = None, None
+            try:
+                while True:
+                    try:
+                        returncode, rusage = await asyncio.wait_for(asyncio.shield(exited), self.poll_interval)
+                        break
+                    except asyncio.TimeoutError:
+                        pass
+
+                    kind, reason = self.checkErrors(fatal, severe)
+                    if kind is None and self.timeout is not None and time.time() - t0 > self.timeout:
+                        kind, reason = "timeout", f"timeout after {self.timeout} s"
+
+                    if kind is not None:
+                        waiter.stop()
+                        returncode, rusage = await exited
+                        break
+            except asyncio.CancelledError:
+                # The batch has been stopped, so EnergyPlus must not be left running
+                waiter.stop()
+                raise
+
+            elapsed = time.time() - t0
+
+            if returncode == 0 and kind is None:
+                return SimulationProcess(ep_args, returncode, attempts = attempt, elapsed = elapsed, spawn = spawn, rusage = rusage)
+
+            kind, reason = self.classify(returncode, kind, reason, fatal)
+            if kind not in self.retry_on or attempt > self.retries:
+                return SimulationProcess(ep_args, returncode, reason = reason, kind = kind, attempts = attempt, elapsed = elapsed, spawn = spawn, rusage = rusage)
+
+            log (f"Retrying EnergyPlus simulation in {output_path} ({reason}).")
+
+
+def notifyLoop (loop, future, result):
+    """
+    Set the result of a future from another thread.
+    The process may outlive the event loop which was waiting for it (eg. if the batch was stopped), in which case nothing is waiting for the result any more.
+    """
+
+    def setResult ():
+        if not future.done():
+            future.set_result(result)
+
+    try:
+        loop.call_soon_threadsafe(setResult)
+    except RuntimeError:
+        pass
+
+
+def startProcess (ep_args):
+    # Start EnergyPlus in its own process group (or console on Windows) so that it can be stopped cleanly
+    if os.name == "nt":
+        return subprocess.Popen(ep_args, stdout = subprocess.DEVNULL, stderr = subprocess.STDOUT, creationflags = subprocess.CREATE_NEW_PROCESS_GROUP)
+    else:
+        return subprocess.Popen(ep_args, stdout = subprocess.DEVNULL, stderr = subprocess.STDOUT, start_new_session = True)
+
+
+class ProcessWaiter:
+    """
+    Waits for a process to exit on a background thread.
+    Once it has, result is a tuple of its return code and resource usage (see processUsage), done is set, and callback (if given) is called with the result.
+    Use stop() rather than stopProcess to stop the process, so that it is never signalled after it has been reaped.
+
+    This is also how Watchdog.runAsync waits for EnergyPlus, instead of using asyncio's subprocesses.
+    asyncio reaps its subprocesses itself with os.waitpid, so the resource usage of the process (CPU time and peak memory, see processUsage) would be lost,
+    and getrusage(RUSAGE_CHILDREN) only gives the total of every simulation which has finished, which cannot be split between simulations running at the same time.
+    The cost is one thread for each running simulation. These threads spend their time blocked in os.waitid and only use a small stack,
+    so this is negligible next to the EnergyPlus processes themselves, even for hundreds of simulations at once.
+    """
+
+    def __init__ (self, process, callback = None):
+        self.process = process
+        self.callback = callback
+        self.result = None
+        self.done = threading.Event()
+        # Held while the process is reaped, so that stop() cannot signal its process ID once the ID is free to be reused
+        self.lock = threading.Lock()
+
+        threading.Thread(target = self.wait, daemon = True).start()
+
+    def wait (self):
+        self.result = waitForProcess(self.process, self.lock)
+        self.done.set()
+        if self.callback is not None:
+            self.callback(self.result)
+
+    def stop (self):
+        """
+        Stop the process (see stopProcess), unless it has already exited and been reaped.
+        """
+
+        with self.lock:
+            if self.process.returncode is None:
+                stopProcess(self.process)
+
+
+def waitForProcess (process, lock = None):
+    """
+    Wait for a process to exit and return a tuple of its return code and resource usage.
+    On Mac/Linux the resource usage of the process itself is collected with os.wait4. It is not available on Windows, so None is returned instead.
+    If a lock is given, it is held while the process is reaped and its returncode is set.
+    """
+
+    if not hasattr(os, "wait4"):
+        return process.wait(), None
+
+    if lock is None:
+        lock = threading.Lock()
+
+    # Wait for the process to exit without reaping it, so that its process ID is not reused until the lock is held
+    if hasattr(os, "waitid"):
+        try:
+            os.waitid(os.P_PID, process.pid, os.WEXITED | os.WNOWAIT)
+        except ChildProcessError:
+            pass
+
+    with lock:
+        try:
+            _, status, rusage = os.wait4(process.pid, 0)
+        except ChildProcessError:
+            # The process has already been waited for elsewhere
+            return process.wait(), None
+
+        process.returncode = os.waitstatus_to_exitcode(status)
+
+    return process.returncode, processUsage(rusage)
+
+
+def processUsage (rusage):
+    """
+    Returns a dictionary of the CPU time [s] and peak memory [MB] from a resource usage struct.
+    """
+
+    # ru_maxrss is in bytes on Mac and kilobytes on Linux
+    maxrss = rusage.ru_maxrss / (1024 * 1024) if sys.platform == "darwin" else rusage.ru_maxrss / 1024
+
+    return {
+        "userCPU [s]": rusage.ru_utime,
+        "systemCPU [s]": rusage.ru_stime,
+        "maxRSS [MB]": maxrss,
+        "majorPageFaults": rusage.ru_majflt,
+        "blockInputs": rusage.ru_inblock,
+        "blockOutputs": rusage.ru_oublock,
+    }
+
+
+def stopProcess (process):
+    """
+    Stop a running simulation along with any processes it has started (eg. ExpandObjects or ReadVarsESO).
+    The process must not have been reaped yet, as its process ID may since have been given to another process (see ProcessWaiter.stop).
+    """
+
+    try:
+        if os.name == "nt":
+            process.kill()
+        else:
+            os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
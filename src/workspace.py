@@ -0,0 +1,112 @@
+import fnmatch
+import os
+from pathlib import Path
+import shutil
+import socket
+import threading
+import zipfile
+
+# The simulations of one process can be finalized on several threads at once (see runBatch), so only one thread appends to its archive at a time
+archiveLock = threading.Lock()
+
+
+class Workspace:
+    """
+    Manages the folders which the simulations of a study are run in.
+
+    Each simulation is run in {scratch_root}/{study}/iteration_{i}. The scratch_root can be a fast temporary location such as /dev/shm (a RAM disk on Linux).
+    Using a study name keeps the iteration numbers of different studies from colliding.
+
+    Once the results of a simulation have been read, finalize(i) keeps only the files which match the keep patterns and deletes the rest.
+    The files which are kept are either moved to {results_root}/{study}/iteration_{i}, or if archive is True, added to a compressed archive in {results_root}/{study}.
+    Each process writes its own archive, archive-{host}-{pid}.zip, so workers never wait for each other or write to the same file. See archives.
+    """
+
+    def __init__ (self, study, scratch_root = Path("iterations"), results_root = Path("iterations"), keep = ("*.idf", "eplusout.err"), archive = False):
+        self.study = study
+        self.scratch_root = Path(scratch_root)
+        self.results_root = Path(results_root)
+        self.keep = list(keep)
+        self.archive = archive
+
+        self.scratch_path = Path(self.scratch_root, study)
+        self.results_path = Path(self.results_root, study)
+
+    def runPath (self, i):
+        """
+        Create and return the folder which simulation i will be run in.
+        """
+
+        path = Path(self.scratch_path, f"iteration_{i}")
+        Path.mkdir(path, parents = True, exist_ok = True)
+
+        return path
+
+    def archivePath (self):
+        """
+        Returns the archive which this process adds the kept files to.
+        """
+
+        # The process ID is looked up each time, as the workspace can be passed to other processes (eg. with pool.starmap)
+        return Path(self.results_path, f"archive-{socket.gethostname()}-{os.getpid()}.zip")
+
+    def archives (self):
+        """
+        Returns a sorted list of the archives written by every process of the study.
+        """
+
+        return sorted(self.results_path.glob("archive-*.zip"))
+
+    def keptFiles (self, i):
+        """
+        Returns the files in the folder of simulation i which match the keep patterns.
+        """
+
+        path = Path(self.scratch_path, f"iteration_{i}")
+        return [f for f in sorted(path.iterdir()) if f.is_file() and any(fnmatch.fnmatch(f.name, p) for p in self.keep)]
+
+    def finalize (self, i):
+        """
+        Keep only the whitelisted files of simulation i, either by moving them to the results folder or adding them to the study archive, and delete everything else.
+        """
+
+        path = Path(self.scratch_path, f"iteration_{i}")
+        if not path.exists():
+            return
+
+        files = self.keptFiles(i)
+
+        if self.archive:
+            if files:
+                Path.mkdir(self.results_path, parents = True, exist_ok = True)
+                with archiveLock:
+                    with zipfile.ZipFile(self.archivePath(), "a", compression = zipfile.ZIP_DEFLATED) as z:
+                        for f in files:
+                            z.write(f, arcname = f"iteration_{i}/{f.name}")
+            shutil.rmtree(path, ignore_errors = True)
+
+        elif self.scratch_path.resolve() == self.results_path.resolve():
+            # The simulation was run in the results folder, so just delete the files which are not kept.
+            kept = set(files)
+            for f in path.iterdir():
+                if f not in kept:
+                    if f.is_dir():
+                        shutil.rmtree(f, ignore_errors = True)
+                    else:
+                        f.unlink()
+
+        else:
+            destination = Path(self.results_path, f"iteration_{i}")
+            Path.mkdir(destination, parents = True, exist_ok = True)
+            for f in files:
+                shutil.move(str(f), str(Path(destination, f.name)))
+            shutil.rmtree(path, ignore_errors = True)
+
+    def cleanup (self):
+        """
+        Delete the scratch folder of the study, including any simulations which have not been finalized.
+        """
+
+        if self.scratch_path.resolve() != self.results_path.resolve():
+            shutil.rmtree(self.scratch_path, ignore_errors = True)
+
@@ -0,0 +1,43 @@
+import json
+from pathlib import Path
+import sys
+
+import pytest
+
+# The tests import the src and benchmarks packages from the root of the repository
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from benchmarks.fakeEnergyPlus import installFakeEnergyPlus
+
+BASELINE_IDF = Path(ROOT, "idfs", "1-storey_baseline.idf")
+WEATHER_FILE = Path(ROOT, "weatherData", "GBR_ENG_London.Wea.Ctr-St.James.Park.037700_TMYx.2009-2023.epw")
+PARAMETERS_FILE = Path(ROOT, "simulationParameters", "Exercise 0.json")
+
+
+@pytest.fixture
+def parameters ():
+    with open (PARAMETERS_FILE) as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def inputs (parameters):
+    """
+    A design with the first value of every parameter of Exercise 0, so that every placeholder of the baseline idf is filled.
+    """
+
+    return {name: parameter["values"][0] for name, parameter in parameters.items()}
+
+
+@pytest.fixture
+def ep_dir (tmp_path, monkeypatch):
+    """
+    The fake EnergyPlus of benchmarks/fakeEnergyPlus.py, with the simulations run in a temporary folder rather than in iterations/.
+    """
+
+    monkeypatch.setenv("FAKE_ENERGYPLUS_SLEEP", "0")
+    monkeypatch.chdir(tmp_path)
+    Path.mkdir(Path(tmp_path, "iterations"))
+    return installFakeEnergyPlus(Path(tmp_path, "EnergyPlus"))
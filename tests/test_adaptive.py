@@ -0,0 +1,14 @@
+from conftest import BASELINE_IDF, WEATHER_FILE
+
+from src.adaptive import adaptiveMonteCarlo
+
+
+def test_simulator_kwargs_reach_the_simulations (ep_dir, parameters):
+    results, trace = adaptiveMonteCarlo(
+        ep_dir, BASELINE_IDF, WEATHER_FILE, parameters, {"heatingMax": 0.5}, seed = 1,
+        simulator_kwargs = {"metrics": ["heatingMax"], "max_concurrent": 2}, batch_size = 4, min_samples = 4, max_samples = 4)
+
+    assert len(results) == 4
+    # Only the selected metric is calculated
+    assert "heatingMax" in results.columns and "heatingSum" not in results.columns
+    assert set(trace["output"]) == {"heatingMax"}
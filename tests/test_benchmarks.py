@@ -0,0 +1,39 @@
+import json
+from pathlib import Path
+
+from benchmarks import runBenchmarks
+
+TINY = {
+    "repeats": 1,
+    "renders": 2,
+    "timesteps": [48],
+    "samples": [10],
+    "generations": 2,
+    "population": 4,
+    "poolItems": 10,
+    "simulations": 2,
+    "simulationTime": 0,
+}
+
+
+def test_every_benchmark_runs_and_is_compared_with_a_baseline (tmp_path, monkeypatch):
+    monkeypatch.setitem(runBenchmarks.SIZES, "tiny", TINY)
+    # The dispatch benchmark sets the time the fake EnergyPlus takes in the environment
+    monkeypatch.setenv("FAKE_ENERGYPLUS_SLEEP", "0")
+    output = Path(tmp_path, "latest.json")
+
+    assert runBenchmarks.main(["--size", "tiny", "--output", str(output)]) == 0
+    with open (output) as f:
+        results = json.load(f)
+    assert results["metadata"]["size"] == "tiny"
+    assert {name.split(".")[0] for name in results["benchmarks"]} == set(runBenchmarks.BENCHMARKS)
+    assert all(result["median"] >= 0 for result in results["benchmarks"].values())
+
+    # A baseline which was much faster is reported as a regression
+    baseline = {"metadata": results["metadata"], "benchmarks": {name: {**result, "median": result["median"] / 10} for name, result in results["benchmarks"].items()}}
+    comparison = runBenchmarks.compareBenchmarks(results, baseline)
+    assert len(comparison) == len(results["benchmarks"])
+    assert comparison.loc[comparison["current [ms]"] > 0, "regression"].all()
+
+    Path(tmp_path, "baseline.json").write_text(json.dumps(baseline))
+    assert runBenchmarks.main(["--size", "tiny", "--filter", "idf", "--baseline", str(Path(tmp_path, "baseline.json"))]) == 1
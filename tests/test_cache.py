@@ -0,0 +1,60 @@
+from pathlib import Path
+
+from conftest import BASELINE_IDF, WEATHER_FILE
+
+from src.cache import ResultCache
+from src.idf import renderIDF
+from src.runEnergyPlus import run_energyPlus
+
+
+def test_keys_separate_every_input (tmp_path):
+    cache = ResultCache(tmp_path)
+    other_weather_file = Path(tmp_path, "other.epw")
+    other_weather_file.write_text("a different weather file")
+
+    key = cache.key("idf", WEATHER_FILE, "25.1.0")
+    assert cache.key("idf", WEATHER_FILE, "25.1.0") == key
+    assert cache.key("another idf", WEATHER_FILE, "25.1.0") != key
+    assert cache.key("idf", other_weather_file, "25.1.0") != key
+    assert cache.key("idf", WEATHER_FILE, "24.2.0") != key
+
+
+def test_cached_runs_return_the_same_results (ep_dir, inputs, tmp_path):
+    cache = ResultCache(Path(tmp_path, "cache"))
+
+    first = run_energyPlus(ep_dir, BASELINE_IDF, WEATHER_FILE, inputs, 0, cache = cache)
+    second = run_energyPlus(ep_dir, BASELINE_IDF, WEATHER_FILE, inputs, 1, cache = cache)
+    assert getattr(first[0], "reason", None) != "cached"
+    assert second[0].returncode == 0 and second[0].reason == "cached"
+    assert second[1:] == first[1:]
+
+
+def test_keys_separate_the_selected_metrics (tmp_path):
+    cache = ResultCache(tmp_path)
+
+    allMetrics = cache.key("idf", WEATHER_FILE, "25.1.0")
+    heating = cache.key("idf", WEATHER_FILE, "25.1.0", ["heatingSum", "heatingMax"])
+    assert heating != allMetrics
+    assert cache.key("idf", WEATHER_FILE, "25.1.0", ["heatingMax"]) != heating
+    # The order the metrics are given in does not matter
+    assert cache.key("idf", WEATHER_FILE, "25.1.0", ["heatingMax", "heatingSum"]) == heating
+
+
+def test_cached_runs_return_the_results_of_their_own_metrics (ep_dir, inputs, tmp_path):
+    cache = ResultCache(Path(tmp_path, "cache"))
+
+    first = run_energyPlus(ep_dir, BASELINE_IDF, WEATHER_FILE, inputs, 0, cache = cache, metrics = ["heatingSum"])
+    assert list(first[1]) == ["heatingSum"]
+
+    # Asking for another metric runs the simulation again rather than returning the heatingSum results
+    second = run_energyPlus(ep_dir, BASELINE_IDF, WEATHER_FILE, inputs, 1, cache = cache, metrics = ["heatingMax"])
+    assert getattr(second[0], "reason", None) != "cached"
+    assert list(second[1]) == ["heatingMax"]
+
+
+def test_selected_metrics_prune_the_other_outputs (inputs):
+    contents = renderIDF(BASELINE_IDF, inputs, metrics = ["heatingSum"])
+
+    assert "Zone Ideal Loads Supply Air Total Heating Energy" in contents
+    assert "Zone Ideal Loads Supply Air Total Cooling Energy" not in contents
+    assert "Zone Operative Temperature" not in contents
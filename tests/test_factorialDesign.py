@@ -0,0 +1,32 @@
+import itertools
+
+import pandas as pd
+import pytest
+
+from src.sampling import FactorialDesign
+
+PARAMETERS = {
+    "width": {"type": "int", "values": [5, 10, 15]},
+    "g_value": {"type": "float", "values": [0.3, 0.6]},
+    "construction": {"type": "categorical", "values": ["light", "medium", "heavy", "very heavy"]},
+    "coolingSetpoint": {"type": "constant", "values": [26]},
+}
+
+
+def test_shards_cover_the_design_in_product_order ():
+    design = FactorialDesign(PARAMETERS)
+    full = design.toDataFrame()
+
+    expected = pd.DataFrame(itertools.product(*(v["values"] for v in PARAMETERS.values())), columns = list(PARAMETERS))
+    assert len(design) == 24
+    pd.testing.assert_frame_equal(full, expected, check_index_type = False)
+
+    # The shards are contiguous, differ in size by at most one, and their chunks join up to the whole design
+    shards = [pd.concat(design.shard(k, 5, chunk_size = 2)) for k in range(5)]
+    assert sorted(len(shard) for shard in shards) == [4, 5, 5, 5, 5]
+    pd.testing.assert_frame_equal(pd.concat(shards), full)
+
+    for i in [0, 7, 23, -1]:
+        assert design.combination(i) == full.iloc[i].to_dict()
+    with pytest.raises(IndexError):
+        design.combination(24)
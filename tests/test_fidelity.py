@@ -0,0 +1,28 @@
+from conftest import BASELINE_IDF, WEATHER_FILE
+
+from src.fidelity import compareFidelity, runLevel, screenAndPromote
+from src.sampling import Sampler
+
+
+def test_the_best_screened_designs_are_promoted (ep_dir, parameters):
+    combinations = Sampler(parameters, seed = 1).sampleDataFrame(10)
+
+    screening, full = screenAndPromote(ep_dir, BASELINE_IDF, WEATHER_FILE, combinations, "heatingMax", fraction = 0.3, metrics = ["heatingMax", "coolingMax"], max_concurrent = 2)
+
+    assert list(screening.index) == list(combinations.index)
+    promoted = screening.index[screening["promoted"]]
+    assert sorted(promoted) == sorted(screening["heatingMax"].nsmallest(3).index)
+    assert sorted(full.index) == sorted(promoted)
+    assert full["heatingMax"].notna().all()
+
+
+def test_every_level_is_compared_with_the_full_results (ep_dir, parameters):
+    combinations = Sampler(parameters, seed = 2).sampleDataFrame(4)
+    full = runLevel(ep_dir, BASELINE_IDF, WEATHER_FILE, combinations, metrics = ["heatingMax", "heatingSum"], max_concurrent = 2)
+
+    report, results = compareFidelity(ep_dir, BASELINE_IDF, WEATHER_FILE, combinations, levels = ("coarse", "peak"), metrics = ["heatingMax", "heatingSum"], max_concurrent = 2, full = full)
+
+    assert results["full"] is full
+    # The peak level only calculates the peak metrics
+    assert list(zip(report["level"], report["metric"])) == [("coarse", "heatingMax"), ("coarse", "heatingSum"), ("peak", "heatingMax")]
+    assert (report["speedUp"] > 0).all()
@@ -0,0 +1,66 @@
+import hashlib
+from pathlib import Path
+
+from conftest import BASELINE_IDF
+
+from src import idf
+from src.idf import IDFTemplate, modifyIDF, placeholderValues, renderIDF
+from src.instrumentation import setVerbose
+
+# The sha256 of the idf written for each design by the original modifyIDF, which replaced the placeholders one key at a time
+DESIGNS = [
+    ({"coolingSetpoint": 99, "length": 10, "width": 5, "height": 3, "u_windows": 1.0, "g_value": 0.3, "wwr": 0.01, "ach_50": 1, "ventilationRate": 0,
+      "slabInsulationThickness": 0.0001, "wallInsulationThickness": 0.0001, "roofInsulationThickness": 0.0001, "fixedShadingDepth": 0, "roofAbsorptance": 0.3},
+     "e851264372fadc05c8c71eb5e8795ad95dccfb0a87aa7c5e2fe1c1581b6591e7"),
+    ({"coolingSetpoint": 26, "length": 12.5, "width": 8, "height": 3.4, "u_windows": 2.8, "g_value": 0.62, "wwr": 0.45, "ach_50": 7.5, "ventilationRate": 0.01,
+      "slabInsulationThickness": 0.1, "wallInsulationThickness": 0.15, "roofInsulationThickness": 0.3, "fixedShadingDepth": 0.75, "roofAbsorptance": 0.7},
+     "f819b69dc0d6598188a11037110f26fd90dd71948c2b2e6301b2c5036f16b8c5"),
+]
+
+
+def sha256 (contents):
+    return hashlib.sha256(contents.encode("UTF-8")).hexdigest()
+
+
+def test_render_matches_the_original_modifyIDF ():
+    for inputs, expected in DESIGNS:
+        assert sha256(renderIDF(BASELINE_IDF, inputs)) == expected
+
+
+def test_modifyIDF_writes_the_rendered_idf (tmp_path):
+    for k, (inputs, expected) in enumerate(DESIGNS):
+        new_idf_path = Path(tmp_path, f"iteration_{k}.idf")
+        modifyIDF(BASELINE_IDF, new_idf_path, inputs)
+        assert sha256(new_idf_path.read_text()) == expected
+
+
+def test_template_reports_unfilled_placeholders ():
+    template = IDFTemplate.fromFile(BASELINE_IDF)
+    inputs = dict(DESIGNS[0][0])
+    del inputs["g_value"]
+
+    assert "g_value" in template.placeholders
+    assert "@g_value@" in template.render(inputs)
+    assert template.validate(inputs)["unfilled"] == ["g_value"]
+
+
+def test_placeholder_values_are_calculated_once_per_render (monkeypatch):
+    calls = []
+    monkeypatch.setattr(idf, "placeholderValues", lambda inputs: calls.append(inputs) or placeholderValues(inputs))
+
+    renderIDF(BASELINE_IDF, DESIGNS[0][0])
+    assert len(calls) == 1
+
+
+def test_warnings_follow_setVerbose (capsys):
+    inputs = {**DESIGNS[0][0], "misspelled": 1}
+
+    renderIDF(BASELINE_IDF, inputs)
+    assert "misspelled" in capsys.readouterr().out
+
+    setVerbose(False)
+    try:
+        renderIDF(BASELINE_IDF, inputs)
+    finally:
+        setVerbose(True)
+    assert capsys.readouterr().out == ""
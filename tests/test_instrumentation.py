@@ -0,0 +1,44 @@
+from pathlib import Path
+
+import pytest
+
+from conftest import BASELINE_IDF, WEATHER_FILE
+
+from src.instrumentation import PHASES, Instrumentation, setVerbose
+from src.runEnergyPlus import run_energyPlus
+from src.runEnergyPlus6A import run_energyPlus_6A
+from src.sampling import fullFactorialSampling
+from src.scheduler import iterBatch
+
+
+@pytest.fixture
+def quiet ():
+    setVerbose(False)
+    yield
+    setVerbose(True)
+
+
+def test_batch_records_every_phase (ep_dir, inputs, tmp_path):
+    instrumentation = Instrumentation(Path(tmp_path, "runs.jsonl"))
+    for _ in iterBatch(ep_dir, BASELINE_IDF, WEATHER_FILE, [inputs] * 4, max_concurrent = 2, instrumentation = instrumentation):
+        pass
+
+    records = instrumentation.records()
+    assert sorted(records["i"]) == [0, 1, 2, 3]
+    assert set(PHASES) - {"finalize"} <= set(records.columns)
+    assert (records["returncode"] == 0).all()
+    # The resource usage of each EnergyPlus process is collected by its waiter thread
+    assert (records["maxRSS [MB]"] > 0).all()
+
+    summary, slowest = instrumentation.summary(n_slowest = 2)
+    assert summary["runs"] == 4 and summary["failed"] == 0
+    assert summary["workers"] <= 2
+    assert len(slowest) == 2
+
+
+def test_progress_messages_can_be_turned_off (ep_dir, inputs, quiet, capsys):
+    run_energyPlus(ep_dir, BASELINE_IDF, WEATHER_FILE, inputs, 0)
+    run_energyPlus_6A(ep_dir, BASELINE_IDF, WEATHER_FILE, 0.1, 1)
+    fullFactorialSampling({"width": {"type": "categorical", "values": [5, 10]}, "length": {"type": "constant", "values": [10]}})
+
+    assert capsys.readouterr().out == ""
@@ -0,0 +1,22 @@
+import numpy as np
+
+from src.sampling import LatinHypercube
+
+
+def test_maximin_latin_hypercube_stays_latin (parameters):
+    lhs = LatinHypercube(parameters, seed = 1)
+    lhs.generate(2000)
+
+    # Every interval of every column still holds exactly one point after the swaps
+    strata = np.sort((lhs.unit * 2000).astype(int), axis = 0)
+    np.testing.assert_array_equal(strata, np.broadcast_to(np.arange(2000)[:, None], strata.shape))
+
+
+def test_maximin_only_keeps_designs_which_are_better_spread (parameters):
+    for seed in range(3):
+        lhs = LatinHypercube(parameters, seed = seed)
+        lhs.generate(500, criterion = None)
+        start = lhs.unit.copy()
+
+        optimised = lhs.optimise(start, iterations = 5000)
+        assert LatinHypercube.minDistance(optimised) > LatinHypercube.minDistance(start)
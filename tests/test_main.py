@@ -0,0 +1,12 @@
+from src.__main__ import sampleCombinations
+
+
+def test_statistical_sampling_of_a_parameters_file (parameters):
+    combinations = sampleCombinations(parameters, "statistical", 50, seed = 1)
+
+    assert list(combinations.columns) == list(parameters)
+    assert len(combinations) == 50
+    for name, parameter in parameters.items():
+        assert combinations[name].min() >= min(parameter["values"]) and combinations[name].max() <= max(parameter["values"]), name
+        if parameter["type"] == "int":
+            assert (combinations[name] == combinations[name].round()).all(), name
@@ -0,0 +1,26 @@
+import numpy as np
+from pymoo.util.nds.non_dominated_sorting import NonDominatedSorting
+
+from conftest import BASELINE_IDF, WEATHER_FILE
+
+from src.optimisation import OBJECTIVES, SteadyStateNSGA2
+
+
+def test_steady_state_optimisation_keeps_the_best_designs (ep_dir, parameters):
+    optimiser = SteadyStateNSGA2(ep_dir, BASELINE_IDF, WEATHER_FILE, parameters, pop_size = 6, max_concurrent = 2, seed = 1)
+    X, F, history = optimiser.run(max_evaluations = 14)
+
+    assert len(history) == 14 and sorted(history["i"]) == list(range(14))
+    assert (history["returncode"] == 0).all()
+    assert list(history["generation"]) == [k // 6 for k in range(14)]
+    # The designs after the initial sample are bred from the results which came back before them
+    assert history["proposedAfter"].iloc[-1] >= 2
+
+    for name, parameter in parameters.items():
+        assert history[name].between(min(parameter["values"]), max(parameter["values"])).all(), name
+
+    # The designs returned are the non-dominated designs of the population
+    assert list(X.columns) == list(parameters) and list(F.columns) == OBJECTIVES
+    assert 0 < len(F) <= 6
+    assert len(NonDominatedSorting().do(F.to_numpy(), only_non_dominated_front = True)) == len(F)
+    assert np.isin(F["heatingMax"], history["heatingMax"]).all()
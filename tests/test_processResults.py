@@ -0,0 +1,54 @@
+from pathlib import Path
+
+from conftest import BASELINE_IDF, WEATHER_FILE
+
+from benchmarks.fakeEnergyPlus import writeSyntheticOutputs
+from src.metrics import HOURLY_METRIC_DEFINITIONS, evaluateIterations
+from src.processResults import processHourlyResults
+from src.runEnergyPlus import processIteration, run_energyPlus
+
+
+def test_sqlite_and_csv_backends_match (ep_dir, inputs):
+    # With Output:SQLite turned on, the fake EnergyPlus writes the same results to eplusout.csv, eplustbl.csv and eplusout.sql,
+    # using the tables and report names of EnergyPlus (eg. AnnualThermalResilienceSummary)
+    retcode, _, _ = run_energyPlus(ep_dir, BASELINE_IDF, WEATHER_FILE, inputs, 0, backend = "sqlite")
+    assert retcode.returncode == 0
+
+    output_path = Path("iterations", "iteration_0")
+    csvHourly, csvResilience = processIteration(output_path, backend = "csv")
+    sqliteHourly, sqliteResilience = processIteration(output_path, backend = "sqlite")
+
+    assert sqliteResilience == csvResilience
+    assert sqliteHourly.keys() == csvHourly.keys()
+    for name, value in csvHourly.items():
+        assert abs(sqliteHourly[name] - value) <= 1e-9 * abs(value), name
+
+
+def test_every_hourly_metric_can_be_requested (ep_dir, inputs):
+    metrics = ["monthlyHeatingSum", "occupiedTemperature>26C", "heatingMax"]
+    retcode, hourlyResults, resilienceResults = run_energyPlus(ep_dir, BASELINE_IDF, WEATHER_FILE, inputs, 0, backend = "sqlite", metrics = metrics)
+    assert retcode.returncode == 0
+    assert resilienceResults == {}
+
+    monthly = [f"monthlyHeatingSum[{month}]" for month in range(1, 13)]
+    assert list(hourlyResults) == monthly + ["occupiedTemperature>26C", "heatingMax"]
+    assert hourlyResults["heatingMax"] * 3600 <= sum(hourlyResults[m] for m in monthly)
+
+    # The csv backend reads the same results from the same simulation
+    csvHourly, _ = processIteration(Path("iterations", "iteration_0"), backend = "csv", metrics = metrics)
+    assert csvHourly.keys() == hourlyResults.keys()
+    for name, value in hourlyResults.items():
+        assert abs(csvHourly[name] - value) <= 1e-9 * abs(value), name
+    assert isinstance(csvHourly["occupiedTemperature>26C"], int)
+
+
+def test_single_run_metrics_match_the_batch_evaluation (tmp_path):
+    writeSyntheticOutputs(tmp_path, seed = 1)
+
+    # Every metric, including the monthly sums and the occupied hours
+    hourlyResults = processHourlyResults(Path(tmp_path, "eplusout.csv"), metrics = list(HOURLY_METRIC_DEFINITIONS))
+    batch = evaluateIterations([tmp_path]).iloc[0]
+
+    assert hourlyResults.keys() == set(batch.index)
+    for name, value in hourlyResults.items():
+        assert abs(batch[name] - value) <= 1e-12 * abs(value), name
@@ -0,0 +1,34 @@
+from pathlib import Path
+
+from conftest import BASELINE_IDF, WEATHER_FILE
+
+from src.resultsStore import ResultsStore
+from src.sampling import Sampler
+from src.scheduler import iterBatch
+from src.watchdog import SimulationProcess
+
+
+def test_an_interrupted_study_resumes_where_it_stopped (ep_dir, parameters):
+    combinations = Sampler(parameters, seed = 1).sampleDataFrame(8)
+    store = ResultsStore(Path("results"), flush_every = 2)
+
+    # Stop the study after three simulations, and record a failed simulation, which is run again on resuming
+    first = []
+    for i, retcode, hourlyResults, resilienceResults in iterBatch(ep_dir, BASELINE_IDF, WEATHER_FILE, combinations.iloc[:6], max_concurrent = 1, metrics = ["heatingMax"], store = store):
+        first.append(i)
+        if len(first) == 3:
+            break
+    store.append(7, combinations.loc[7].to_dict(), SimulationProcess([], 1, reason = "fatal", kind = "fatal"))
+    store.flush()
+
+    assert store.completedIndices() == set(first)
+    assert store.completedIndices(successful = False) == set(first) | {7}
+
+    resumed = [i for i, *_ in iterBatch(ep_dir, BASELINE_IDF, WEATHER_FILE, combinations, max_concurrent = 2, metrics = ["heatingMax"], store = ResultsStore(Path("results")))]
+    assert sorted(resumed) == sorted(set(range(8)) - set(first))
+
+    results = ResultsStore(Path("results")).read()
+    assert list(results.index) == list(range(8))
+    assert (results["returncode"] == 0).all() and results["heatingMax"].notna().all()
+    assert results.loc[7, "reason"] != "fatal"
+    assert results.loc[3, "width"] == combinations.loc[3, "width"]
@@ -0,0 +1,28 @@
+import numpy as np
+
+from src.sampling import randomSampling, statisticalSampling
+
+
+def test_statistical_sampling_constant_is_a_typed_array ():
+    parameters = statisticalSampling({"coolingSetpoint": {"method": "constant", "values": [99]}}, 4, seed = 1)
+
+    assert isinstance(parameters["coolingSetpoint"], np.ndarray)
+    np.testing.assert_array_equal(parameters["coolingSetpoint"], np.full(4, 99))
+
+
+def test_statistical_sampling_constant_can_be_a_scalar ():
+    parameters = statisticalSampling({
+        "coolingSetpoint": {"method": "constant", "values": 26.5},
+        "construction": {"method": "constant", "values": "heavyweight"},
+    }, 3, seed = 1)
+
+    np.testing.assert_array_equal(parameters["coolingSetpoint"], np.full(3, 26.5))
+    assert list(parameters["construction"]) == ["heavyweight"] * 3
+
+
+def test_random_int_ranges_include_their_upper_value ():
+    # The original randomSampling used np.random.randint(min, max), which never returned the max
+    combinations = randomSampling({"u_windows": {"type": "int", "values": [1, 3]}}, 200, seed = 1)
+
+    assert set(combinations["u_windows"]) == {1, 2, 3}
+
@@ -0,0 +1,28 @@
+import pytest
+from pymoo.algorithms.moo.nsga2 import NSGA2
+from pymoo.optimize import minimize
+from pymoo.problems import get_problem
+
+from src.saveResults import HistoryRecorder, loadNSGA2History
+
+
+def optimise (callback, seed):
+    return minimize(get_problem("zdt1", n_var = 3), NSGA2(pop_size = 8), ("n_gen", 3), callback = callback, seed = seed)
+
+
+def test_history_is_only_replaced_when_asked (tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    optimise(HistoryRecorder("study", objectives = ["heatingMax", "overheating"]), seed = 1)
+    history_X, history_F = loadNSGA2History("study")
+    assert sorted(set(history_X["generation"])) == [0, 1, 2]
+    assert list(history_F.columns) == ["generation", "individual", "heatingMax", "overheating"]
+
+    with pytest.raises(Exception, match = "already been saved"):
+        optimise(HistoryRecorder("study"), seed = 2)
+    assert loadNSGA2History("study")[0].equals(history_X)
+
+    optimise(HistoryRecorder("study", overwrite = True), seed = 2)
+    replaced_X, replaced_F = loadNSGA2History("study")
+    assert len(replaced_X) == len(history_X) and not replaced_X.equals(history_X)
+    assert list(replaced_F.columns) == ["generation", "individual", "f1", "f2"]
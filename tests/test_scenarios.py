@@ -0,0 +1,22 @@
+import shutil
+from pathlib import Path
+
+from conftest import BASELINE_IDF, WEATHER_FILE
+
+from src.scenarios import runScenarios, scenarioMatrix
+
+
+def test_duplicate_designs_are_simulated_once (ep_dir, parameters, inputs, tmp_path):
+    other_weather_file = Path(tmp_path, "future.epw")
+    shutil.copy(WEATHER_FILE, other_weather_file)
+
+    other = {**inputs, "width": parameters["width"]["values"][1]}
+    designs = [inputs, other] * 3
+
+    table = runScenarios(ep_dir, designs, scenarioMatrix([BASELINE_IDF], [WEATHER_FILE, other_weather_file]), max_concurrent = 4)
+
+    assert table.index.is_unique
+    assert len(table) == 4
+    assert (table["returncode"] == 0).all()
+    assert (table["count"] == 3).all()
+    assert table["heatingSum"].notna().all()
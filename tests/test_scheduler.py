@@ -0,0 +1,64 @@
+import os
+from pathlib import Path
+import stat
+import time
+
+import pytest
+
+from conftest import BASELINE_IDF, WEATHER_FILE
+
+from src.scheduler import iterBatch
+
+pytestmark = pytest.mark.skipif(os.name == "nt", reason = "the fake EnergyPlus is only supported on Mac/Linux")
+
+
+def wrapEnergyPlus (ep_dir, other):
+    """
+    Replace the fake EnergyPlus with a script which runs iteration_0 with the fake and runs other (a shell command) for every other iteration.
+    """
+
+    executable = Path(ep_dir, "energyplus")
+    Path.rename(executable, Path(ep_dir, "fake"))
+    executable.write_text(f'#!/bin/sh\ncase "$1" in\n    *iteration_0.idf) exec "{Path(ep_dir, "fake")}" "$@" ;;\n    *) {other} ;;\nesac\n')
+    executable.chmod(executable.stat().st_mode | stat.S_IXUSR)
+
+
+def isRunning (pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+@pytest.mark.filterwarnings("error::pytest.PytestUnhandledThreadExceptionWarning")
+def test_leaving_the_batch_early_stops_the_running_simulations (ep_dir, inputs, tmp_path):
+    pids = Path(tmp_path, "pids")
+    wrapEnergyPlus(ep_dir, f'echo $$ >> "{pids}"; exec sleep 60')
+
+    for i, retcode, hourlyResults, resilienceResults in iterBatch(ep_dir, BASELINE_IDF, WEATHER_FILE, [inputs] * 3, max_concurrent = 3):
+        assert i == 0 and retcode.returncode == 0
+        break
+
+    started = [int(pid) for pid in pids.read_text().split()]
+    assert len(started) == 2
+
+    # The processes are killed before the generator is closed, and are reaped by their waiter threads soon after
+    deadline = time.time() + 10
+    while any(isRunning(pid) for pid in started) and time.time() < deadline:
+        time.sleep(0.05)
+    assert not any(isRunning(pid) for pid in started)
+
+
+def test_unreadable_results_fail_only_their_simulation (ep_dir, inputs):
+    # EnergyPlus exits successfully without writing any results
+    wrapEnergyPlus(ep_dir, "exit 0")
+
+    results = {i: (retcode, hourlyResults) for i, retcode, hourlyResults, _ in iterBatch(ep_dir, BASELINE_IDF, WEATHER_FILE, [inputs] * 3, max_concurrent = 3)}
+
+    assert sorted(results) == [0, 1, 2]
+    assert results[0][0].returncode == 0 and results[0][1] is not None
+    for i in [1, 2]:
+        retcode, hourlyResults = results[i]
+        assert retcode.returncode == 1 and retcode.kind == "parse" and retcode.reason.startswith("parse")
+        assert hourlyResults is None
@@ -0,0 +1,27 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.screening import morrisDesign, morrisIndices, reducedParameters
+
+
+def test_outputs_without_effects_are_left_out_of_the_screening (parameters):
+    combinations, design = morrisDesign(parameters, r = 6, seed = 1)
+    results = pd.DataFrame({
+        "heating": 10 * combinations["height"] + combinations["g_value"],
+        "unchanged": np.zeros(len(combinations)),
+        "failed": np.full(len(combinations), np.nan),
+    })
+
+    indices = morrisIndices(results, design)
+    normalised = indices.set_index(["output", "parameter"])["muStarNormalised"]
+    assert normalised["heating", "height"] == 1
+    assert normalised["unchanged"].isna().all() and normalised["failed"].isna().all()
+
+    # Only the heating output decides which parameters are frozen
+    reduced = reducedParameters(parameters, indices, threshold = 0.01)
+    kept = {k for k in parameters if reduced[k] == parameters[k]}
+    assert kept == {k for k, v in parameters.items() if v["type"] == "constant"} | {"height", "g_value"}
+
+    with pytest.raises(Exception, match = "cannot be screened"):
+        reducedParameters(parameters, indices, outputs = ["unchanged", "failed"])
@@ -0,0 +1,96 @@
+import multiprocessing
+from pathlib import Path
+import sqlite3
+import time
+
+from conftest import BASELINE_IDF, WEATHER_FILE
+
+from src.studyRunner import StudyLedger, createStudy, designId, runWorker
+from src.watchdog import SimulationProcess
+
+SETTINGS = {"baseline_idf_path": "baseline.idf", "weather_file_path": "weather.epw", "backend": "csv", "tables": True, "metrics": None, "fidelity": "full"}
+
+
+def claimAll (study_dir, worker, claimed):
+    # Claim items until there are none left, without completing them, so that every item could be claimed by any worker
+    ledger = StudyLedger(study_dir)
+    while True:
+        item = ledger.claim(worker, lease = 600)
+        if item is None:
+            break
+        claimed.put((worker, item[0]))
+
+
+def test_claims_are_exclusive_across_processes (tmp_path):
+    ledger = StudyLedger(tmp_path)
+    ids = ledger.addItems([{"x": k} for k in range(60)], SETTINGS)
+
+    claimed = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target = claimAll, args = (tmp_path, f"worker-{k}", claimed)) for k in range(4)]
+    for p in processes:
+        p.start()
+    for p in processes:
+        p.join(60)
+
+    # Every item is claimed once, and no item is claimed twice
+    items = [claimed.get(timeout = 5)[1] for _ in ids]
+    assert sorted(items) == sorted(ids)
+    assert claimed.empty()
+    assert ledger.progress() == {"running": len(ids)}
+
+
+def test_expired_leases_are_claimed_again (tmp_path):
+    ledger = StudyLedger(tmp_path)
+    ledger.addItems([{"x": 1}], SETTINGS)
+
+    item, inputs = ledger.claim("crashed", lease = 0)
+    assert item == designId({"x": 1}) and inputs == {"x": 1}
+    time.sleep(0.01)
+
+    # The lease of the crashed worker has run out, so another worker takes the item over and its result is recorded
+    assert ledger.claim("second", lease = 600)[0] == item
+    assert ledger.claim("third", lease = 600) is None
+    ledger.complete(item, "second", SimulationProcess([], 0), {"heatingSum": 1.0}, {})
+
+    results = ledger.results()
+    assert results.loc[item, "status"] == "done"
+    assert results.loc[item, "worker"] == "second"
+    assert results.loc[item, "attempts"] == 2
+    assert results.loc[item, "heatingSum"] == 1.0
+
+
+def test_adding_items_again_does_not_duplicate_them (tmp_path):
+    ledger = StudyLedger(tmp_path)
+    ledger.addItems([{"x": k} for k in range(3)], SETTINGS)
+    ledger.addItems([{"x": k} for k in range(5)], SETTINGS)
+
+    assert ledger.progress() == {"pending": 5}
+
+
+def test_failed_renewals_do_not_stop_the_heartbeat (ep_dir, inputs, tmp_path, monkeypatch):
+    monkeypatch.setenv("FAKE_ENERGYPLUS_SLEEP", "1")
+    createStudy(Path(tmp_path, "study"), [inputs], BASELINE_IDF, WEATHER_FILE)
+
+    renewals = []
+    renew = StudyLedger.renew
+    def lockedOnce (self, *args):
+        renewals.append(args)
+        if len(renewals) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        return renew(self, *args)
+    monkeypatch.setattr(StudyLedger, "renew", lockedOnce)
+
+    assert runWorker(Path(tmp_path, "study"), ep_dir, lease = 0.3) == 1
+    assert len(renewals) > 1
+    assert StudyLedger(Path(tmp_path, "study")).progress() == {"done": 1}
+
+
+def test_errors_fail_the_item_not_the_worker (ep_dir, inputs, tmp_path):
+    # The baseline idf does not exist, so every item fails before EnergyPlus is started
+    createStudy(Path(tmp_path, "study"), [inputs, {**inputs, "width": 10}], Path(tmp_path, "missing.idf"), WEATHER_FILE)
+
+    assert runWorker(Path(tmp_path, "study"), ep_dir) == 2
+
+    results = StudyLedger(Path(tmp_path, "study")).results()
+    assert (results["status"] == "failed").all()
+    assert results["reason"].str.contains("FileNotFoundError").all()
@@ -0,0 +1,23 @@
+import numpy as np
+from pymoo.algorithms.moo.nsga2 import NSGA2
+from pymoo.optimize import minimize
+
+from src.surrogate import SurrogateAssistedProblem
+
+
+def evaluate (x):
+    # A cheap two objective problem which stands in for EnergyPlus
+    return np.column_stack([x[:, 0], 1 - np.sqrt(x[:, 0]) + x[:, 1]])
+
+
+def test_front_only_has_simulated_objectives ():
+    parameters = {"a": {"type": "float", "values": [0, 1]}, "b": {"type": "float", "values": [0, 1]}}
+    problem = SurrogateAssistedProblem(evaluate, parameters, ["f1", "f2"], seed = 1)
+    result = minimize(problem, NSGA2(pop_size = 12), ("n_gen", 5), seed = 1)
+
+    # Most of the population has only been predicted by the surrogate
+    assert result.pop.get("predicted").astype(bool).any()
+
+    X, F = problem.front(result.pop)
+    assert len(X) > 0
+    np.testing.assert_allclose(F.to_numpy(), evaluate(X.to_numpy()))
@@ -0,0 +1,36 @@
+from pathlib import Path
+
+import numpy as np
+
+from conftest import BASELINE_IDF, WEATHER_FILE
+
+from src.cache import ResultCache
+from src.runEnergyPlus import run_energyPlus
+from src.timeseriesCube import TimeseriesCube
+
+
+def test_cube_metrics_match_the_results_of_each_run (ep_dir, inputs, tmp_path):
+    cube = TimeseriesCube.create(Path(tmp_path, "cube"), 2)
+    cache = ResultCache(Path(tmp_path, "cache"))
+
+    # The second run is a cache hit, which fills its row of the cube from the cache entry
+    results = [run_energyPlus(ep_dir, BASELINE_IDF, WEATHER_FILE, inputs, i, cache = cache, cube = cube)[1] for i in range(2)]
+    assert np.all(cube.filled)
+
+    metrics = cube.metrics()
+    for i, hourlyResults in enumerate(results):
+        for name, value in hourlyResults.items():
+            # The cube stores float32 values
+            assert np.isclose(metrics.loc[i, name], value, rtol = 1e-6), name
+
+
+def test_cube_without_months_skips_the_monthly_sums (tmp_path):
+    # Runs of the sampled and peak fidelity levels do not cover every timestep, so the months are never saved
+    cube = TimeseriesCube.create(Path(tmp_path, "cube"), 2, variables = ["heating", "operativeTemperature"])
+    cube.write(0, {"heating": np.ones(24 * 56), "operativeTemperature": np.full(24 * 56, 27.0)})
+
+    metrics = cube.metrics()
+    assert not any(name.startswith("monthly") for name in metrics.columns)
+    assert metrics.loc[0, "heatingSum"] == 24 * 56
+    assert metrics.loc[0, "temperature>25C"] == 24 * 56
+    assert metrics.loc[1].isna().all()
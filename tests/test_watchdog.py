@@ -0,0 +1,62 @@
+import asyncio
+import os
+from pathlib import Path
+
+import pytest
+
+from src import watchdog
+from src.watchdog import ProcessWaiter, Watchdog, startProcess
+
+pytestmark = pytest.mark.skipif(os.name == "nt", reason = "the test processes are shell commands")
+
+
+def command (script, output_path):
+    # The output folder is passed to the script as $0
+    return ["/bin/sh", "-c", script, str(output_path)]
+
+
+def test_timeout_stops_the_simulation (tmp_path):
+    retcode = Watchdog(timeout = 0.5, poll_interval = 0.05).run(command("sleep 30", tmp_path), tmp_path)
+
+    assert retcode.returncode == 1
+    assert retcode.kind == "timeout"
+    assert retcode.elapsed < 10
+
+
+def test_fatal_error_stops_the_simulation (tmp_path):
+    script = 'echo "   **  Fatal  ** Out of range" > "$0/eplusout.err"; sleep 30'
+    retcode = Watchdog(poll_interval = 0.05).run(command(script, tmp_path), tmp_path)
+
+    assert retcode.kind == "fatal"
+    assert "Out of range" in retcode.reason
+    assert retcode.elapsed < 10
+
+
+def test_fatal_error_is_not_retried (tmp_path):
+    script = 'echo run >> "$0/attempts"; echo "   **  Fatal  ** Out of range" > "$0/eplusout.err"; exit 1'
+    retcode = asyncio.run(Watchdog(retries = 2, poll_interval = 0.05).runAsync(command(script, tmp_path), tmp_path))
+
+    assert retcode.kind == "fatal"
+    assert retcode.attempts == 1
+    assert Path(tmp_path, "attempts").read_text().split() == ["run"]
+
+
+def test_crash_is_retried (tmp_path):
+    script = 'echo run >> "$0/attempts"; exit 3'
+    retcode = asyncio.run(Watchdog(retries = 2, poll_interval = 0.05).runAsync(command(script, tmp_path), tmp_path))
+
+    assert retcode.kind == "crash"
+    assert retcode.exitcode == 3
+    assert retcode.attempts == 3
+
+
+def test_reaped_processes_are_not_signalled (tmp_path, monkeypatch):
+    waiter = ProcessWaiter(startProcess(command("exit 0", tmp_path)))
+    assert waiter.done.wait(10)
+
+    killed = []
+    monkeypatch.setattr(watchdog.os, "killpg", lambda *args: killed.append(args))
+    waiter.stop()
+
+    # The process ID may already belong to another process
+    assert killed == []
@@ -0,0 +1,60 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+import zipfile
+
+from src.workspace import Workspace
+
+
+def simulate (workspace, i):
+    # The files a simulation leaves behind, of which only the idf and the error file are kept by default
+    path = workspace.runPath(i)
+    for name in [f"iteration_{i}.idf", "eplusout.err", "eplusout.csv", "eplusout.eso"]:
+        Path(path, name).write_text(f"{name} of iteration {i}")
+    Path.mkdir(Path(path, "tmp"))
+    return path
+
+
+def finalizeAll (workspace, indices):
+    for i in indices:
+        simulate(workspace, i)
+        workspace.finalize(i)
+
+
+def test_kept_files_are_moved_to_the_results_folder (tmp_path):
+    workspace = Workspace("study", scratch_root = Path(tmp_path, "scratch"), results_root = Path(tmp_path, "results"))
+    simulate(workspace, 3)
+    workspace.finalize(3)
+
+    kept = Path(tmp_path, "results", "study", "iteration_3")
+    assert sorted(f.name for f in kept.iterdir()) == ["eplusout.err", "iteration_3.idf"]
+    assert Path(kept, "eplusout.err").read_text() == "eplusout.err of iteration 3"
+    assert not Path(tmp_path, "scratch", "study", "iteration_3").exists()
+
+
+def test_files_which_are_not_kept_are_deleted_in_place (tmp_path):
+    workspace = Workspace("study", scratch_root = tmp_path, results_root = tmp_path, keep = ["*.csv"])
+    path = simulate(workspace, 0)
+    workspace.finalize(0)
+
+    assert [f.name for f in path.iterdir()] == ["eplusout.csv"]
+
+
+def test_each_process_writes_its_own_archive (tmp_path):
+    workspace = Workspace("study", scratch_root = Path(tmp_path, "scratch"), results_root = Path(tmp_path, "results"), archive = True)
+
+    # Two processes, each finalizing its simulations on several threads
+    with ProcessPoolExecutor(2) as pool:
+        list(pool.map(finalizeAll, [workspace] * 2, [range(0, 20), range(20, 40)]))
+    with ThreadPoolExecutor(4) as pool:
+        list(pool.map(finalizeAll, [workspace] * 4, [range(40 + 5 * k, 45 + 5 * k) for k in range(4)]))
+
+    archives = workspace.archives()
+    assert len(archives) >= 2 and workspace.archivePath() in archives
+
+    names = []
+    for archive in archives:
+        with zipfile.ZipFile(archive) as z:
+            assert z.testzip() is None
+            names += z.namelist()
+    assert sorted(names) == sorted(f"iteration_{i}/{name}" for i in range(60) for name in ["eplusout.err", f"iteration_{i}.idf"])
+    assert list(Path(tmp_path, "scratch", "study").iterdir()) == []